@@ -21,6 +21,10 @@ const int addrFanPWMValue    = 1;
 const int addrWinderMotorSwitchState = 2;
 const int addrWinderMotorPWMValue    = 3;
 const int addrSetTemperature         = 4; // Address to store set temperature
+const int addrControlMode            = 5; // 1 = PID, anything else = bang-bang
+const int addrPidKp                  = 8; // Floats (4 bytes each) written with EEPROM.put
+const int addrPidKi                  = 12;
+const int addrPidKd                  = 16;
 
 int setTemperature;   // Read from EEPROM in restoreSettings()
 
@@ -46,8 +50,32 @@ const float SHUTOFF_TEMP_THRESHOLD = 30.0;
 // Variable to track USB connection state for debug prints
 bool usbWasPlugged = true;
 
+// Heater control: bang-bang (default) or PID driving a time-proportioned SSR.
+// Gains come from the host's autotuner (pultrusion/autotune.py); the PID output
+// is the fraction of each SSR_WINDOW the heater is on.
+#define SSR_WINDOW 2000                // Time-proportioning window in milliseconds
+bool pidMode                    = false;
+float pidKp = 0.0, pidKi = 0.0, pidKd = 0.0;
+float pidIntegral               = 0.0;   // Integral term, already multiplied by Ki
+float pidLastTemp               = NAN;
+float heaterOutput              = 0.0;   // 0..1
+unsigned long ssrWindowStart    = 0;
+
+// Serial link settings, negotiated by the host (see pultrusion/link.py)
+#define DEFAULT_BAUD_RATE 9600
+#define BAUD_CONFIRM_WINDOW 3000       // Revert a baud change unless PING arrives within this many ms
+bool compactTelemetry           = false; // "$T,<temp>,<set>,<ssr>*<checksum>" instead of the text line
+long baudRate                   = DEFAULT_BAUD_RATE;
+long previousBaudRate           = DEFAULT_BAUD_RATE;
+bool baudChangePending          = false;
+unsigned long baudChangeTime    = 0;
+
 // Function Prototypes
 void controlTemperature(float currentTemp);
+void updateSSR();
+void setControlMode(bool usePid);
+void sendTelemetry(float currentTemp);
+void changeBaudRate(long newBaudRate);
 void handleCommands(String command);
 void initiateShutdown();
 void emergencyStop();
@@ -89,7 +117,7 @@ void setup() {
   pinMode(inductiveSwitchPin, INPUT);
   pinMode(usbDetectPin, INPUT);  // USB detect input (optional)
 
-  Serial.begin(9600);
+  Serial.begin(DEFAULT_BAUD_RATE);
   delay(500);  // Allow some time for Serial to start
 
   Serial.println("\n=== System (Re)Started! ===");
@@ -130,16 +158,19 @@ void loop() {
   if (currentMillis - lastUpdate >= UPDATE_INTERVAL) {
     lastUpdate = currentMillis;
     float currentTemperature = therm1.analog2temp();
-    Serial.print("Current Temperature: ");
-    Serial.print(currentTemperature);
-    Serial.print(" °C | Set Temperature: ");
-    Serial.print(setTemperature);
-    Serial.print(" °C | SSR State: ");
-    Serial.println(digitalRead(ssrPin) ? "ON" : "OFF");
+    sendTelemetry(currentTemperature);
 
     controlTemperature(currentTemperature);
   }
 
+  // Go back to the old baud rate if the host never confirmed the new one
+  if (baudChangePending && millis() - baudChangeTime > BAUD_CONFIRM_WINDOW) {
+    baudChangePending = false;
+    changeBaudRate(previousBaudRate);
+    Serial.print("Baud change not confirmed, reverted to ");
+    Serial.println(baudRate);
+  }
+
   // Shutdown timer (if set via command)
   if (shutdownScheduled) {
     unsigned long elapsed = currentMillis - shutoffStartTime;
@@ -182,6 +213,11 @@ void loop() {
     }
   }
 
+  // Time-proportioned SSR switching runs every pass, not only every UPDATE_INTERVAL
+  if (pidMode) {
+    updateSSR();
+  }
+
   // Process serial commands (if any)
   if (!shutdownActive && Serial.available() > 0) {
     String command = Serial.readStringUntil('\n');
@@ -208,11 +244,74 @@ void checkUSBState() {
   usbWasPlugged = usbNow;
 }
 
+/**
+ * Prints one telemetry sample, as text or as a compact checksummed frame.
+ */
+void sendTelemetry(float currentTemp) {
+  if (compactTelemetry) {
+    char temp[12];
+    char frame[40];
+    dtostrf(currentTemp, 1, 2, temp);
+    snprintf(frame, sizeof(frame), "T,%s,%d,%d", temp, setTemperature, digitalRead(ssrPin) ? 1 : 0);
+    // NMEA-style checksum: XOR of every character between '$' and '*'
+    uint8_t checksum = 0;
+    for (char *p = frame; *p; p++) {
+      checksum ^= (uint8_t)*p;
+    }
+    Serial.print('$');
+    Serial.print(frame);
+    Serial.print('*');
+    if (checksum < 0x10) Serial.print('0');
+    Serial.println(checksum, HEX);
+    return;
+  }
+  Serial.print("Current Temperature: ");
+  Serial.print(currentTemp);
+  Serial.print(" °C | Set Temperature: ");
+  Serial.print(setTemperature);
+  Serial.print(" °C | SSR State: ");
+  Serial.println(digitalRead(ssrPin) ? "ON" : "OFF");
+}
+
+/**
+ * Restarts Serial at a new baud rate once everything pending has been sent.
+ */
+void changeBaudRate(long newBaudRate) {
+  Serial.flush();
+  Serial.end();
+  baudRate = newBaudRate;
+  Serial.begin(baudRate);
+}
+
 /**
  * Controls the heater (SSR) based on current temperature vs. setTemperature.
- * No hysteresis is used so that even a 1°C difference causes a change.
+ * In PID mode this only updates heaterOutput; updateSSR() switches the SSR.
+ * In bang-bang mode no hysteresis is used so that even a 1°C difference causes a change.
  */
 void controlTemperature(float currentTemp) {
+  if (pidMode) {
+    const float dt = UPDATE_INTERVAL / 1000.0;
+    if (setTemperature <= 0 || isnan(currentTemp)) {
+      // Heater off (shutdown, eject to 0) or no valid reading: reset the controller
+      pidIntegral = 0.0;
+      heaterOutput = 0.0;
+      pidLastTemp = currentTemp;
+      return;
+    }
+    float error = setTemperature - currentTemp;
+    // Derivative on the measurement, so set point changes do not kick the output
+    float derivative = isnan(pidLastTemp) ? 0.0 : -(currentTemp - pidLastTemp) / dt;
+    pidLastTemp = currentTemp;
+    float proportional = pidKp * error + pidKd * derivative;
+    float integral = constrain(pidIntegral + pidKi * error * dt, 0.0, 1.0);
+    // Anti-windup: only integrate while the output is not saturated
+    if (proportional + integral > 0.0 && proportional + integral < 1.0) {
+      pidIntegral = integral;
+    }
+    heaterOutput = constrain(proportional + pidIntegral, 0.0, 1.0);
+    return;
+  }
+
   bool heaterOn;
   if (currentTemp < setTemperature) {
     heaterOn = true;
@@ -222,6 +321,31 @@ void controlTemperature(float currentTemp) {
   digitalWrite(ssrPin, heaterOn ? HIGH : LOW);
 }
 
+/**
+ * Turns the SSR on for heaterOutput of every SSR_WINDOW (PID mode).
+ */
+void updateSSR() {
+  unsigned long now = millis();
+  if (now - ssrWindowStart >= SSR_WINDOW) {
+    ssrWindowStart += SSR_WINDOW * ((now - ssrWindowStart) / SSR_WINDOW);
+  }
+  digitalWrite(ssrPin, (now - ssrWindowStart) < heaterOutput * SSR_WINDOW ? HIGH : LOW);
+}
+
+/**
+ * Switches between bang-bang and PID control and remembers the choice.
+ */
+void setControlMode(bool usePid) {
+  pidMode = usePid;
+  pidIntegral = 0.0;
+  pidLastTemp = NAN;
+  heaterOutput = 0.0;
+  ssrWindowStart = millis();
+  EEPROM.update(addrControlMode, usePid ? 1 : 0);
+  Serial.print("Control mode: ");
+  Serial.println(usePid ? "PID" : "BANGBANG");
+}
+
 /**
  * Handles incoming Serial commands.
  */
@@ -250,6 +374,80 @@ void handleCommands(String command) {
     return; // Exit after processing EJECT
   }
 
+  // Link commands (see pultrusion/link.py)
+  if (command == "PING") {
+    baudChangePending = false;  // Any PING at the new rate confirms a baud change
+    Serial.println("PONG");
+  }
+
+  // Settings as they stand, so the host can resync after a reconnect
+  if (command == "STATUS") {
+    Serial.print("Status: Set Temperature: ");
+    Serial.print(setTemperature);
+    Serial.print(" °C | Fan: ");
+    Serial.print(digitalRead(fanSwitch_Pin) ? "ON" : "OFF");
+    Serial.print(" (PWM ");
+    Serial.print(EEPROM.read(addrFanPWMValue));
+    Serial.print(") | Winder: ");
+    Serial.print(digitalRead(winderMotorSwitch_Pin) ? "ON" : "OFF");
+    Serial.print(" (PWM ");
+    Serial.print(EEPROM.read(addrWinderMotorPWMValue));
+    Serial.print(") | Control: ");
+    Serial.println(pidMode ? "PID" : "BANGBANG");
+  }
+
+  if (command == "TELEMETRY:COMPACT") {
+    compactTelemetry = true;
+    Serial.println("Telemetry mode: COMPACT");
+  } else if (command == "TELEMETRY:TEXT") {
+    compactTelemetry = false;
+    Serial.println("Telemetry mode: TEXT");
+  }
+
+  if (command.startsWith("BAUD:")) {
+    long newBaudRate = command.substring(5).toInt();
+    if (newBaudRate >= 1200 && newBaudRate <= 1000000) {
+      Serial.print("Baud rate changing to ");
+      Serial.println(newBaudRate);
+      previousBaudRate = baudRate;
+      changeBaudRate(newBaudRate);
+      baudChangePending = true;
+      baudChangeTime = millis();
+    } else {
+      Serial.println("Invalid baud rate received.");
+    }
+  }
+
+  // Heater control commands (see pultrusion/autotune.py)
+  if (command.startsWith("PID:")) {
+    // PID:<kp>,<ki>,<kd> in heater fraction per °C (Ki per second, Kd in seconds)
+    int first = command.indexOf(',');
+    int second = command.indexOf(',', first + 1);
+    if (first > 4 && second > first) {
+      pidKp = command.substring(4, first).toFloat();
+      pidKi = command.substring(first + 1, second).toFloat();
+      pidKd = command.substring(second + 1).toFloat();
+      EEPROM.put(addrPidKp, pidKp);   // put() only writes bytes that changed
+      EEPROM.put(addrPidKi, pidKi);
+      EEPROM.put(addrPidKd, pidKd);
+      pidIntegral = 0.0;
+      Serial.print("PID gains set to Kp=");
+      Serial.print(pidKp, 5);
+      Serial.print(" Ki=");
+      Serial.print(pidKi, 5);
+      Serial.print(" Kd=");
+      Serial.println(pidKd, 5);
+    } else {
+      Serial.println("Invalid PID gains received.");
+    }
+  }
+
+  if (command == "CONTROL:PID") {
+    setControlMode(true);
+  } else if (command == "CONTROL:BANGBANG") {
+    setControlMode(false);
+  }
+
   if (command == "FAN_ON") {
     turnFanOn(255);
     Serial.println("FAN_ON command executed.");
@@ -310,6 +508,12 @@ void handleCommands(String command) {
     }
   }
 
+  // The host stops a length-based shutoff while the winder stands still
+  if (command == "CANCEL_SHUTDOWN") {
+    shutdownScheduled = false;
+    Serial.println("Shutdown cancelled.");
+  }
+
   if (command.startsWith("SET_TEMP:")) {
     int tempValue = command.substring(9).toInt();
     if (tempValue >= 0) {
@@ -435,6 +639,17 @@ void restoreSettings() {
   }
   setTemperature = readTemp;
 
+  EEPROM.get(addrPidKp, pidKp);
+  EEPROM.get(addrPidKi, pidKi);
+  EEPROM.get(addrPidKd, pidKd);
+  // Erased EEPROM reads back as NaN: stay on bang-bang until the host sends gains
+  if (isnan(pidKp) || isnan(pidKi) || isnan(pidKd)) {
+    pidKp = pidKi = pidKd = 0.0;
+    pidMode = false;
+  } else {
+    pidMode = (EEPROM.read(addrControlMode) == 1);
+  }
+
   Serial.println("Settings restored from EEPROM.");
 }
 
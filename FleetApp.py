@@ -0,0 +1,307 @@
+"""
+Fleet overview: one window for several pultrusion machines.
+
+Every machine is a pultrusion.machine.Machine with its own state; all of
+them share one serial I/O thread. Double-click a row to control a machine.
+
+    python FleetApp.py press-1=COM3 press-2=COM4
+    python FleetApp.py --simulate 4          (simulated machines, Linux/macOS)
+"""
+import argparse
+import logging
+import tkinter as tk
+from tkinter import ttk, messagebox, simpledialog
+
+from pultrusion.fleet import FleetController, parse_machine_spec
+from pultrusion.log import setup_logging, shutdown_logging
+
+log = logging.getLogger("pultrusion.fleet_app")
+
+# -------------------------------------------------
+# Global UI/Style Settings (same look as PultrusionApp.py)
+# -------------------------------------------------
+BG_COLOR = "#f3f3f3"
+FG_COLOR = "#333333"
+ACCENT_COLOR = "#0078D7"
+DEFAULT_FONT = ("Segoe UI", 12)
+TITLE_FONT = ("Segoe UI", 16)
+
+REFRESH_MS = 200      # Overview refresh interval
+STALE_AFTER = 3.0     # Seconds without a line before a machine shows as silent
+
+COLUMNS = (
+    ("machine", "Machine", 120),
+    ("port", "Port", 120),
+    ("temperature", "Temp (°C)", 90),
+    ("set_temperature", "Set (°C)", 80),
+    ("ssr", "SSR", 60),
+    ("fan", "Fan", 70),
+    ("spool", "Spool", 70),
+    ("status", "Status", 160),
+)
+
+
+def setup_styles():
+    style = ttk.Style()
+    style.theme_use('clam')
+    style.configure("TLabel", background=BG_COLOR, foreground=FG_COLOR, font=DEFAULT_FONT, padding=5)
+    style.configure("TButton", font=DEFAULT_FONT, padding=6)
+    style.map("TButton",
+              background=[('active', ACCENT_COLOR)],
+              foreground=[('active', "#ffffff")])
+    style.configure("TEntry", font=DEFAULT_FONT, padding=4)
+    style.configure("TFrame", background=BG_COLOR)
+    style.configure("Treeview", font=DEFAULT_FONT, rowheight=26)
+    style.configure("Treeview.Heading", font=DEFAULT_FONT)
+
+
+def format_value(value, fmt="{}", missing="--"):
+    return missing if value is None else fmt.format(value)
+
+
+def format_ssr(ssr_on):
+    return "--" if ssr_on is None else ("ON" if ssr_on else "OFF")
+
+
+def format_speed(on, speed):
+    if on is False:
+        return "off"
+    return format_value(speed, "{}%")
+
+
+def machine_status(state):
+    if not state.connected:
+        return state.error or "not connected"
+    if state.emergency_stop:
+        return "EMERGENCY STOP"
+    if state.shutting_down:
+        return "shutting down"
+    age = state.age()
+    if age is None or age > STALE_AFTER:
+        return "no data"
+    return "ok"
+
+
+# -------------------------------------------------
+# Per-machine window
+# -------------------------------------------------
+class MachineWindow:
+    """Drill-down controls for one machine."""
+
+    def __init__(self, app, machine):
+        self.app = app
+        self.machine = machine
+        state = machine.state
+
+        self.window = tk.Toplevel(app.root)
+        self.window.title(f"{machine.name} ({machine.port})")
+        self.window.geometry("420x520")
+        self.window.configure(bg=BG_COLOR)
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        self.temp_text = tk.StringVar(self.window)
+        self.ssr_text = tk.StringVar(self.window)
+        self.status_text = tk.StringVar(self.window)
+        self.desired_temp = tk.StringVar(self.window, value=format_value(state.set_temperature, missing="100"))
+        # Unknown or off (PWM 0): start the slider in the middle
+        self.fan_speed = tk.IntVar(self.window, value=state.fan_speed if state.fan_pwm else 50)
+        self.spool_speed = tk.IntVar(self.window, value=state.spool_speed if state.winder_pwm else 50)
+        self.fan_text = tk.StringVar(self.window, value=f"Fan Speed: {self.fan_speed.get()}%")
+        self.spool_text = tk.StringVar(self.window, value=f"Spool Motor Speed: {self.spool_speed.get()}%")
+
+        frame = ttk.Frame(self.window, style="TFrame")
+        frame.pack(fill="both", expand=True, padx=10, pady=10)
+
+        ttk.Label(frame, textvariable=self.temp_text, font=TITLE_FONT).pack(pady=5)
+        ttk.Label(frame, textvariable=self.ssr_text).pack()
+        ttk.Label(frame, textvariable=self.status_text).pack()
+
+        temp_frame = ttk.Frame(frame, style="TFrame")
+        temp_frame.pack(pady=5)
+        ttk.Label(temp_frame, text="Desired Temperature (°C):").pack(side="left")
+        ttk.Entry(temp_frame, textvariable=self.desired_temp, width=6).pack(side="left", padx=5)
+        ttk.Button(temp_frame, text="Set", command=self.send_set_temperature).pack(side="left")
+
+        ttk.Label(frame, textvariable=self.fan_text).pack(pady=(10, 0))
+        ttk.Scale(frame, from_=0, to=100, orient="horizontal", variable=self.fan_speed,
+                  command=self.on_fan_slider).pack(fill="x", padx=20)
+        ttk.Label(frame, textvariable=self.spool_text).pack(pady=(10, 0))
+        ttk.Scale(frame, from_=0, to=100, orient="horizontal", variable=self.spool_speed,
+                  command=self.on_spool_slider).pack(fill="x", padx=20)
+
+        timer_frame = ttk.Frame(frame, style="TFrame")
+        timer_frame.pack(pady=10)
+        ttk.Label(timer_frame, text="Shut down after (minutes):").pack(side="left")
+        self.timer_entry = ttk.Entry(timer_frame, width=6)
+        self.timer_entry.pack(side="left", padx=5)
+        ttk.Button(timer_frame, text="Start", command=self.start_timer).pack(side="left")
+
+        ttk.Button(frame, text="Eject", command=self.eject).pack(pady=5)
+        self.refresh()
+
+    def refresh(self):
+        state = self.machine.state
+        self.temp_text.set(f"Temperature: {format_value(state.temperature, '{:.2f}')}°C\n"
+                           f"Desired Temperature: {format_value(state.set_temperature)}°C")
+        self.ssr_text.set(f"SSR State: {format_ssr(state.ssr_on)}")
+        self.status_text.set(f"Status: {machine_status(state)}")
+
+    def send_set_temperature(self):
+        try:
+            temperature = int(self.desired_temp.get())
+        except ValueError:
+            messagebox.showerror("Input Error", "Please enter a valid temperature.", parent=self.window)
+            return
+        ack = self.machine.set_temperature(temperature)
+        ack.add_done_callback(self._on_set_temperature_ack)
+
+    def _on_set_temperature_ack(self, future):
+        # Serial loop thread
+        if future.exception() is None:
+            log.info("%s: set temperature acknowledged", self.machine.name)
+        else:
+            log.warning("%s: set temperature not acknowledged: %s", self.machine.name, future.exception())
+
+    def on_fan_slider(self, value):
+        speed = int(float(value))
+        self.fan_text.set(f"Fan Speed: {speed}%")
+        self.machine.set_fan_speed(speed)  # Coalesced per machine
+
+    def on_spool_slider(self, value):
+        speed = int(float(value))
+        self.spool_text.set(f"Spool Motor Speed: {speed}%")
+        self.machine.set_spool_speed(speed)
+
+    def start_timer(self):
+        try:
+            minutes = int(self.timer_entry.get())
+            if minutes <= 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Input Error", "Please enter a valid time in minutes.", parent=self.window)
+            return
+        self.machine.set_shutdown_time(minutes * 60)
+
+    def eject(self):
+        if messagebox.askyesno("Eject", f"Send EJECT to {self.machine.name}?", parent=self.window):
+            self.machine.eject()
+
+    def close(self):
+        self.app.detail_windows.pop(self.machine.name, None)
+        self.window.destroy()
+
+
+# -------------------------------------------------
+# Overview
+# -------------------------------------------------
+class FleetApp:
+    def __init__(self, root, fleet, on_close=None):
+        self.root = root
+        self.fleet = fleet
+        self.on_close = on_close
+        self.detail_windows = {}
+
+        root.title(f"Pultrusion Fleet ({len(fleet)} machines)")
+        root.configure(bg=BG_COLOR)
+        setup_styles()
+
+        toolbar = ttk.Frame(root, style="TFrame")
+        toolbar.pack(fill="x", padx=10, pady=(10, 0))
+        ttk.Button(toolbar, text="Set Temperature (All)...", command=self.set_all_temperatures).pack(side="left")
+        ttk.Button(toolbar, text="Open", command=self.open_selected).pack(side="left", padx=5)
+
+        self.tree = ttk.Treeview(root, columns=[c[0] for c in COLUMNS], show="headings",
+                                 height=min(max(len(fleet), 4), 24))
+        for key, heading, width in COLUMNS:
+            self.tree.heading(key, text=heading)
+            self.tree.column(key, width=width, anchor="center")
+        self.tree.pack(fill="both", expand=True, padx=10, pady=10)
+        for machine in fleet:
+            self.tree.insert("", "end", iid=machine.name, values=self.row(machine.state))
+        self.tree.bind("<Double-1>", lambda e: self.open_selected())
+
+        root.protocol("WM_DELETE_WINDOW", self.close)
+        self.root.after(REFRESH_MS, self.refresh)
+
+    @staticmethod
+    def row(state):
+        return (
+            state.name,
+            state.port,
+            format_value(state.temperature, "{:.1f}"),
+            format_value(state.set_temperature),
+            format_ssr(state.ssr_on),
+            format_speed(state.fan_on, state.fan_speed),
+            format_speed(state.winder_on, state.spool_speed),
+            machine_status(state),
+        )
+
+    def refresh(self):
+        # Reads each machine's latest state: constant cost per frame no
+        # matter how fast the machines print
+        for machine in self.fleet:
+            self.tree.item(machine.name, values=self.row(machine.state))
+        for window in self.detail_windows.values():
+            window.refresh()
+        self.root.after(REFRESH_MS, self.refresh)
+
+    def open_selected(self):
+        for name in self.tree.selection():
+            window = self.detail_windows.get(name)
+            if window is None:
+                self.detail_windows[name] = MachineWindow(self, self.fleet[name])
+            else:
+                window.window.lift()
+
+    def set_all_temperatures(self):
+        temperature = simpledialog.askinteger("Set Temperature", "Desired temperature for every machine (°C):",
+                                              parent=self.root, minvalue=0, maxvalue=300)
+        if temperature is not None:
+            self.fleet.broadcast("set_temperature", temperature)
+
+    def close(self):
+        self.fleet.close_all()
+        if self.on_close:
+            self.on_close()
+        self.root.destroy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monitor and control several pultrusion machines.")
+    parser.add_argument("machines", nargs="*", help="serial ports, optionally named: press-1=COM3")
+    parser.add_argument("--baud", type=int, default=9600)
+    parser.add_argument("--simulate", type=int, default=0, metavar="N",
+                        help="add N simulated machines (pultrusion.simulator)")
+    parser.add_argument("--speedup", type=float, default=1.0, help="clock speedup for simulated machines")
+    parser.add_argument("--log-level", default="INFO")
+    parser.add_argument("--log-file", default=None, help="also log JSON lines here (rotated at 10 MB)")
+    args = parser.parse_args()
+    setup_logging(args.log_level, json_path=args.log_file)
+
+    simulators = []
+    fleet = FleetController()
+    for i, spec in enumerate(args.machines):
+        name, port = parse_machine_spec(spec, i)
+        fleet.add(name, port, args.baud)
+    if args.simulate:
+        from pultrusion.simulator import FakeArduino
+        for i in range(args.simulate):
+            simulator = FakeArduino(speedup=args.speedup)
+            simulators.append(simulator)
+            fleet.add(f"sim-{i + 1}", simulator.start())
+    if not len(fleet):
+        parser.error("no machines given")
+
+    def stop_simulators():
+        for simulator in simulators:
+            simulator.stop()
+
+    root = tk.Tk()
+    fleet.connect_all(settle_time=0 if not args.machines else 2.0)
+    FleetApp(root, fleet, on_close=stop_simulators)
+    root.mainloop()
+    shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,34 @@
 import time
+APP_STARTED = time.monotonic()  # Reference for the startup timings
+import logging
 import os  # For file path handling
 import sys
 import serial
-import re
 import tkinter as tk
 from tkinter import *
-from tkinter import ttk, messagebox, simpledialog
-from threading import Thread, Event
+from tkinter import ttk, messagebox, simpledialog, filedialog
+from threading import Thread, Event, Lock
+
+from pultrusion import link
+from pultrusion.anomaly import SafetyMonitor
+from pultrusion.autotune import Autotuner, format_report
+from pultrusion.daemon import RemoteController, parse_address
+from pultrusion.discovery import ProbeResult, discover, load_last_port, probe_port, save_last_port
+from pultrusion.live_chart import LiveChart
+from pultrusion.log import log_pipeline, setup_logging, shutdown_logging
+from pultrusion.protocol import (CoolingComplete, EmergencyStop, ShutdownStarted,
+                                 TelemetrySample, parse_line)
+from pultrusion.throughput import LengthShutoff, ProductionCounter, ThroughputModel
+from pultrusion.machine import Machine, pwm_to_speed
+from pultrusion.metrics import (LoopMonitor, MetricsExporter, MetricsRegistry, ParseMetrics,
+                                register_link, register_loop, register_ui)
+from pultrusion.recipes import Recipe, SetStep
+from pultrusion.recorder import RunRecorder, replay, session_files
+from pultrusion.supervisor import ConnectionSupervisor
+from pultrusion.strip_widths import StripWidthStore, parse_thicknesses, read_thickness_csv, strip_width
+from pultrusion.telemetry_store import DEFAULT_CAPACITY, TelemetryStore
+from pultrusion.ui_pump import UiUpdatePump
+from pultrusion.virtual_list import VirtualListView
 
 # -------------------------------------------------
 # Global UI/Style Settings (Windows 11–inspired)
@@ -14,36 +36,90 @@ from threading import Thread, Event
 BG_COLOR = "#f3f3f3"       # Light background
 FG_COLOR = "#333333"       # Dark gray text
 ACCENT_COLOR = "#0078D7"   # Microsoft blue accent
+ALARM_COLOR = "#C42B1C"    # Red for safety alarms
 DEFAULT_FONT = ("Segoe UI", 12)
 TITLE_FONT = ("Segoe UI", 16)
 
 # -------------------------------------------------
 # Global Variables
 # -------------------------------------------------
-root = tk.Tk()
-temperature_var = tk.StringVar(root, value="25")
-desired_temp_var = tk.StringVar(root, value="100")
-temp_var = tk.StringVar(root, value="Temperature: 0.00°C\nDesired Temperature: 0°C")
-fan_speed_var = tk.IntVar(root, value=50)
-spool_motor_speed_var = tk.IntVar(root, value=50)
-fan_speed_text = tk.StringVar(root, value="Fan Speed: 0%")
-spool_motor_speed_text = tk.StringVar(root, value="Spool Motor Speed: 50%")
-ssr_state_var = tk.StringVar(root, value="SSR State: OFF")
-serial_buffer = ""
-last_set_temperature = None
-stop_threads = False
-
-# Global List to Store Saved Widths
-saved_widths = []
+# The Tk root and the variables its widgets show; create_app() makes them, so
+# importing this module opens no window
+root = None
+temperature_var = desired_temp_var = temp_var = None
+fan_speed_var = spool_motor_speed_var = fan_speed_text = spool_motor_speed_text = None
+ssr_state_var = connection_var = production_var = None
+shutoff_target_var = shutoff_unit_var = shutoff_var = alarm_var = replay_var = None
+
+# Seconds from launch to the first drawn frame, the open port, and the first telemetry
+startup_times = {"first_frame": None, "connected": None, "first_telemetry": None}
+
 # Global Timer Variables
 timer_running = False
 remaining_time = 0  # Time in seconds for countdown
 
 SAVE_FILE = "strip_widths.txt"  # File to store the saved widths
-
-# Debounce events
-fan_speed_changed = Event()
-spool_speed_changed = Event()
+saved_widths = StripWidthStore(SAVE_FILE)  # Name-indexed; loaded at startup
+RUNS_DIR = "runs"  # Directory for run recordings
+RECIPES_DIR = "recipes"  # JSON recipes (see pultrusion.recipes)
+
+# Serial link settings requested from the firmware after connecting; older
+# firmware ignores them and stays in text mode at 9600 baud.
+COMPACT_TELEMETRY = True
+LINK_BAUDRATE = None  # e.g. 115200 for boards with a USB-UART bridge; USB boards ignore it
+
+# After a reconnect: "push" the GUI's settings to the machine again, or
+# "adopt" the settings the machine restored from EEPROM
+RESYNC_POLICY = "push"
+
+# On a sensor fault or thermal runaway (pultrusion.anomaly), turn the heater
+# off and the fan to full speed at once; False only shows the alarm
+SAFETY_ACTION = True
+
+# Export the diagnostics counters here every METRICS_INTERVAL seconds for monitoring to
+# scrape: Prometheus text format, or JSON if the name ends in .json (also Diagnostics menu)
+METRICS_FILE = None  # e.g. "metrics.prom"
+METRICS_INTERVAL = 10
+
+# Log records are written by a background thread, never by the serial threads.
+# LOG_LEVEL = "DEBUG" shows every command sent; LOG_FILE adds JSON lines, rotated at 10 MB.
+LOG_LEVEL = "INFO"
+LOG_FILE = None  # e.g. "pultrusion.log.jsonl"
+log = logging.getLogger("pultrusion.app")
+
+# Winder calibration for the metres counter (pultrusion.throughput): spool core and
+# filament diameters in mm. With SPOOL_WIDTH_MM set the spool grows as it fills.
+SPOOL_DIAMETER_MM = 60.0
+FILAMENT_DIAMETER_MM = 1.75
+SPOOL_WIDTH_MM = None  # e.g. 55 for a 1 kg spool
+METRES_PER_BOTTLE = 8.0  # Filament from one bottle's strip; measure it for your bottles
+PRODUCTION_INTERVAL = 1.0  # Seconds between counter display and shutoff updates
+
+# Live chart: initial time window (s) and redraws per second, whatever the telemetry rate
+CHART_SECONDS = 300
+CHART_FPS = 10
+
+# Every session is recorded to RUNS_DIR; replays can be stopped via replay_stop.
+# A replayed run goes into its own store, shown instead of the live one until it ends.
+run_recorder = None
+replay_stop = Event()
+replay_store = None
+
+# The running PID autotune, if any (see start_autotune)
+autotuner = None
+
+# Background threads post Tk variable updates here; the Tk loop applies them
+ui_pump = None
+
+# Metres produced, integrated from the winder speed, and the length shutoff in force
+production_counter = ProductionCounter(
+    ThroughputModel(SPOOL_DIAMETER_MM, FILAMENT_DIAMETER_MM, SPOOL_WIDTH_MM), METRES_PER_BOTTLE)
+production_lock = Lock()  # Serial lines, the update timer and the Tk buttons all use them
+length_shutoff = None
+
+# Parse time and unrecognised lines of the live serial stream
+parse_metrics = None
+metrics_exporter = None
 
 # -------------------------------------------------
 # Setup ttk Styles for a Modern Look
@@ -67,76 +143,177 @@ def donothing():
 # -------------------------------------------------
 # Serial Communication
 # -------------------------------------------------
-class ArduinoController:
-    def __init__(self):
-        self.arduino = None
-
-    def setup_connection(self):
-        com_port = simpledialog.askstring("COM Port", "Enter the COM port (e.g., COM3):")
-        if not com_port:
-            messagebox.showerror("Connection Error", "No COM port provided. Exiting.")
-            sys.exit()
+def setup_connection(port=None):
+    """
+    Connects in the background while the window is already up: to port if
+    given (a COM port, or "daemon" / "daemon:HOST:PORT" for the headless
+    daemon, pultrusion.daemon), otherwise to whichever USB serial port
+    answers like the firmware, trying the last-used port too. Falls back
+    to asking for the port.
+    """
+    global connected_port
+    ui_pump.post(connection_var, f"Connecting to {port}..." if port else "Searching for the machine...")
+    lines = []
+    try:
+        daemon_address = parse_address(port) if port else None
+        if daemon_address is not None:
+            controller = RemoteController()
+            controller.connect(daemon_address)
+        else:
+            # Connects as soon as the firmware speaks; no fixed settle delay
+            result = probe_port(port) if port else discover(preferred=load_last_port())
+            if result is None:
+                ui_pump.call(ask_for_port, f"No pultrusion machine answered on {port}." if port
+                             else "No pultrusion machine found.")
+                return
+            controller, lines, port = result.controller, result.lines, result.port
+            save_last_port(port)
+    except (serial.SerialException, OSError) as e:
+        ui_pump.call(ask_for_port, f"Could not connect to {port}: {e}")
+        return
 
-        try:
-            self.arduino = serial.Serial(com_port, 9600, timeout=1)
-            print(f"Connected to Arduino on {com_port} at 9600 baud")
-            time.sleep(2)  # Wait for Arduino to initialize
-        except serial.SerialException as e:
-            messagebox.showerror("Serial Error", str(e))
-            sys.exit()
-
-    def send_data_to_arduino(self, command):
-        if self.arduino and self.arduino.is_open:
-            try:
-                self.arduino.write((command + '\r\n').encode('utf-8'))
-                print(f"Sent to Arduino: {command}")
-            except Exception as e:
-                print(f"Error sending data: {e}")
-
-    def read_data_from_arduino(self):
-        global serial_buffer
-        try:
-            while self.arduino.in_waiting > 0:
-                serial_buffer += self.arduino.read().decode('utf-8', errors='ignore')
-                if '\n' in serial_buffer:
-                    line, serial_buffer = serial_buffer.split('\n', 1)
-                    return line.strip()
-        except Exception as e:
-            print(f"Error reading data: {e}")
-        return None
-
-    def close_connection(self):
-        if self.arduino:
-            self.arduino.close()
-            print("Closed serial connection.")
-
-arduino_controller = ArduinoController()
+    # Lines read while probing (the banner, say) go first, then the backend takes over the port
+    machine.attach(controller, lines, port)
+    connected_port = port
+    startup_times["connected"] = time.monotonic() - APP_STARTED
+    log.info("Connected to %s %.2f s after launch", port, startup_times["connected"])
+    ui_pump.post(connection_var, f"Connected: {port}")
+    negotiate_link()
+    serial_dispatcher.send("STATUS")  # The winder may already be running; the counter needs its speed
+
+def ask_for_port(reason):
+    # Tk thread: automatic connection failed, so ask like before
+    connection_var.set("Not connected")
+    com_port = simpledialog.askstring("COM Port", f"{reason}\n\nEnter the COM port (e.g., COM3), or \"daemon\":")
+    if com_port:
+        Thread(target=setup_connection, args=(com_port.strip(),), daemon=True).start()
+
+connected_port = None  # What setup_connection() connected to; reconnects go there first
+# The machine (pultrusion.machine); this window is a view over it. create_app()
+# makes it and these aliases for its parts:
+machine = None
+# The backend's asyncio loop is the only reader of the serial port; it also
+# runs the ack timeouts and the command coalescer's timers
+serial_dispatcher = None
+# Temperature, fan, winder and timer commands: newest value wins, duplicates are skipped
+command_coalescer = None
+# Presets and recipe files: one recipe at a time, steps tracked to completion
+recipe_runner = None
+# Telemetry history (fixed memory, ~24 h at 10 Hz)
+telemetry_store = None
+
+def show_alarm(alarm):
+    # Tk thread; the recipe and any autotune have already been cancelled
+    alarm_var.set(f"SAFETY ALARM ({alarm.rule}): {alarm.message}")
+    if SAFETY_ACTION:
+        desired_temp_var.set("0")
+    messagebox.showerror("Safety Alarm", f"{alarm.message}."
+                         + ("\n\nThe heater was turned off and the fan set to full speed." if SAFETY_ACTION else "")
+                         + "\n\nCheck the machine, then use Help > Reset Safety Alarms.")
+
+def reset_safety_alarms():
+    safety_monitor.reset()
+    alarm_var.set("")
+    log.info("Safety alarms reset.")
+
+# Watches every telemetry sample for sensor faults and thermal runaway; it is
+# the machine's first listener, so the safe state goes out before anything else runs
+safety_monitor = None
+
+def reconnect_machine():
+    # Supervisor thread: called with backoff until the machine answers again
+    daemon_address = parse_address(connected_port) if connected_port else None
+    if daemon_address is not None:
+        controller = RemoteController()
+        controller.connect(daemon_address)
+        return ProbeResult(connected_port, controller, [], 0.0)
+    # The board usually comes back under the same name, but any USB port will do
+    return discover(preferred=connected_port)
+
+def on_reconnected(result):
+    global connected_port
+    if not isinstance(result.controller, RemoteController):
+        connected_port = result.port
+        save_last_port(result.port)
+    negotiate_link()
+
+def adopt_machine_settings(status):
+    # Tk thread: the machine kept its own settings (RESYNC_POLICY = "adopt")
+    desired_temp_var.set(str(status.set_temperature))
+    if status.fan_on and status.fan_pwm > 0:
+        fan_speed_var.set(pwm_to_speed(status.fan_pwm))
+        fan_speed_text.set(f"Fan Speed: {fan_speed_var.get()}%")
+    if status.winder_on and status.winder_pwm > 0:
+        spool_motor_speed_var.set(pwm_to_speed(status.winder_pwm))
+        spool_motor_speed_text.set(f"Spool Motor Speed: {spool_motor_speed_var.get()}%")
+    log.info("Adopted the machine's settings: %s", status.to_line())
+
+def on_connection_state(state):
+    if state == "online":
+        ui_pump.post(connection_var, f"Connected: {connected_port}")
+    elif state == "reconnecting":
+        ui_pump.post(connection_var, "Connection lost, reconnecting...")
+    elif state == "resyncing":
+        ui_pump.post(connection_var, "Reconnected, restoring settings...")
+
+# Reopens the port when the cable is bumped; commands sent meanwhile wait in a bounded queue
+connection_supervisor = None
+
+# Diagnostics counters (create_app()), read only when shown or exported
+metrics_registry = None
+loop_monitors = []
+
+def negotiate_link():
+    """Switches to compact telemetry (and LINK_BAUDRATE) if the firmware supports it."""
+    if isinstance(machine.controller, RemoteController):
+        return  # The daemon owns the port and its settings
+    result = link.negotiate(serial_dispatcher, compact=COMPACT_TELEMETRY, baudrate=LINK_BAUDRATE)
+    log.info("Serial link: %s telemetry at %s baud",
+             "compact" if result["compact"] else "text", result["baudrate"])
 
 # -------------------------------------------------
 # Helper Functions
 # -------------------------------------------------
-def handle_serial_data(data):
+def on_machine_event(source, event, received_at):
     """
-    Expected data format example:
-    "Current Temperature: 25.5 C | Set Temperature: 100 C | SSR State: ON"
+    Serial loop thread: every live firmware event, once the Machine has
+    parsed it and updated its state, commands and telemetry history.
+    """
+    run_recorder.record_event(event)
+    with production_lock:
+        winder_changed = production_counter.observe(event, received_at)
+    if winder_changed:
+        update_production()
+    show_event(event, received_at)
+
+def show_event(event, received_at=None, live=True):
+    """
+    Shows a parsed firmware line, e.g.
+    "Current Temperature: 25.5 °C | Set Temperature: 100 °C | SSR State: ON"
+    (see pultrusion.protocol). live=False is used for replayed lines;
+    while a replay runs, live temperatures are not shown.
     """
     try:
-        match = re.search(r"Current Temperature:\s*([\d.]+)\s*C.*Set Temperature:\s*([\d.]+)\s*C.*SSR State:\s*(\w+)", data)
-        if match:
-            current_temp = match.group(1)
-            set_temp = match.group(2)
-            ssr_state = match.group(3)
-            temp_var.set(f"Temperature: {current_temp}°C\nDesired Temperature: {set_temp}°C")
-            ssr_state_var.set(f"SSR State: {ssr_state}")
+        if isinstance(event, TelemetrySample):
+            if live and startup_times["first_telemetry"] is None:
+                startup_times["first_telemetry"] = time.monotonic() - APP_STARTED
+                log.info("First telemetry %.2f s after launch", startup_times["first_telemetry"])
+            if live and replay_store is not None:
+                return
+            prefix = "" if live else "Replay: "
+            ui_pump.post(temp_var, f"{prefix}Temperature: {event.temperature:.2f}°C\nDesired Temperature: {event.set_temperature}°C", received_at)
+            ui_pump.post(ssr_state_var, f"SSR State: {'ON' if event.ssr_on else 'OFF'}", received_at)
+        elif isinstance(event, EmergencyStop):
+            ui_pump.post(ssr_state_var, "SSR State: OFF (Emergency Stop)", received_at)
+            log.warning("Emergency stop reported by Arduino (%s).", event.source)
+        elif isinstance(event, ShutdownStarted):
+            log.info("Arduino started its shutdown sequence.")
+            if live and length_shutoff is not None and not length_shutoff.done:
+                finish_length_shutoff()
+        elif isinstance(event, CoolingComplete):
+            log.info("Arduino finished cooling down.")
     except Exception as e:
-        print(f"Error parsing data: {e}")
-
-def read_serial_data():
-    while not stop_threads:
-        data = arduino_controller.read_data_from_arduino()
-        if data:
-            handle_serial_data(data)
-        time.sleep(0.1)
+        log.error("Error showing data: %s", e)
 
 def set_filament_preset(filament_type, filament_presets):
     if filament_type in filament_presets:
@@ -144,84 +321,78 @@ def set_filament_preset(filament_type, filament_presets):
         desired_temp_var.set(str(preset["temperature"]))
         fan_speed_var.set(preset["fan_speed"])
         spool_motor_speed_var.set(preset["spool_speed"])
-        send_set_temperature()
-        manual_fan_speed()
-        manual_spool_speed()
-        print(f"Preset for {filament_type} loaded: {preset}")
+        fan_speed_text.set(f"Fan Speed: {preset['fan_speed']}%")
+        spool_motor_speed_text.set(f"Spool Motor Speed: {preset['spool_speed']}%")
+        # All three settings go out in one serial write
+        run_recipe(Recipe(filament_type, [SetStep({"temperature": preset["temperature"],
+                                                   "fan": preset["fan_speed"],
+                                                   "spool": preset["spool_speed"]})]))
+        log.info("Preset for %s loaded: %s", filament_type, preset)
 
 def send_set_temperature():
-    def send_command_thread():
-        global last_set_temperature
-        try:
-            temp_value = int(desired_temp_var.get())
-            # Allow temperature to be updated even if it's the same value
-            if temp_value != last_set_temperature:
-                print(f"[DEBUG] Sending SET_TEMP command with value: {temp_value}")
-                arduino_controller.send_data_to_arduino(f"SET_TEMP:{temp_value}")
-                last_set_temperature = temp_value
-
-                # Wait for acknowledgment (up to 5 seconds)
-                start_time = time.time()
-                while time.time() - start_time < 5:
-                    response = arduino_controller.read_data_from_arduino()
-                    if response and f"Set Temperature updated to {temp_value}" in response:
-                        print(f"[DEBUG] Received acknowledgment: {response}")
-                        last_set_temperature = None  # Reset to allow future updates
-                        return
-                    time.sleep(0.1)
-
-                print("[WARNING] No acknowledgment received from Arduino.")
-                last_set_temperature = None
-            else:
-                print(f"[DEBUG] Desired temperature {temp_value}°C is already set. No command sent.")
+    try:
+        temp_value = int(desired_temp_var.get())
+    except ValueError:
+        messagebox.showerror("Input Error", "Please enter a valid temperature.")
+        return
 
-        except ValueError:
-            messagebox.showerror("Input Error", "Please enter a valid temperature.")
+    # The coalescer skips the command if the Arduino already has this value,
+    # and waits for the acknowledgment (up to 5 seconds) without blocking the GUI
+    log.debug("Requesting SET_TEMP with value: %s", temp_value)
+    machine.request_temperature(temp_value)
 
-    Thread(target=send_command_thread, daemon=True).start()
+def on_command_result(channel, value, error):
+    # Runs on the serial loop thread once a coalesced command is acknowledged or times out
+    if error is None:
+        log.debug("Received acknowledgment for %s = %s", channel, value)
+    elif isinstance(error, TimeoutError):
+        log.warning("No acknowledgment received from Arduino for %s = %s.", channel, value)
 
 def send_eject_command():
     # Sends the EJECT DEVICE command to the Arduino.
-    print("[DEBUG] Sending EJECT DEVICE command.")
-    arduino_controller.send_data_to_arduino("EJECT")
+    log.debug("Sending EJECT DEVICE command.")
+    machine.eject()
     messagebox.showinfo("Eject Device", "EJECT DEVICE command sent to Arduino.")
 
 def update_fan_speed_display(value):
     fan_speed = int(float(value))
     fan_speed_text.set(f"Fan Speed: {fan_speed}%")
     fan_speed_var.set(fan_speed)
-    fan_speed_changed.set()
+    # Sent by the coalescer: only the newest value, at most every 0.2 s
+    machine.set_fan_speed(fan_speed)
 
 def update_spool_motor_speed_display(value):
     spool_speed = int(float(value))
     spool_motor_speed_text.set(f"Spool Motor Speed: {spool_speed}%")
     spool_motor_speed_var.set(spool_speed)
-    spool_speed_changed.set()
+    machine.set_spool_speed(spool_speed)
 
 def manual_fan_speed():
     slider_value = int(fan_speed_var.get())
     fan_speed_text.set(f"Fan Speed: {slider_value}%")
-    pwm_value = int((100 - slider_value) / 100.0 * 254) + 1
-    arduino_controller.send_data_to_arduino(f"SET_FAN_PWM:{pwm_value}")
+    machine.set_fan_speed(slider_value)
 
 def manual_spool_speed():
     spool_speed = int(spool_motor_speed_var.get())
     spool_motor_speed_text.set(f"Spool Motor Speed: {spool_speed}%")
-    winder_pwm = int((100 - spool_speed) / 100.0 * 254) + 1
-    arduino_controller.send_data_to_arduino(f"SET_WINDER_PWM:{winder_pwm}")
+    machine.set_spool_speed(spool_speed)
 
 def load_saved_widths():
-    if os.path.exists(SAVE_FILE):
-        with open(SAVE_FILE, "r") as file:
-            for line in file:
-                name, width = line.strip().split(" : ")
-                saved_widths.append((name, float(width)))
+    try:
+        saved_widths.load()
+    except OSError as e:
+        log.warning("Could not read %s: %s", SAVE_FILE, e)
+        return
+    if saved_widths.skipped:
+        log.warning("Skipped %d malformed line(s) in %s", saved_widths.skipped, SAVE_FILE)
 
 def save_width_to_file(name, width):
-    with open(SAVE_FILE, "a") as file:
-        file.write(f"{name} : {width:.2f}\n")
+    # Replaces any earlier width saved under the same name
+    saved_widths.upsert(name, width)
 
 def calculate_strip_width():
+    batch_rows = []  # (name, thickness, width) of the last batch
+
     def calculate():
         try:
             thickness = float(thickness_entry.get())
@@ -230,8 +401,7 @@ def calculate_strip_width():
                 result_label.config(text="Please enter a name for the strip.")
                 return
 
-            # Example formula for width estimation
-            width = thickness * 2.5
+            width = strip_width(thickness)
             result_label.config(text=f"Estimated Width: {width:.2f} mm")
             return name, width
         except ValueError:
@@ -241,13 +411,49 @@ def calculate_strip_width():
         result = calculate()
         if result:
             name, width = result
-            saved_widths.append((name, width))
             save_width_to_file(name, width)
             result_label.config(text=f"Saved: {name} - {width:.2f} mm")
 
+    def show_batch(names, thicknesses):
+        # One vectorized calculation for the whole batch
+        widths = strip_width(thicknesses)
+        prefix = name_entry.get().strip() or "Strip"
+        batch_rows[:] = [(name or f"{prefix} {thickness:.2f}", thickness, width)
+                         for name, thickness, width in zip(names, thicknesses.tolist(), widths.tolist())]
+        batch_list.refresh(len(batch_rows))
+        result_label.config(text=f"{len(batch_rows)} widths, "
+                                 f"{widths.min():.2f} to {widths.max():.2f} mm")
+
+    def calculate_batch():
+        try:
+            thicknesses = parse_thicknesses(batch_entry.get())
+        except ValueError as e:
+            result_label.config(text=str(e))
+            return
+        show_batch([None] * len(thicknesses), thicknesses)
+
+    def load_batch_csv():
+        path = filedialog.askopenfilename(parent=width_window, title="Thickness CSV",
+                                          filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            names, thicknesses = read_thickness_csv(path)
+        except (OSError, ValueError) as e:
+            result_label.config(text=str(e))
+            return
+        show_batch(names, thicknesses)
+
+    def save_batch():
+        if not batch_rows:
+            result_label.config(text="Calculate a batch first.")
+            return
+        added = saved_widths.upsert_many((name, width) for name, _, width in batch_rows)
+        result_label.config(text=f"Saved {len(batch_rows)} widths ({added} new names)")
+
     width_window = tk.Toplevel(root)
     width_window.title("Calculate Strip Width")
-    width_window.geometry("400x350")
+    width_window.geometry("420x620")
     width_window.configure(bg=BG_COLOR)
 
     ttk.Label(width_window, text="Enter Strip Name:").pack(pady=5)
@@ -264,60 +470,80 @@ def calculate_strip_width():
     result_label = ttk.Label(width_window, text="")
     result_label.pack(pady=10)
 
+    # Batch: a sweep such as 0.20:0.50:0.05, a list, or a CSV of [name,]thickness rows.
+    # Unnamed rows are saved as "<strip name> <thickness>".
+    ttk.Label(width_window, text="Batch Thicknesses (start:stop:step or list):").pack(pady=5)
+    batch_entry = ttk.Entry(width_window, width=30)
+    batch_entry.pack(pady=5)
+    batch_buttons = ttk.Frame(width_window)
+    batch_buttons.pack(pady=5)
+    ttk.Button(batch_buttons, text="Calculate Batch", command=calculate_batch).pack(side=tk.LEFT, padx=3)
+    ttk.Button(batch_buttons, text="Load CSV...", command=load_batch_csv).pack(side=tk.LEFT, padx=3)
+    ttk.Button(batch_buttons, text="Save All", command=save_batch).pack(side=tk.LEFT, padx=3)
+
+    def render_batch_row(i):
+        name, thickness, width = batch_rows[i]
+        return f"{name}: {thickness:.2f} mm -> {width:.2f} mm"
+
+    batch_list = VirtualListView(width_window, 0, render_batch_row, font=DEFAULT_FONT,
+                                 bg=BG_COLOR, fg=FG_COLOR, select_bg=ACCENT_COLOR)
+    batch_list.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
 def show_saved_widths():
     save_window = tk.Toplevel(root)
     save_window.title("Saved Widths")
     save_window.geometry("400x300")
     save_window.configure(bg=BG_COLOR)
 
-    ttk.Label(save_window, text="Saved Widths:").pack(pady=10)
-    listbox = tk.Listbox(save_window, bg=BG_COLOR, fg=FG_COLOR, bd=0, highlightthickness=0, font=DEFAULT_FONT)
+    def find_width(event=None):
+        # Exact name lookup in the store's index; no scan over the list
+        name = search_entry.get().strip()
+        if name in saved_widths:
+            listbox.see(saved_widths.index(name))
+        elif name:
+            search_entry.configure(foreground="red")
+
+    header = ttk.Frame(save_window)
+    header.pack(fill=tk.X, padx=10, pady=10)
+    ttk.Label(header, text=f"Saved Widths ({len(saved_widths)}):").pack(side=tk.LEFT)
+    search_entry = ttk.Entry(header, width=16)
+    search_entry.pack(side=tk.RIGHT)
+    search_entry.bind("<Return>", find_width)
+    search_entry.bind("<Key>", lambda event: search_entry.configure(foreground=""))
+    ttk.Label(header, text="Find:").pack(side=tk.RIGHT, padx=5)
+
+    # Rows are rendered on demand, so opening the window costs the same for any library size
+    def render_row(i):
+        name, width = saved_widths.row(i)
+        return f"{name}: {width:.2f} mm"
+
+    listbox = VirtualListView(save_window, len(saved_widths), render_row, font=DEFAULT_FONT,
+                              bg=BG_COLOR, fg=FG_COLOR, select_bg=ACCENT_COLOR)
     listbox.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
-    for name, width in saved_widths:
-        listbox.insert(tk.END, f"{name}: {width:.2f} mm")
-
 def add_timer_controls():
     # Placeholder for adding additional timer controls if needed
     pass
 
 def on_closing():
-    global stop_threads
-    stop_threads = True
-    arduino_controller.close_connection()
+    replay_stop.set()
+    ui_pump.stop()
+    connection_supervisor.stop()
+    if metrics_exporter is not None:
+        metrics_exporter.stop()
+    machine.close()
+    run_recorder.close()
     root.destroy()
-
-def debounce_fan_speed():
-    while not stop_threads:
-        fan_speed_changed.wait()
-        fan_speed_changed.clear()
-        time.sleep(0.2)  # Debounce delay
-        slider_value = int(fan_speed_var.get())
-        fan_speed_text.set(f"Fan Speed: {slider_value}%")
-        # Map slider value (0 slowest, 100 fastest) to PWM value
-        pwm_value = int((100 - slider_value) / 100.0 * 254) + 1
-        arduino_controller.send_data_to_arduino(f"SET_FAN_PWM:{pwm_value}")
-
-def debounce_spool_speed():
-    while not stop_threads:
-        spool_speed_changed.wait()
-        spool_speed_changed.clear()
-        time.sleep(0.2)  # Debounce delay
-        spool_speed = int(spool_motor_speed_var.get())
-        spool_motor_speed_text.set(f"Spool Motor Speed: {spool_speed}%")
-        # Map spool slider value (0 slowest, 100 fastest) to PWM value
-        winder_pwm = int((100 - spool_speed) / 100.0 * 254) + 1
-        arduino_controller.send_data_to_arduino(f"SET_WINDER_PWM:{winder_pwm}")
+    shutdown_logging()
 
 # -------------------------------------------------
 # Timer Functions
 # -------------------------------------------------
 def send_shutoff_time(shutoff_seconds):
     try:
-        # Use the new command string "SET_SHUTDOWN_TIME:" as expected by the Arduino code.
-        command = f"SET_SHUTDOWN_TIME:{shutoff_seconds}"
-        arduino_controller.send_data_to_arduino(command)
-        print(f"Shutdown timer set for {shutoff_seconds} seconds.")
+        # Sends "SET_SHUTDOWN_TIME:<seconds>" as expected by the Arduino code.
+        machine.set_shutdown_time(shutoff_seconds)
+        log.info("Shutdown timer set for %s seconds.", shutoff_seconds)
     except Exception as e:
         messagebox.showerror("Error", f"Failed to set shutdown timer: {e}")
 
@@ -326,6 +552,9 @@ def start_timer():
     if timer_running:
         messagebox.showinfo("Timer Running", "A timer is already running.")
         return
+    if length_shutoff is not None and not length_shutoff.done:
+        messagebox.showinfo("Timer Running", "A length shutoff is scheduled; cancel it first.")
+        return
 
     try:
         minutes = int(timer_entry.get())
@@ -352,14 +581,102 @@ def update_countdown():
         countdown_label.config(text="Time Remaining: 00:00")
         turn_off_all()
 
-def turn_off_all():
+def turn_off_all(title="Timer Finished"):
     desired_temp_var.set("0")
     fan_speed_var.set(0)
     spool_motor_speed_var.set(0)
     temp_var.set("Temperature: --\nDesired Temperature: 0°C")
     fan_speed_text.set("Fan Speed: 0%")
     spool_motor_speed_text.set("Spool Motor Speed: 0%")
-    messagebox.showinfo("Timer Finished", "All systems have been turned off.")
+    messagebox.showinfo(title, "All systems have been turned off.")
+
+# -------------------------------------------------
+# Production Counter & Length Shutoff
+# -------------------------------------------------
+def format_duration(seconds):
+    hours, rest = divmod(int(seconds), 3600)
+    return f"{hours}:{rest // 60:02}:{rest % 60:02}"
+
+def update_production():
+    """Redraws the counter and moves the shutoff timer if the speed changed."""
+    with production_lock:
+        snapshot = production_counter.snapshot()
+        shutoff = length_shutoff
+        seconds = shutoff.update() if shutoff is not None and not shutoff.done else None
+    text = f"Output: {snapshot['metres_per_hour']:.1f} m/h | Produced: {snapshot['length_m']:.2f} m"
+    if snapshot["bottles"] is not None:
+        text += f" ({snapshot['bottles']:.1f} bottles)"
+    ui_pump.post(production_var, text)
+    if shutoff is None or shutoff.done:
+        return
+    target = f"{shutoff.target_m:.1f} m"
+    if seconds is None:
+        ui_pump.post(shutoff_var, f"Shutoff at {target}: winder stopped, timer on hold")
+    else:
+        ui_pump.post(shutoff_var, f"Shutoff at {target}: {shutoff.remaining_m:.2f} m, "
+                                  f"{format_duration(seconds)} left")
+
+def production_loop():
+    # Serial loop thread: keeps the display and the shutoff deadline current
+    update_production()
+    serial_dispatcher.call_later(PRODUCTION_INTERVAL, production_loop)
+
+def send_length_shutoff_time(seconds):
+    machine.set_shutdown_time(seconds)
+    log.info("Length shutoff: timer set to %s seconds.", seconds)
+
+def cancel_shutdown_timer():
+    machine.cancel_shutdown()
+
+def start_length_shutoff():
+    """Schedules the shutoff after a length or a number of bottles, counted from now."""
+    global length_shutoff
+    if timer_running:
+        messagebox.showinfo("Length Shutoff", "The minutes timer is running.")
+        return
+    try:
+        amount = float(shutoff_target_var.get())
+        if amount <= 0:
+            raise ValueError
+    except ValueError:
+        messagebox.showerror("Input Error", "Please enter a positive number of metres or bottles.")
+        return
+    metres = amount * METRES_PER_BOTTLE if shutoff_unit_var.get() == "bottles" else amount
+    with production_lock:
+        if length_shutoff is not None:
+            length_shutoff.stop()
+        length_shutoff = LengthShutoff(production_counter, send_length_shutoff_time,
+                                       cancel_shutdown_timer,
+                                       production_counter.snapshot()["length_m"] + metres)
+    update_production()
+    log.info("Shutting off after %.2f m more filament.", metres)
+
+def cancel_length_shutoff():
+    global length_shutoff
+    with production_lock:
+        if length_shutoff is not None:
+            length_shutoff.stop()
+        length_shutoff = None
+    shutoff_var.set("")
+
+def finish_length_shutoff():
+    # Serial loop thread: the firmware's timer ran out and it is shutting down
+    with production_lock:
+        length_shutoff.finished()
+        produced = production_counter.length_m
+    ui_pump.post(shutoff_var, f"Target reached: {produced:.2f} m produced")
+    ui_pump.call(turn_off_all, "Length Reached")
+
+def new_spool():
+    """Starts an empty spool, so the diameter (and speed) start from the core again."""
+    with production_lock:
+        production_counter.reset_spool()
+    update_production()
+
+def reset_production():
+    with production_lock:
+        production_counter.reset()
+    update_production()
 
 # -------------------------------------------------
 # Additional Requested Features
@@ -371,9 +688,271 @@ def set_pp():
     """
     desired_temp_var.set("160")
     fan_speed_var.set(10)
-    # Send commands
+    fan_speed_text.set("Fan Speed: 10%")
+    run_recipe(Recipe("PP", [SetStep({"temperature": 160, "fan": 10})]))
+
+def on_recipe_progress(recipe, step_number, text):
+    # Runs on the recipe scheduler thread
+    log.info("Recipe %s step %s: %s", recipe.name, step_number, text)
+
+def on_recipe_done(future):
+    error = future.exception()
+    if error is not None and str(error) != "Recipe cancelled":
+        messagebox.showerror("Recipe", f"Recipe stopped: {error}")
+
+def run_recipe(recipe):
+    if SAFETY_ACTION and safety_monitor.detector.active:
+        messagebox.showinfo("Recipe", "A safety alarm is active; reset it first (Help > Reset Safety Alarms).")
+        return
+    if recipe_runner.running:
+        messagebox.showinfo("Recipe", f"Recipe \"{recipe_runner.recipe.name}\" is still running.")
+        return
+    future = recipe_runner.run(recipe)
+    future.add_done_callback(lambda f: ui_pump.call(on_recipe_done, f))
+
+def open_recipe():
+    """Loads a JSON recipe and runs it unattended."""
+    path = filedialog.askopenfilename(title="Run Recipe",
+                                      initialdir=RECIPES_DIR if os.path.isdir(RECIPES_DIR) else ".",
+                                      filetypes=[("Recipes", "*.json")])
+    if not path:
+        return
+    try:
+        recipe = Recipe.load(path)
+    except (OSError, ValueError) as e:
+        messagebox.showerror("Recipe", f"Could not load recipe: {e}")
+        return
+    run_recipe(recipe)
+
+def stop_recipe():
+    recipe_runner.cancel()
+
+def replay_line(line, received_at):
+    event = parse_line(line)
+    replay_store.add_event(event, received_at)
+    show_event(event, received_at, live=False)
+
+def replay_run():
+    """Plays a recorded run back through the normal display pipeline."""
+    global replay_store
+    if replay_store is not None:
+        messagebox.showinfo("Replay Run", "A run is already being replayed; stop it first.")
+        return
+    path = filedialog.askopenfilename(title="Replay Run", initialdir=RUNS_DIR,
+                                      filetypes=[("Run recordings", "*.plr")])
+    if not path:
+        return
+    speed = simpledialog.askfloat("Replay Speed",
+                                  "Playback speed (1 = real time, 10 = 10x, 0 = as fast as possible):",
+                                  initialvalue=1.0, minvalue=0)
+    if speed is None:
+        return
+
+    def replay_thread():
+        try:
+            count = replay(session_files(path), replay_line, speed=speed, stop_event=replay_stop)
+            log.info("Replayed %d lines from %s", count, os.path.basename(path))
+        finally:
+            ui_pump.call(end_replay)
+
+    replay_stop.clear()
+    replay_store = TelemetryStore()
+    live_chart.set_store(replay_store)
+    replay_var.set(f"REPLAY of {os.path.basename(path)}, not the live machine (File > Stop Replay)")
+    Thread(target=replay_thread, daemon=True).start()
+
+def end_replay():
+    # Tk thread: back to the live telemetry
+    global replay_store
+    replay_store = None
+    live_chart.set_store(telemetry_store)
+    replay_var.set("")
+
+def stop_replay():
+    replay_stop.set()
+
+def apply_set_temperature(value):
+    # Tk thread: keeps the entry box in step with what the autotuner requests
+    if SAFETY_ACTION and safety_monitor.detector.active:
+        return  # Posted before the alarm cancelled the autotune
+    desired_temp_var.set(str(int(value)))
     send_set_temperature()
-    manual_fan_speed()
+
+def start_autotune():
+    """Steps the temperature, fits a model, and pushes PID gains to the Arduino."""
+    global autotuner
+    if autotuner is not None:
+        messagebox.showinfo("Autotune PID", "An autotune is already running.")
+        return
+    if SAFETY_ACTION and safety_monitor.detector.active:
+        messagebox.showinfo("Autotune PID", "A safety alarm is active; reset it first (Help > Reset Safety Alarms).")
+        return
+    try:
+        default = float(desired_temp_var.get())
+    except ValueError:
+        default = 200.0
+    target = simpledialog.askfloat("Autotune PID",
+                                   "Target temperature (°C). The heater settles 20 °C below it,\n"
+                                   "then steps up twice; this takes several minutes.",
+                                   initialvalue=default, minvalue=60, maxvalue=300)
+    if target is None:
+        return
+    autotuner = Autotuner(serial_dispatcher, lambda value: ui_pump.call(apply_set_temperature, value),
+                          target, progress=lambda text: log.info("Autotune: %s", text))
+    Thread(target=run_autotune, args=(autotuner,), daemon=True).start()
+
+def run_autotune(tuner):
+    global autotuner
+    try:
+        report = tuner.run()
+        ui_pump.call(messagebox.showinfo, "Autotune PID", format_report(report))
+    except Exception as e:
+        ui_pump.call(messagebox.showerror, "Autotune PID", f"Autotune failed: {e}")
+    finally:
+        autotuner = None
+
+def cancel_autotune():
+    if autotuner is not None:
+        autotuner.cancel()
+
+def use_bang_bang_control():
+    """Switches the Arduino back to its original on/off heater control."""
+    serial_dispatcher.send("CONTROL:BANGBANG")
+
+def show_ui_latency():
+    """Shows how long telemetry takes from the serial port to the screen."""
+    stats = ui_pump.stats()
+    if stats["last_lag"] is None:
+        messagebox.showinfo("UI Latency", "No telemetry has been displayed yet.")
+        return
+    messagebox.showinfo("UI Latency",
+                        f"Last: {stats['last_lag'] * 1000:.1f} ms\n"
+                        f"Average: {stats['avg_lag'] * 1000:.1f} ms\n"
+                        f"Worst: {stats['max_lag'] * 1000:.1f} ms\n"
+                        f"Updates: {stats['updates_applied']} shown / {stats['updates_posted']} posted")
+
+def show_command_traffic():
+    """Shows how many control commands the coalescer sent and suppressed."""
+    lines = []
+    for channel, stats in command_coalescer.stats().items():
+        lines.append(f"{channel}: {stats['sent']} sent / {stats['requested']} requested "
+                     f"({stats['duplicates']} duplicates, {stats['superseded']} superseded, "
+                     f"{stats['timeouts']} unacknowledged)")
+    messagebox.showinfo("Command Traffic", "\n".join(lines))
+
+def show_diagnostics():
+    """Live view of the instrumentation counters, refreshed every second."""
+    window = tk.Toplevel(root)
+    window.title("Diagnostics")
+    window.configure(bg=BG_COLOR)
+    text_var = tk.StringVar(window)
+    ttk.Label(window, textvariable=text_var, font=("Consolas", 10), justify=tk.LEFT).pack(
+        fill=tk.BOTH, expand=True, padx=10, pady=10)
+    previous = {}
+
+    def ms(value):
+        return f"{value * 1000:.1f} ms" if value is not None and value != float("inf") else "-"
+
+    def latency(name, summary):
+        if not summary["count"]:
+            return f"{name:<16} no samples"
+        return (f"{name:<16} mean {ms(summary['mean'])}, p50 <= {ms(summary['p50'])}, "
+                f"p99 <= {ms(summary['p99'])} ({summary['count']})")
+
+    def refresh():
+        if not window.winfo_exists():
+            return
+        now = time.monotonic()
+        snapshot = metrics_registry.snapshot()
+
+        def rate(name):
+            if name not in snapshot or "at" not in previous or now <= previous["at"]:
+                return 0.0
+            return (snapshot[name] - previous.get(name, snapshot[name])) / (now - previous["at"])
+
+        parse = snapshot["parse_seconds"]
+        lines = [
+            f"Serial in:   {rate('serial_bytes_received_total'):8.0f} B/s  "
+            f"{rate('serial_lines_received_total'):6.1f} lines/s",
+            f"Serial out:  {rate('serial_bytes_sent_total'):8.0f} B/s  "
+            f"{rate('serial_commands_sent_total'):6.1f} commands/s",
+            f"Lost lines:  {snapshot.get('serial_partial_lines_dropped_total', 0)} partial, "
+            f"{snapshot.get('serial_bad_frames_total', 0)} bad frames, "
+            f"{snapshot['lines_unparsed_total']} unparsed of {snapshot['lines_parsed_total']}",
+            f"Parse time:  mean {parse['mean'] * 1e6:.1f} us" if parse["count"] else "Parse time:  -",
+            latency("Command ack", snapshot["ack_latency_seconds"]),
+            latency("Command echo", snapshot["echo_latency_seconds"]),
+            f"Unacknowledged: {snapshot['acks_timed_out_total']} of "
+            f"{snapshot['acks_timed_out_total'] + snapshot['acks_received_total']}",
+            latency("UI lag", snapshot["ui_lag_seconds"]),
+            latency("Chart frame", snapshot["chart_render_seconds"]),
+        ]
+        for monitor in loop_monitors:
+            name = monitor.name.replace("-", "_")
+            busy = snapshot[f"{name}_loop_utilisation"]
+            lag = snapshot[f"{name}_loop_lag_seconds"]
+            lines.append(f"{monitor.name + ' loop:':<22} "
+                         f"{'-' if busy is None else f'{busy * 100:.1f} % busy'}, "
+                         f"timers late p99 <= {ms(lag['p99'])}")
+        lines.append(f"Reconnects: {snapshot['reconnects_total']}, "
+                     f"downtime {snapshot['downtime_seconds_total']:.1f} s")
+        lines.append(f"Safety alarms: {snapshot['safety_alarms_total']}"
+                     + (f", last reaction {ms(safety_monitor.last_reaction)}"
+                        if safety_monitor.last_reaction is not None else ""))
+        if metrics_exporter is not None:
+            lines.append(f"Exporting to {metrics_exporter.path} every {metrics_exporter.interval:g} s")
+        text_var.set("\n".join(lines))
+        previous.clear()
+        previous.update(snapshot, at=now)
+        window.after(1000, refresh)
+
+    refresh()
+
+def export_metrics(path=None):
+    """Starts writing the metrics to path (asked for if None) every METRICS_INTERVAL seconds."""
+    global metrics_exporter
+    if path is None:
+        path = filedialog.asksaveasfilename(
+            title="Export Metrics", defaultextension=".prom",
+            filetypes=[("Prometheus text", "*.prom"), ("JSON", "*.json"), ("All files", "*.*")])
+        if not path:
+            return
+    stop_metrics_export()
+    metrics_exporter = MetricsExporter(metrics_registry, path, METRICS_INTERVAL)
+    metrics_exporter.start()
+    log.info("Exporting metrics to %s every %s s", path, METRICS_INTERVAL)
+
+def stop_metrics_export():
+    global metrics_exporter
+    if metrics_exporter is not None:
+        metrics_exporter.stop()
+        metrics_exporter = None
+
+def show_connection():
+    """Shows reconnects and downtime since launch."""
+    stats = connection_supervisor.stats()
+
+    def seconds(value):
+        return f"{value:.1f} s" if value is not None else "-"
+    messagebox.showinfo("Connection", "\n".join([
+        f"Port: {connected_port or 'none'} ({stats['state']})",
+        f"Disconnects: {stats['disconnects']} ({stats['attempts']} reconnect attempts)",
+        f"Current outage: {seconds(stats['downtime'])}",
+        f"Last outage: {seconds(stats['last_downtime'])}, resync {seconds(stats['last_resync'])}",
+        f"Total downtime: {seconds(stats['total_downtime'])}",
+        f"Queued commands: {stats['queued']} ({stats['dropped']} dropped)",
+    ]))
+
+def mark_first_frame():
+    startup_times["first_frame"] = time.monotonic() - APP_STARTED
+    log.info("First frame %.2f s after launch", startup_times["first_frame"])
+
+def show_startup_timing():
+    """Shows how long startup took, from launch."""
+    names = (("first_frame", "First frame"), ("connected", "Connected"), ("first_telemetry", "First telemetry"))
+    messagebox.showinfo("Startup Timing", "\n".join(
+        f"{label}: {startup_times[key]:.2f} s" if startup_times[key] is not None else f"{label}: not yet"
+        for key, label in names))
 
 def show_about():
     """Displays the About dialog with version info."""
@@ -384,7 +963,7 @@ def show_about():
 # -------------------------------------------------
 def create_gui():
     root.title("Filament Machine Control Interface")
-    root.geometry("850x750")
+    root.geometry("850x950")
     root.configure(bg=BG_COLOR)
 
     setup_styles()  # Apply modern styles to ttk widgets
@@ -396,16 +975,36 @@ def create_gui():
     filemenu = Menu(menubar, tearoff=0)
     filemenu.add_command(label="New", command=donothing)
     filemenu.add_command(label="Open", command=donothing)
+    filemenu.add_command(label="Replay Run...", command=replay_run)
+    filemenu.add_command(label="Stop Replay", command=stop_replay)
     filemenu.add_command(label="Save", command=donothing)
     filemenu.add_command(label="PP", command=set_pp)  # New "PP" option
+    filemenu.add_command(label="Run Recipe...", command=open_recipe)
+    filemenu.add_command(label="Stop Recipe", command=stop_recipe)
     filemenu.add_separator()
     filemenu.add_command(label="Exit", command=root.quit)
     menubar.add_cascade(label="File", menu=filemenu)
 
+    diagnosticsmenu = Menu(menubar, tearoff=0)
+    diagnosticsmenu.add_command(label="Show Diagnostics", command=show_diagnostics)
+    diagnosticsmenu.add_command(label="Export Metrics...", command=export_metrics)
+    diagnosticsmenu.add_command(label="Stop Export", command=stop_metrics_export)
+    menubar.add_cascade(label="Diagnostics", menu=diagnosticsmenu)
+
     helpmenu = Menu(menubar, tearoff=0)
     helpmenu.add_command(label="Set Timer", command=add_timer_controls)
+    helpmenu.add_command(label="New Spool", command=new_spool)
+    helpmenu.add_command(label="Reset Production Counter", command=reset_production)
     helpmenu.add_command(label="Strip Width", command=calculate_strip_width)
     helpmenu.add_command(label="Save Widths", command=show_saved_widths)
+    helpmenu.add_command(label="Reset Safety Alarms", command=reset_safety_alarms)
+    helpmenu.add_command(label="Autotune PID...", command=start_autotune)
+    helpmenu.add_command(label="Cancel Autotune", command=cancel_autotune)
+    helpmenu.add_command(label="Bang-Bang Control", command=use_bang_bang_control)
+    helpmenu.add_command(label="UI Latency", command=show_ui_latency)
+    helpmenu.add_command(label="Startup Timing", command=show_startup_timing)
+    helpmenu.add_command(label="Connection", command=show_connection)
+    helpmenu.add_command(label="Command Traffic", command=show_command_traffic)
     helpmenu.add_command(label="About...", command=show_about)  # Updated to show version
     menubar.add_cascade(label="Help", menu=helpmenu)
     root.config(menu=menubar)
@@ -418,6 +1017,7 @@ def create_gui():
 
     # Temperature Display
     ttk.Label(top_frame, textvariable=temp_var, font=TITLE_FONT).pack(pady=5)
+    ttk.Label(top_frame, textvariable=replay_var, font=DEFAULT_FONT, foreground=ACCENT_COLOR).pack()
 
     # Temperature Controls (Entry & Buttons)
     temp_controls_frame = ttk.Frame(top_frame, style="TFrame")
@@ -426,6 +1026,12 @@ def create_gui():
     ttk.Button(temp_controls_frame, text="Set Temperature", command=send_set_temperature).pack(side="left", padx=5)
     ttk.Button(temp_controls_frame, text="Eject Device", command=send_eject_command).pack(side="left", padx=5)
 
+    # Live chart of temperature, set point and SSR state
+    global live_chart
+    live_chart = LiveChart(root, telemetry_store, seconds=CHART_SECONDS, fps=CHART_FPS, bg=BG_COLOR,
+                           fg=FG_COLOR, set_color=ACCENT_COLOR)
+    live_chart.pack(padx=20, fill="x")
+
     # ---------------------------
     # Middle Frame: Fan & Spool
     # ---------------------------
@@ -466,6 +1072,8 @@ def create_gui():
 
     # SSR State Display
     ttk.Label(bottom_frame, textvariable=ssr_state_var, font=TITLE_FONT).pack(pady=5)
+    ttk.Label(bottom_frame, textvariable=alarm_var, font=DEFAULT_FONT, foreground=ALARM_COLOR).pack()
+    ttk.Label(bottom_frame, textvariable=connection_var, font=DEFAULT_FONT).pack()
 
     # Timer Controls
     timer_frame = ttk.Frame(bottom_frame, style="TFrame")
@@ -478,6 +1086,18 @@ def create_gui():
 
     ttk.Button(timer_frame, text="Start Timer", command=start_timer).pack(side="left", padx=5)
 
+    # Production: metres from the winder speed, and a shutoff once enough is made
+    ttk.Label(bottom_frame, textvariable=production_var, font=DEFAULT_FONT).pack()
+    shutoff_frame = ttk.Frame(bottom_frame, style="TFrame")
+    shutoff_frame.pack(pady=5)
+    ttk.Label(shutoff_frame, text="Shut off after:", font=DEFAULT_FONT).pack(side="left", padx=5)
+    ttk.Entry(shutoff_frame, textvariable=shutoff_target_var, width=10).pack(side="left", padx=5)
+    ttk.Combobox(shutoff_frame, textvariable=shutoff_unit_var, values=("metres", "bottles"),
+                 state="readonly", width=8).pack(side="left", padx=5)
+    ttk.Button(shutoff_frame, text="Schedule", command=start_length_shutoff).pack(side="left", padx=5)
+    ttk.Button(shutoff_frame, text="Cancel", command=cancel_length_shutoff).pack(side="left", padx=5)
+    ttk.Label(bottom_frame, textvariable=shutoff_var, font=DEFAULT_FONT).pack()
+
     # Countdown Label
     global countdown_label
     countdown_label = ttk.Label(root, text="Time Remaining: 00:00", font=DEFAULT_FONT)
@@ -487,21 +1107,106 @@ def create_gui():
     root.protocol("WM_DELETE_WINDOW", on_closing)
 
 # -------------------------------------------------
-# Main Execution
+# Startup
 # -------------------------------------------------
-load_saved_widths()
-arduino_controller.setup_connection()
-create_gui()
-
-# Start serial reading thread
-serial_thread = Thread(target=read_serial_data, daemon=True)
-serial_thread.start()
-
-# Start debounce threads
-fan_thread = Thread(target=debounce_fan_speed, daemon=True)
-fan_thread.start()
-
-spool_thread = Thread(target=debounce_spool_speed, daemon=True)
-spool_thread.start()
+def create_app():
+    """
+    Makes the Tk root, the Machine and everything that watches it. Nothing
+    is created at import time, so other programs can import this module.
+    """
+    global root, temperature_var, desired_temp_var, temp_var, fan_speed_var, spool_motor_speed_var
+    global fan_speed_text, spool_motor_speed_text, ssr_state_var, connection_var, production_var
+    global shutoff_target_var, shutoff_unit_var, shutoff_var, alarm_var, replay_var
+    global run_recorder, ui_pump, parse_metrics, machine, serial_dispatcher, command_coalescer
+    global recipe_runner, telemetry_store, safety_monitor, connection_supervisor
+    global metrics_registry, loop_monitors
+    setup_logging(LOG_LEVEL, json_path=LOG_FILE)
+
+    root = tk.Tk()
+    temperature_var = tk.StringVar(root, value="25")
+    desired_temp_var = tk.StringVar(root, value="100")
+    temp_var = tk.StringVar(root, value="Temperature: 0.00°C\nDesired Temperature: 0°C")
+    fan_speed_var = tk.IntVar(root, value=50)
+    spool_motor_speed_var = tk.IntVar(root, value=50)
+    fan_speed_text = tk.StringVar(root, value="Fan Speed: 0%")
+    spool_motor_speed_text = tk.StringVar(root, value="Spool Motor Speed: 50%")
+    ssr_state_var = tk.StringVar(root, value="SSR State: OFF")
+    connection_var = tk.StringVar(root, value="Not connected")
+    production_var = tk.StringVar(root, value="Output: 0.0 m/h | Produced: 0.00 m")
+    shutoff_target_var = tk.StringVar(root, value="")
+    shutoff_unit_var = tk.StringVar(root, value="metres")
+    shutoff_var = tk.StringVar(root, value="")
+    alarm_var = tk.StringVar(root, value="")
+    replay_var = tk.StringVar(root, value="")
+
+    run_recorder = RunRecorder(RUNS_DIR)
+    ui_pump = UiUpdatePump(root, fps=20)
+    parse_metrics = ParseMetrics()
+
+    machine = Machine("machine", store_capacity=DEFAULT_CAPACITY, parse=parse_metrics.parse)
+    serial_dispatcher = machine.backend
+    command_coalescer = machine.commands
+    recipe_runner = machine.recipes
+    telemetry_store = machine.store
+    # The machine's first listener, so the safe state goes out before anything else runs
+    safety_monitor = SafetyMonitor(machine, safe_state=SAFETY_ACTION, cancel=[cancel_autotune],
+                                   on_alarm=lambda alarm: ui_pump.call(show_alarm, alarm))
+    connection_supervisor = ConnectionSupervisor(
+        serial_dispatcher, reconnect_machine, command_coalescer, policy=RESYNC_POLICY,
+        on_adopt=lambda status: ui_pump.call(adopt_machine_settings, status),
+        on_reconnect=on_reconnected, on_state=on_connection_state)
+
+    metrics_registry = MetricsRegistry()
+    register_link(metrics_registry, serial_dispatcher, parse_metrics)
+    register_ui(metrics_registry, ui_pump)
+    loop_monitors = [LoopMonitor("serial", serial_dispatcher.call_later),
+                     LoopMonitor("tk", lambda delay, callback: root.after(int(delay * 1000), callback)),
+                     LoopMonitor("recipe-scheduler", recipe_runner.scheduler.call_later)]
+    for monitor in loop_monitors:
+        register_loop(metrics_registry, monitor)
+    metrics_registry.counter("reconnects_total", "Times the serial link was lost",
+                             lambda: connection_supervisor.disconnects)
+    metrics_registry.counter("downtime_seconds_total", "Time spent without a link after losing it",
+                             lambda: connection_supervisor.stats()["total_downtime"])
+    metrics_registry.gauge("offline_queue_length", "Commands waiting for the link to come back",
+                           lambda: len(connection_supervisor.queue))
+    metrics_registry.counter("log_records_suppressed_total", "Log records over their rate limit",
+                             lambda: log_pipeline().stats()["suppressed"])
+    metrics_registry.counter("safety_alarms_total", "Sensor fault and thermal runaway alarms raised",
+                             lambda: safety_monitor.detector.raised)
+    metrics_registry.counter("log_records_dropped_total", "Log records dropped because the log queue was full",
+                             lambda: log_pipeline().stats()["dropped"])
 
-root.mainloop()
+# -------------------------------------------------
+# Main Execution
+# -------------------------------------------------
+def main():
+    create_app()
+    load_saved_widths()
+    create_gui()
+    ui_pump.start()
+    live_chart.start()
+    metrics_registry.histogram("chart_render_seconds", "Time to draw one frame of the live chart",
+                               live_chart.render)
+    root.after_idle(mark_first_frame)
+
+    # Start the machine; every event it parses goes through on_machine_event
+    machine.add_listener(on_machine_event)
+    serial_dispatcher.add_send_listener(run_recorder.record_command)
+    command_coalescer.on_result = on_command_result
+    recipe_runner.progress = on_recipe_progress
+    machine.start()
+    connection_supervisor.start()
+    serial_dispatcher.call_later(PRODUCTION_INTERVAL, production_loop)
+    for monitor in loop_monitors:
+        monitor.start()
+    if METRICS_FILE:
+        export_metrics(METRICS_FILE)
+    # Port discovery and link negotiation wait on the Arduino, so they run off the Tk thread.
+    # A port (or "daemon") on the command line skips the search.
+    Thread(target=setup_connection, args=(sys.argv[1] if len(sys.argv) > 1 else None,), daemon=True).start()
+
+    root.mainloop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Offline analytics: how fast shift summaries come out of recorded runs.
+
+Writes --runs synthetic run recordings of --hours each at 10 Hz (heating
+with overshoot, SSR cycling, a shutdown and cool-down), then times
+pultrusion.analytics over them with one process and with --workers, and
+over a text capture of one run.
+
+    python benchmarks/bench_analytics.py --runs 8 --hours 24 --workers 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pultrusion import protocol
+from pultrusion.analytics import analyse
+from pultrusion.recorder import (EVENT, EVENT_FIELDS, HEADER, INDEX_EVERY, MAGIC, RECORD_DTYPE, RECORD_SIZE,
+                                 TELEMETRY, VERSION)
+
+
+def synthetic_run(samples, start=1.7e9, seed=0):
+    """Telemetry and a few events as a RECORD_DTYPE array (no index slots)."""
+    rng = np.random.default_rng(seed)
+    records = np.zeros(samples + 2, dtype=RECORD_DTYPE)
+    t = start + np.arange(samples) * 0.1
+    setpoint = np.where(np.arange(samples) < samples // 10, 100.0, 160.0)
+    setpoint[-samples // 20:] = 0.0
+    temperature = setpoint + 3 * np.sin(np.arange(samples) / 300) + rng.normal(0, 0.3, samples)
+    telemetry = records[:samples]
+    telemetry["t"], telemetry["kind"] = t, TELEMETRY
+    telemetry["v0"], telemetry["v1"], telemetry["v2"] = temperature, setpoint, temperature < setpoint
+    shutdown, cooled = records[samples:]
+    shutdown["t"], shutdown["kind"] = t[-samples // 20], EVENT
+    shutdown["code"] = EVENT_FIELDS[protocol.ShutdownStarted][0]
+    cooled["t"], cooled["kind"] = t[-1], EVENT
+    cooled["code"] = EVENT_FIELDS[protocol.CoolingComplete][0]
+    return records[np.argsort(records["t"], kind="stable")]
+
+
+def write_recording(path, records):
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, RECORD_SIZE, INDEX_EVERY, time.time()))
+        file.write(records.tobytes())
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=8)
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--text-hours", type=float, default=1, help="length of the text capture")
+    args = parser.parse_args()
+
+    samples = int(args.hours * 36000)
+    with tempfile.TemporaryDirectory() as directory:
+        runs = os.path.join(directory, "runs")
+        os.makedirs(runs)
+        for i in range(args.runs):
+            write_recording(os.path.join(runs, f"run-bench{i:03d}-000.plr"), synthetic_run(samples, seed=i))
+        size = sum(os.path.getsize(os.path.join(runs, name)) for name in os.listdir(runs))
+
+        rows, serial = timed(analyse, [runs], workers=1)
+        _, parallel = timed(analyse, [runs], workers=args.workers)
+        records = sum(row["samples"] for row in rows)
+
+        text = os.path.join(directory, "capture.log")
+        text_run = synthetic_run(int(args.text_hours * 36000))
+        text_run = text_run[text_run["kind"] == TELEMETRY]
+        with open(text, "w") as file:
+            for t, temperature, setpoint, ssr in zip(text_run["t"], text_run["v0"], text_run["v1"], text_run["v2"]):
+                file.write(f"{t:.1f} {protocol.TelemetrySample(float(temperature), int(setpoint), bool(ssr)).to_line()}\n")
+        text_rows, text_time = timed(analyse, [text], workers=1)
+
+    print(f"{args.runs} recordings, {args.hours:g} h each: {size / 1e9:.2f} GB, {records / 1e6:.1f} M samples")
+    print(f"1 process:    {serial:6.2f} s  ({size / serial / 1e9:.2f} GB/s, {records / serial / 1e6:.1f} M samples/s)")
+    print(f"{args.workers} processes:  {parallel:6.2f} s  ({size / parallel / 1e9:.2f} GB/s)")
+    print(f"text capture: {text_rows[0]['samples']} lines in {text_time:.2f} s "
+          f"({text_rows[0]['samples'] / text_time:,.0f} lines/s)")
+    print(f"first run: duty {rows[0]['ssr_duty']:.1%}, in band {rows[0]['in_band']:.1%}, "
+          f"overshoot max {rows[0]['overshoot_max']:.2f} °C, cooling {rows[0]['cooling_s']:.0f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Safety alarms: detection delay on injected faults, false alarms, cost per sample.
+
+Runs the simulator's thermal model under the firmware's bang-bang control
+at 10 Hz in simulated time. The run heats to 160 °C, holds with the fan
+on, steps to 200 °C and back, then shuts down and cools. Every fault in
+pultrusion.simulator.FAULTS is injected --at seconds into its own copy of
+that run, while heating or holding. Prints which rule fired and how long
+after the fault. The fault-free run must raise nothing. On the first
+alarm the run applies the safe state, as SafetyMonitor would: set point 0
+and the fan at full speed.
+
+With --recording, the telemetry of a recorded run (.plr) is checked for
+false alarms, and each fault is then written into a copy of it from --at
+on.
+
+    python benchmarks/bench_anomaly.py
+    python benchmarks/bench_anomaly.py --recording runs/run-20261018-083000-000.plr --at 600
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pultrusion.analytics import recording_chunks
+from pultrusion.anomaly import AnomalyDetector
+from pultrusion.recorder import TELEMETRY
+from pultrusion.simulator import FAULTS, ThermalModel
+
+PERIOD = 0.1   # The firmware's telemetry interval (s)
+
+
+def profile(t):
+    """(set point, fan fraction) of the test run at t seconds."""
+    if t < 900:
+        return 160, 0.0
+    if t < 1800:
+        return 160, 0.5
+    if t < 2400:
+        return 200, 0.5
+    if t < 3000:
+        return 160, 0.5
+    return 0, 1.0
+
+
+def simulate(fault=None, at=0.0, duration=3600.0, seed=0):
+    """Returns (alarms, samples, seconds spent in the detector)."""
+    model = ThermalModel(seed=seed)
+    detector = AnomalyDetector()
+    safe = False
+    ssr_on = False
+    spent = 0.0
+    alarms = []
+    steps = int(duration / PERIOD)
+    for i in range(steps):
+        t = i * PERIOD
+        if fault is not None and model.fault is None and t >= at:
+            model.set_fault(fault)
+        set_temperature, fan = (0, 1.0) if safe else profile(t)
+        model.step(PERIOD, ssr_on, fan)
+        reading = model.read()
+        started = time.perf_counter()
+        raised = detector.update(t, round(reading, 2), set_temperature, ssr_on)
+        spent += time.perf_counter() - started
+        if raised:
+            alarms.extend(raised)
+            safe = True
+        ssr_on = reading < set_temperature   # Bang-bang, as in the firmware
+    return alarms, steps, spent
+
+
+def recorded_telemetry(path):
+    chunks = [chunk[chunk["kind"] == TELEMETRY] for chunk in recording_chunks(path)]
+    records = np.concatenate(chunks) if chunks else np.zeros(0)
+    return (records["t"].astype(float), records["v0"].astype(float),
+            records["v1"].astype(float), records["v2"] > 0)
+
+
+def inject(fault, at, t, temperature, ssr):
+    """A copy of a recorded stream with fault from at seconds into it."""
+    temperature, ssr = temperature.copy(), ssr.copy()
+    after = t - t[0] >= at
+    if not after.any():
+        return temperature, ssr
+    first = int(np.argmax(after))
+    rng = random.Random(0)
+    if fault == "open_sensor":
+        temperature[after] = -273.15
+    elif fault == "stuck_sensor":
+        temperature[after] = temperature[first]
+        ssr[after] = True    # The firmware keeps heating towards the set point
+    elif fault == "noisy_sensor":
+        for i in np.flatnonzero(after):
+            if rng.random() < 0.2:
+                temperature[i] += rng.choice((-1, 1)) * rng.uniform(30.0, 80.0)
+    elif fault == "welded_ssr":
+        # Heats at 1 °C/s on top of the recording; the firmware sees it too hot and reports the SSR off
+        temperature[after] += (t[after] - t[first]) * 1.0
+        ssr[after] = False
+    elif fault == "heater_failure":
+        # Cools towards 22 °C with a 180 s time constant while the firmware keeps the SSR on
+        temperature[after] = 22 + (temperature[first] - 22) * np.exp(-(t[after] - t[first]) / 180.0)
+        ssr[after] = True
+    return temperature, ssr
+
+
+def scan(t, temperature, set_temperature, ssr):
+    detector = AnomalyDetector()
+    alarms = []
+    for sample in zip(t.tolist(), temperature.tolist(), set_temperature.tolist(), ssr.tolist()):
+        alarms.extend(detector.update(*sample))
+    return alarms
+
+
+def describe(alarms, at, origin=0.0):
+    if not alarms:
+        return "no alarm"
+    first = alarms[0]
+    return (f"{first.rule:<8} after {first.t - origin - at:6.1f} s  "
+            f"({first.temperature:.1f} °C)  {first.message}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--at", type=float, default=None,
+                        help="seconds into the run to inject each fault (default: 30 and 1200)")
+    parser.add_argument("--duration", type=float, default=3600, help="simulated run length (s)")
+    parser.add_argument("--recording", default=None, help="also check this .plr recording")
+    args = parser.parse_args()
+
+    alarms, samples, spent = simulate(duration=args.duration)
+    print(f"fault-free run, {args.duration:g} s: {describe(alarms, 0.0) if alarms else 'no false alarms'}")
+    print(f"cost: {spent / samples * 1e6:.2f} us per sample")
+    missed = bool(alarms)
+    for at in ([args.at] if args.at is not None else [30.0, 1200.0]):
+        print(f"\nfaults injected at {at:g} s (set point {profile(at)[0]} °C):")
+        for fault in FAULTS:
+            alarms, _, _ = simulate(fault, at, args.duration)
+            missed |= not alarms
+            print(f"  {fault:<15} {describe(alarms, at)}")
+
+    if args.recording:
+        t, temperature, set_temperature, ssr = recorded_telemetry(args.recording)
+        if not len(t):
+            sys.exit(f"{args.recording} holds no telemetry")
+        at = args.at if args.at is not None else (t[-1] - t[0]) / 2
+        alarms = scan(t, temperature, set_temperature, ssr)
+        print(f"\n{os.path.basename(args.recording)}: {len(t)} samples over "
+              f"{(t[-1] - t[0]) / 60:.1f} min, {describe(alarms, 0.0, t[0]) if alarms else 'no false alarms'}")
+        missed |= bool(alarms)
+        for fault in FAULTS:
+            faulty, faulty_ssr = inject(fault, at, t, temperature, ssr)
+            alarms = scan(t, faulty, set_temperature, faulty_ssr)
+            missed |= not alarms
+            print(f"  {fault:<15} {describe(alarms, at, t[0])}")
+    raise SystemExit(1 if missed else 0)
+
+
+if __name__ == "__main__":
+    main()
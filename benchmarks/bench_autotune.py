@@ -0,0 +1,61 @@
+"""
+End-to-end autotune run against the simulated Arduino.
+
+Starts pultrusion.simulator sped up, runs pultrusion.autotune.Autotuner
+through ArduinoController + AsyncSerialBackend exactly like the app's
+Autotune PID... menu, and prints the before/after report.
+
+    python benchmarks/bench_autotune.py --target 200 --speedup 20
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pultrusion.async_backend import AsyncSerialBackend
+from pultrusion.autotune import Autotuner, format_report
+from pultrusion.serial_io import ArduinoController
+from pultrusion.simulator import FakeArduino
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--target", type=float, default=200.0)
+    parser.add_argument("--step", type=float, default=20.0)
+    parser.add_argument("--speedup", type=float, default=20.0)
+    parser.add_argument("--settle", type=float, default=60.0, help="simulated seconds")
+    parser.add_argument("--observe", type=float, default=120.0, help="simulated seconds")
+    args = parser.parse_args()
+
+    arduino = FakeArduino(speedup=args.speedup)
+    port = arduino.open()
+    controller = ArduinoController()
+    controller.connect(port, settle_time=0)
+    backend = AsyncSerialBackend(controller)
+    backend.start()
+    arduino.start()
+
+    def set_temperature(value):
+        backend.send(f"SET_TEMP:{int(value)}")
+
+    def progress(text):
+        print(f"[{time.monotonic() - started:6.1f} s] {text}", file=sys.__stdout__)
+
+    tuner = Autotuner(backend, set_temperature, args.target, step=args.step,
+                      settle=args.settle, observe=args.observe, progress=progress)
+    started = time.monotonic()
+    sys.stdout = open(os.devnull, "w")  # Silence "Sent to Arduino" per command
+    try:
+        report = tuner.run()
+    finally:
+        sys.stdout = sys.__stdout__
+        backend.stop()
+        arduino.stop()
+        controller.close_connection()
+    print()
+    print(format_report(report))
+
+
+if __name__ == "__main__":
+    main()
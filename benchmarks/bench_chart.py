@@ -0,0 +1,97 @@
+"""
+Live chart: time per frame with fast telemetry.
+
+A thread appends --rate samples per second of synthetic telemetry to a
+TelemetryStore while a LiveChart draws it, as in the main window. The
+store starts with a full window of history. After a 2 s warm-up, prints
+the time per frame (Python and Tk's redraw), the canvas items kept and
+how late Tk timers ran. Needs a display.
+
+    python benchmarks/bench_chart.py --rate 100 --window 300 --duration 30
+"""
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+import tkinter as tk
+from threading import Event, Thread
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pultrusion.live_chart import RENDER_BUCKETS, LiveChart
+from pultrusion.metrics import Histogram
+from pultrusion.telemetry_store import TelemetryStore
+
+
+def feed(store, rate, stop, start):
+    """Appends rate samples per second: a ramp, oscillation around the set point, SSR cycling."""
+    interval = 1.0 / rate
+    n = 0
+    while not stop.is_set():
+        t = start + n * interval
+        delay = t - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        setpoint = 160 if (t - start) % 240 < 180 else 100
+        temperature = setpoint + 4 * math.sin(t / 7) + random.gauss(0, 0.3)
+        store.append(t, temperature, setpoint, temperature < setpoint)
+        n += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rate", type=float, default=100, help="telemetry samples per second")
+    parser.add_argument("--window", type=int, default=300, help="chart window (s)")
+    parser.add_argument("--fps", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30, help="seconds measured after the warm-up")
+    parser.add_argument("--width", type=int, default=800)
+    args = parser.parse_args()
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        sys.exit(f"A display is needed to draw the chart: {e}")
+    root.geometry(f"{args.width}x260")
+    store = TelemetryStore()
+    start = time.monotonic()
+    # Warm up with a full window already in the store, as after a long run
+    for i in range(int(args.window * args.rate)):
+        t = start - args.window + i / args.rate
+        store.append(t, 160 + 4 * math.sin(t / 7), 160, i % 20 < 10)
+    chart = LiveChart(root, store, seconds=args.window, fps=args.fps)
+    chart.pack(fill=tk.BOTH, expand=True)
+    stop = Event()
+    Thread(target=feed, args=(store, args.rate, stop, start), daemon=True).start()
+
+    lateness = []
+
+    def tick(expected):
+        lateness.append(time.monotonic() - expected)
+        root.after(50, tick, time.monotonic() + 0.05)
+
+    def measure():
+        chart.render = Histogram(RENDER_BUCKETS)
+        chart.frames = 0
+        root.after(50, tick, time.monotonic() + 0.05)
+        root.after(int(args.duration * 1000), root.quit)
+
+    chart.start()
+    root.after(2000, measure)
+    root.mainloop()
+    stop.set()
+
+    stats = chart.stats()
+    render = chart.render.summary()
+    print(f"{args.rate:g} samples/s, {args.window} s window, {args.width} px, {args.fps} fps cap")
+    print(f"frames: {stats['frames']} in {args.duration:g} s, canvas line items: {stats['items']}")
+    print(f"frame time: mean {render['mean'] * 1000:.2f} ms, p50 <= {render['p50'] * 1000:g} ms, "
+          f"p99 <= {render['p99'] * 1000:g} ms")
+    if lateness:
+        print(f"Tk timers late: median {statistics.median(lateness) * 1000:.1f} ms, "
+              f"max {max(lateness) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
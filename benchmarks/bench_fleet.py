@@ -0,0 +1,139 @@
+"""
+Fleet load test: many simulated machines served by one I/O thread.
+
+Starts N pultrusion.simulator ports, connects them all through a
+FleetController, sends SET_TEMP round-robin and reports per-fleet line
+counts, drops, ack latency, thread count and CPU per line.
+
+Then checks that the machines are independent: each gets its own set
+point, acknowledged by its own simulator and reported back in its own
+state, and with one simulator's port gone the others still answer
+within the timeout. Exits with status 1 if a check fails.
+
+    python benchmarks/bench_fleet.py --machines 24 --rate 50 --seconds 10
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pultrusion.fleet import FleetController
+from pultrusion.simulator import FakeArduino
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def check_fleet(fleet, simulators, timeout=2.0):
+    """Returns a list of failures; stops the first simulator to fail its port."""
+    failures = []
+    machines = list(fleet)
+
+    # Every machine gets its own set point, and only its simulator takes it
+    futures = [machine.set_temperature(100 + i, timeout=timeout) for i, machine in enumerate(machines)]
+    for i, (machine, future) in enumerate(zip(machines, futures)):
+        try:
+            future.result()
+        except TimeoutError:
+            failures.append(f"{machine.name}: SET_TEMP:{100 + i} not acknowledged")
+    time.sleep(0.5)  # A telemetry line or two with the new set points
+    for i, (machine, simulator) in enumerate(zip(machines, simulators)):
+        if simulator.set_temperature != 100 + i:
+            failures.append(f"{machine.name}: simulator set to {simulator.set_temperature}, expected {100 + i}")
+        if machine.state.set_temperature != 100 + i:
+            failures.append(f"{machine.name}: state shows {machine.state.set_temperature}, expected {100 + i}")
+
+    # One port disappears; the others keep their telemetry and acknowledgments
+    if len(machines) > 1:
+        simulators[0].stop()
+        lines_before = [machine.state.lines for machine in machines[1:]]
+        started = time.monotonic()
+        futures = [machine.set_temperature(120, timeout=timeout) for machine in machines[1:]]
+        for machine, future in zip(machines[1:], futures):
+            try:
+                future.result()
+            except TimeoutError:
+                failures.append(f"{machine.name}: no acknowledgment after {machines[0].name}'s port failed")
+        if time.monotonic() - started > timeout:
+            failures.append(f"acknowledgments took {time.monotonic() - started:.2f} s with one port failed")
+        time.sleep(0.5)
+        for machine, before in zip(machines[1:], lines_before):
+            if machine.state.lines <= before:
+                failures.append(f"{machine.name}: telemetry stopped after {machines[0].name}'s port failed")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--machines", type=int, default=24)
+    parser.add_argument("--rate", type=float, default=50.0, help="telemetry lines per second per machine")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--command-interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    simulators = [FakeArduino(telemetry_hz=args.rate, speedup=args.rate / 10.0) for _ in range(args.machines)]
+    threads_before = threading.active_count()
+    fleet = FleetController(store_capacity=10000)
+    for i, simulator in enumerate(simulators):
+        fleet.add(f"sim-{i + 1}", simulator.open())
+    connected = fleet.connect_all(settle_time=0)
+    host_threads = threading.active_count() - threads_before
+    # Boot the firmware only now: pyserial flushes whatever arrived before open
+    for simulator in simulators:
+        simulator.start()
+    cpu_start = time.process_time()
+
+    latencies = []
+    timeouts = 0
+    machines = list(fleet)
+    end = time.monotonic() + args.seconds
+    i = 0
+    sys.stdout = open(os.devnull, "w")  # Silence the per-command "Sent to Arduino" prints
+    while time.monotonic() < end:
+        machine = machines[i % len(machines)]
+        setpoint = 150 + (i // len(machines)) % 2 * 10
+        sent_at = time.monotonic()
+        try:
+            machine.set_temperature(setpoint, timeout=2.0).result()
+            latencies.append(time.monotonic() - sent_at)
+        except TimeoutError:
+            timeouts += 1
+        i += 1
+        time.sleep(args.command_interval)
+
+    for simulator in simulators:
+        simulator.halt()
+    time.sleep(0.3)  # Let the last lines drain
+    cpu = time.process_time() - cpu_start
+    emitted = sum(s.lines_sent + s.lines_dropped for s in simulators)
+    dropped_at_simulators = sum(s.lines_dropped for s in simulators)
+    received = sum(m.state.lines for m in fleet)
+
+    for simulator in simulators:
+        simulator.start()
+    failures = check_fleet(fleet, simulators)
+    fleet.close_all()
+    for simulator in simulators:
+        simulator.stop()
+    sys.stdout = sys.__stdout__
+
+    print(f"machines: {len(connected)}/{args.machines} connected, {host_threads} host I/O thread(s)")
+    print(f"lines: {emitted} emitted, {received} received, "
+          f"{emitted - received} dropped ({dropped_at_simulators} at the simulators)")
+    print(f"ack latency: p50 {percentile(latencies, 0.5) * 1000:.2f} ms, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.2f} ms, "
+          f"max {max(latencies, default=float('nan')) * 1000:.2f} ms, {timeouts} timeouts")
+    print(f"process CPU: {cpu / max(received, 1) * 1e6:.1f} us per line received (simulators included)")
+    print("checks: " + ("\n  ".join(["FAILED"] + failures) if failures else "separate commands and state, "
+                        "one failed port does not hold up the others"))
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Text vs compact telemetry on the simulated Arduino.
+
+For each mode, streams telemetry through ArduinoController + AsyncSerialBackend
+and measures wire bytes per sample, host CPU per sample (read, checksum,
+parse) and PING round trip under load. A pty has no baud rate, so the time
+each sample occupies a real 9600-baud link (10 bits per byte) is computed
+from the measured bytes.
+
+    python benchmarks/bench_link.py --rate 1000 --seconds 5
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pultrusion import link
+from pultrusion.async_backend import AsyncSerialBackend
+from pultrusion.protocol import TelemetrySample, parse_line
+from pultrusion.serial_io import ArduinoController
+from pultrusion.simulator import FakeArduino
+
+FIRMWARE_RATE = 10     # Telemetry lines per second on the real machine
+BAUD = 9600
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run(compact, rate, seconds):
+    arduino = FakeArduino(telemetry_hz=rate)
+    port = arduino.open()
+    controller = ArduinoController()
+    controller.connect(port, settle_time=0)
+    backend = AsyncSerialBackend(controller)
+    samples = [0]
+
+    def on_line(line, received_at):
+        if isinstance(parse_line(line), TelemetrySample):
+            samples[0] += 1
+
+    backend.subscribe(on_line)
+    backend.start()
+    arduino.start()
+    if compact and not link.set_compact_telemetry(backend, True):
+        raise RuntimeError("simulator did not switch to compact mode")
+
+    samples[0] = 0
+    bytes_start = controller.reader.bytes_total
+    cpu_start = time.process_time()
+    rtts = []
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        rtt = link.ping(backend)
+        if rtt is not None:
+            rtts.append(rtt)
+        time.sleep(0.05)
+    cpu = time.process_time() - cpu_start
+    wire_bytes = controller.reader.bytes_total - bytes_start
+
+    backend.stop()
+    arduino.stop()
+    controller.close_connection()
+    count = max(samples[0], 1)
+    return {
+        "samples": samples[0],
+        "bytes_per_sample": wire_bytes / count,  # Includes the few PING/PONG lines
+        "cpu_us_per_sample": cpu / count * 1e6,
+        "ping_p50_ms": percentile(rtts, 0.5) * 1000,
+        "ping_p95_ms": percentile(rtts, 0.95) * 1000,
+        "bad_frames": controller.bad_frames,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rate", type=float, default=1000.0, help="telemetry lines per second")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    sys.stdout = open(os.devnull, "w")  # Silence "Sent to Arduino" per PING
+    results = {mode: run(mode == "compact", args.rate, args.seconds) for mode in ("text", "compact")}
+    sys.stdout = sys.__stdout__
+
+    for mode, r in results.items():
+        wire_ms = r["bytes_per_sample"] * 10 / BAUD * 1000
+        load = r["bytes_per_sample"] * 10 * FIRMWARE_RATE / BAUD * 100
+        print(f"{mode:8s} {r['bytes_per_sample']:5.1f} B/sample  "
+              f"{wire_ms:5.1f} ms on the wire at {BAUD} baud ({load:4.1f}% of the link at {FIRMWARE_RATE} Hz)  "
+              f"host {r['cpu_us_per_sample']:5.1f} us/sample  "
+              f"ping p50 {r['ping_p50_ms']:.2f} ms p95 {r['ping_p95_ms']:.2f} ms  "
+              f"{r['samples']} samples, {r['bad_frames']} bad frames")
+
+
+if __name__ == "__main__":
+    main()
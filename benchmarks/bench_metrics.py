@@ -0,0 +1,64 @@
+"""
+Instrumentation overhead: what the metrics add to the per-line hot path.
+
+Times parse_line() bare and through ParseMetrics, Histogram.observe(),
+and SerialDispatcher.dispatch() of telemetry and echo lines, then one
+Prometheus export of a fully registered registry.
+
+    python benchmarks/bench_metrics.py --lines 200000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pultrusion.dispatcher import SerialDispatcher
+from pultrusion.metrics import Histogram, MetricsRegistry, ParseMetrics, register_link
+from pultrusion.protocol import TelemetrySample, parse_line
+from pultrusion.serial_io import ArduinoController
+
+
+def per_call(function, items):
+    start = time.perf_counter()
+    for item in items:
+        function(item)
+    return (time.perf_counter() - start) / len(items) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=200000)
+    args = parser.parse_args()
+
+    lines = [TelemetrySample(150 + (i % 100) / 10, 160, i % 2 == 0).to_line() for i in range(args.lines)]
+    metrics = ParseMetrics()
+    bare = per_call(parse_line, lines)
+    timed = per_call(metrics.parse, lines)
+    histogram = Histogram()
+    observe = per_call(histogram.observe, [i * 1e-5 for i in range(args.lines)])
+
+    dispatcher = SerialDispatcher(ArduinoController())
+    dispatcher.subscribe(lambda line, received_at: None)
+    now = time.monotonic()
+    dispatch = per_call(lambda line: dispatcher.dispatch(line, now), lines)
+    echoes = [f"Received command: SET_TEMP:{i % 300}" for i in range(args.lines)]
+    echo = per_call(lambda line: (dispatcher._echo_pending.append((line[18:], now)),
+                                  dispatcher.dispatch(line, now)), echoes)
+
+    registry = MetricsRegistry()
+    register_link(registry, dispatcher, metrics)
+    start = time.perf_counter()
+    text = registry.to_prometheus()
+    export = time.perf_counter() - start
+
+    print(f"parse_line:            {bare:7.0f} ns/line")
+    print(f"ParseMetrics.parse:    {timed:7.0f} ns/line (+{timed - bare:.0f} ns)")
+    print(f"Histogram.observe:     {observe:7.0f} ns")
+    print(f"dispatch (telemetry):  {dispatch:7.0f} ns/line")
+    print(f"dispatch (echo match): {echo:7.0f} ns/line, {dispatcher.echo_latency.count} matched")
+    print(f"Prometheus export:     {export * 1000:7.2f} ms ({len(text.splitlines())} lines)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Parse cost per line: the old handle_serial_data regex vs pultrusion.protocol.
+
+    python benchmarks/bench_parser.py --repeat 100000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pultrusion.protocol import parse_line
+
+TELEMETRY = "Current Temperature: 158.73 °C | Set Temperature: 160 °C | SSR State: ON"
+MIXED = [
+    TELEMETRY,
+    "Received command: SET_FAN_PWM:230",
+    "Fan PWM set to 230",
+    "turnFanOn(): FanSwitch set HIGH, PWM = 230",
+    "Shutdown countdown: 12000 ms elapsed (target: 600000 ms)",
+    "Set Temperature updated to 160 °C",
+    "Settings restored from EEPROM.",
+    "Emergency Stop Activated!",
+]
+
+
+def legacy_parse(data):
+    match = re.search(r"Current Temperature:\s*([\d.]+)\s*°?C.*Set Temperature:\s*([\d.]+)\s*°?C.*SSR State:\s*(\w+)", data)
+    if match:
+        return match.group(1), match.group(2), match.group(3)
+
+
+def ns_per_line(parse, lines, repeat, rounds=5):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for line in lines:
+                parse(line)
+        best = min(best, time.perf_counter() - start)
+    return best / (repeat * len(lines)) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=100000)
+    args = parser.parse_args()
+    mixed_repeat = max(1, args.repeat // len(MIXED))
+
+    print(f"{'':>10} {'telemetry':>12} {'mixed':>12}   (ns per line)")
+    for name, parse in (("legacy", legacy_parse), ("protocol", parse_line)):
+        telemetry = ns_per_line(parse, [TELEMETRY], args.repeat)
+        mixed = ns_per_line(parse, MIXED, mixed_repeat)
+        print(f"{name:>10} {telemetry:12.0f} {mixed:12.0f}")
+
+
+if __name__ == "__main__":
+    main()
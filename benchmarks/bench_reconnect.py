@@ -0,0 +1,83 @@
+"""
+Reconnect: how long the machine is out of reach after the cable is pulled.
+
+Runs the simulated Arduino under a ConnectionSupervisor, pulls the
+simulated cable --outages times for --offline seconds each (the board
+resets with different EEPROM settings every time), sends a few commands
+while it is gone, and reports downtime, resync time and whether the
+machine ended up with the GUI's settings (push) or the GUI with the
+machine's (adopt).
+
+    python benchmarks/bench_reconnect.py --outages 5 --policy push
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pultrusion.async_backend import AsyncSerialBackend
+from pultrusion.coalescer import CommandCoalescer
+from pultrusion.discovery import probe_port
+from pultrusion.protocol import parse_line
+from pultrusion.serial_io import ArduinoController
+from pultrusion.simulator import FakeArduino
+from pultrusion.supervisor import ConnectionSupervisor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--outages", type=int, default=5)
+    parser.add_argument("--offline", type=float, default=1.0, help="seconds the cable stays out")
+    parser.add_argument("--policy", choices=("push", "adopt"), default="push")
+    args = parser.parse_args()
+
+    arduino = FakeArduino()
+    arduino.start()
+    backend = AsyncSerialBackend(ArduinoController())
+    coalescer = CommandCoalescer(backend)
+    backend.subscribe(lambda line, received_at: coalescer.observe(parse_line(line)))
+    adopted = []
+    supervisor = ConnectionSupervisor(backend, lambda: probe_port(arduino.port_name, timeout=1.0),
+                                      coalescer, policy=args.policy, on_adopt=adopted.append,
+                                      base_delay=0.1, max_delay=1.0)
+    sys.stdout = open(os.devnull, "w")  # Silence connect/send prints
+    backend.start()
+    supervisor.start()
+    backend.set_controller(probe_port(arduino.port_name).controller)
+    coalescer.set("temperature", 150)
+    time.sleep(1.0)
+
+    downtimes, resyncs, matched = [], [], 0
+    for outage in range(args.outages):
+        arduino.stop()
+        time.sleep(args.offline / 2)
+        coalescer.set("temperature", 160 + outage)   # Kept by the coalescer
+        backend.send("WINDER_ON")                    # Queued
+        time.sleep(args.offline / 2)
+        arduino.eeprom["set_temperature"] = 90 + outage  # Restored on the reset
+        arduino.replug()
+        while supervisor.disconnects <= outage or supervisor.state != "online":
+            time.sleep(0.01)
+        time.sleep(0.5)  # Let the pushed command be acknowledged
+        downtimes.append(supervisor.last_downtime)
+        resyncs.append(supervisor.last_resync)
+        expected = 160 + outage if args.policy == "push" else 90 + outage
+        gui = 160 + outage if args.policy == "push" else adopted[-1].set_temperature
+        matched += arduino.set_temperature == expected == gui
+
+    stats = supervisor.stats()
+    supervisor.stop()
+    backend.stop()
+    arduino.stop()
+    sys.stdout = sys.__stdout__
+    print(f"{args.outages} outages of {args.offline:g} s, policy {args.policy}")
+    print(f"downtime: mean {statistics.mean(downtimes):.2f} s, max {max(downtimes):.2f} s "
+          f"({stats['attempts']} reconnect attempts)")
+    print(f"resync:   mean {statistics.mean(resyncs) * 1000:.1f} ms, max {max(resyncs) * 1000:.1f} ms")
+    print(f"in sync afterwards: {matched}/{args.outages}; queued commands dropped: {stats['dropped']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Safety reaction: alarm to safe state on the wire, with a recipe ramping.
+
+Connects a Machine with a SafetyMonitor to the simulated Arduino and
+starts a recipe that ramps the set point up. Once the ramp is sending,
+the thermistor is disconnected (the simulator's open_sensor fault). Every
+command written is logged. Prints the time from the alarm's telemetry
+line to SET_TEMP:0 being written. Checks that the recipe was cancelled,
+that no heating set point was written after the safe state, and that the
+simulated firmware ends with the heater set to 0 and the fan at full
+speed. Repeats --runs times and exits with status 1 if a check fails.
+
+    python benchmarks/bench_safety.py --runs 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pultrusion.anomaly import SAFE_STATE_COMMANDS, SafetyMonitor
+from pultrusion.cli import connect
+from pultrusion.machine import speed_to_pwm
+from pultrusion.recipes import Recipe
+from pultrusion.simulator import FakeArduino
+
+
+def run_once(machine, monitor, simulator, sent, ramp_seconds, settle):
+    """Returns (reaction in s or None, list of failures)."""
+    failures = []
+    monitor.reset()
+    simulator.inject_fault(None)
+    cancelled = []
+    monitor.cancel = [lambda: cancelled.append(time.monotonic())]
+    start = machine.state.set_temperature or 0
+    recipe = Recipe.from_dict({"name": "ramp", "steps": [{"ramp": start + 200, "rate": 5}]})
+    future = machine.run_recipe(recipe)
+
+    deadline = time.monotonic() + ramp_seconds
+    while time.monotonic() < deadline and not future.done():
+        time.sleep(0.05)
+    ramped = [command for _, command in sent if command.startswith("SET_TEMP:")]
+    if not ramped:
+        failures.append("the ramp sent no set points before the fault")
+
+    alarms_before = len(monitor.alarms)
+    sent.clear()
+    simulator.inject_fault("open_sensor")
+    deadline = time.monotonic() + 5.0
+    while len(monitor.alarms) <= alarms_before:
+        if time.monotonic() > deadline:
+            failures.append("no alarm within 5 s of the fault")
+            future.cancel()
+            return None, failures
+        time.sleep(0.01)
+    time.sleep(settle)  # Anything a late ramp tick would send has gone out by now
+
+    if not cancelled:
+        failures.append("the cancel callbacks were not called")
+    if not future.done():
+        failures.append("the recipe is still running after the alarm")
+    elif future.exception() is None:
+        failures.append("the recipe finished instead of being cancelled")
+    commands = [command for _, command in sent]
+    if SAFE_STATE_COMMANDS[0] not in commands:
+        failures.append(f"{SAFE_STATE_COMMANDS[0]} was never written")
+        return None, failures
+    first_safe = commands.index(SAFE_STATE_COMMANDS[0])
+    late = [c for c in commands[first_safe:] if c.startswith("SET_TEMP:") and c != "SET_TEMP:0"]
+    if late:
+        failures.append(f"heating set points written after the safe state: {', '.join(late)}")
+    if simulator.set_temperature != 0:
+        failures.append(f"the firmware's set point is {simulator.set_temperature}, not 0")
+    if simulator.fan_pwm != speed_to_pwm(100):
+        failures.append(f"the firmware's fan PWM is {simulator.fan_pwm}, not {speed_to_pwm(100)}")
+    return monitor.last_reaction, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--ramp-seconds", type=float, default=2.0, help="ramp time before the fault")
+    parser.add_argument("--settle", type=float, default=1.0, help="seconds watched after the alarm")
+    args = parser.parse_args()
+
+    simulator = FakeArduino(eeprom={"set_temperature": 20})
+    port = simulator.start()
+    machine = connect(port)
+    sent = []
+    machine.backend.add_send_listener(lambda command: sent.append((time.monotonic(), command)))
+    monitor = SafetyMonitor(machine)
+    reactions = []
+    failures = []
+    try:
+        for run in range(args.runs):
+            reaction, run_failures = run_once(machine, monitor, simulator, sent, args.ramp_seconds,
+                                              args.settle)
+            if reaction is not None:
+                reactions.append(reaction)
+            failures += [f"run {run + 1}: {failure}" for failure in run_failures]
+    finally:
+        machine.close()
+        simulator.stop()
+
+    if reactions:
+        print(f"alarm line to safe state written: median {statistics.median(reactions) * 1000:.2f} ms, "
+              f"max {max(reactions) * 1000:.2f} ms ({len(reactions)} runs)")
+    print("checks: " + ("\n  ".join(["FAILED"] + failures) if failures else
+                        "recipe cancelled, no heating set point after the safe state, heater 0, fan full"))
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
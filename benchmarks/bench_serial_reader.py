@@ -0,0 +1,107 @@
+"""
+Compares the old byte-at-a-time serial read loop with LineReader.
+
+A pseudo-terminal stands in for the Arduino: a writer thread pushes firmware
+style telemetry into the master side while the reader under test consumes
+the slave side through pyserial. Linux/macOS only (needs os.openpty).
+
+    python benchmarks/bench_serial_reader.py --lines 20000
+"""
+import argparse
+import os
+import sys
+import time
+import tty
+from threading import Thread
+
+import serial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pultrusion.serial_io import LineReader
+
+TELEMETRY_LINE = "Current Temperature: 158.73 °C | Set Temperature: 160 °C | SSR State: ON\r\n"
+DEBUG_LINE = "turnFanOn(): FanSwitch set HIGH, PWM = 230\r\n"
+
+
+def open_fake_port():
+    master, slave = os.openpty()
+    tty.setraw(master)
+    port = serial.Serial(os.ttyname(slave), 9600, timeout=0.1)
+    os.close(slave)
+    return master, port
+
+
+def write_lines(master, count, chunk_lines=16):
+    payload = ((TELEMETRY_LINE * 9 + DEBUG_LINE) * (chunk_lines // 10 + 1)).encode("utf-8")
+    lines_per_chunk = payload.count(b"\n")
+    sent = 0
+    while sent < count:
+        os.write(master, payload)
+        sent += lines_per_chunk
+    return sent
+
+
+class LegacyReader:
+    """The pre-LineReader ArduinoController.read_data_from_arduino loop."""
+
+    def __init__(self, port):
+        self.port = port
+        self.buffer = ""
+
+    def read_line(self):
+        while self.port.in_waiting > 0:
+            self.buffer += self.port.read().decode('utf-8', errors='ignore')
+            if '\n' in self.buffer:
+                line, self.buffer = self.buffer.split('\n', 1)
+                return line.strip()
+        return None
+
+
+def run(name, count, read_batch):
+    master, port = open_fake_port()
+    expected = [0]
+    writer = Thread(target=lambda: expected.__setitem__(0, write_lines(master, count)), daemon=True)
+    received = 0
+    start = time.perf_counter()
+    writer.start()
+    while writer.is_alive() or port.in_waiting:
+        received += read_batch(port)
+    elapsed = time.perf_counter() - start
+    port.close()
+    os.close(master)
+    total = expected[0]
+    print(f"{name:>8}: {received / elapsed:10.0f} lines/s  "
+          f"({received}/{total} lines in {elapsed:.3f} s, {total - received} missing)")
+    return received / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=20000)
+    args = parser.parse_args()
+
+    legacy = {}
+
+    def legacy_batch(port):
+        reader = legacy.get(port)
+        if reader is None:
+            reader = legacy[port] = LegacyReader(port)
+        return 1 if reader.read_line() else 0
+
+    bulk = {}
+
+    def bulk_batch(port):
+        reader = bulk.get(port)
+        if reader is None:
+            reader = bulk[port] = LineReader(port)
+        return len(reader.read_lines(wait=True))
+
+    old_rate = run("legacy", args.lines, legacy_batch)
+    new_rate = run("bulk", args.lines, bulk_batch)
+    reader = next(iter(bulk.values()))
+    print(f"speedup: {new_rate / old_rate:.1f}x  "
+          f"dropped partial lines: {reader.dropped_partial_lines}")
+
+
+if __name__ == "__main__":
+    main()
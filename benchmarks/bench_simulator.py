@@ -0,0 +1,93 @@
+"""
+Load test of the host serial stack against the simulated Arduino.
+
+Runs pultrusion.simulator at a high telemetry rate, connects through
+ArduinoController + AsyncSerialBackend exactly like PultrusionApp.py, parses
+every line, and keeps sending SET_TEMP with ack futures. Reports dropped
+lines, ack latency and host CPU per line. (UI lag needs the Tk window:
+see Help > UI Latency in the app.)
+
+    python benchmarks/bench_simulator.py --rate 1000 --seconds 10
+    python benchmarks/bench_simulator.py --backend thread   (SerialDispatcher)
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pultrusion.async_backend import AsyncSerialBackend
+from pultrusion.dispatcher import SerialDispatcher
+from pultrusion.protocol import parse_line
+from pultrusion.serial_io import ArduinoController
+from pultrusion.simulator import FakeArduino
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rate", type=float, default=1000.0, help="telemetry lines per second")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--command-interval", type=float, default=0.25)
+    parser.add_argument("--backend", choices=("asyncio", "thread"), default="asyncio")
+    args = parser.parse_args()
+
+    arduino = FakeArduino(telemetry_hz=args.rate, speedup=args.rate / 10.0)
+    port = arduino.start()
+
+    controller = ArduinoController()
+    controller.connect(port, settle_time=0)
+    backend = AsyncSerialBackend if args.backend == "asyncio" else SerialDispatcher
+    dispatcher = backend(controller)
+    received = [0]
+
+    def on_line(line, received_at):
+        parse_line(line)
+        received[0] += 1
+
+    dispatcher.subscribe(on_line)
+    cpu_start = time.process_time()
+    dispatcher.start()
+
+    latencies = []
+    timeouts = 0
+    end = time.monotonic() + args.seconds
+    setpoint = 150
+    while time.monotonic() < end:
+        setpoint = 150 if setpoint == 160 else 160
+        sent_at = time.monotonic()
+        ack = dispatcher.submit(f"SET_TEMP:{setpoint}", expect=f"Set Temperature updated to {setpoint}",
+                                timeout=2.0)
+        try:
+            ack.result()
+            latencies.append(time.monotonic() - sent_at)
+        except TimeoutError:
+            timeouts += 1
+        time.sleep(args.command_interval)
+
+    arduino.halt()
+    time.sleep(0.2)  # Let the last lines drain
+    arduino_stats = arduino.stats()
+    dispatcher.stop()
+    cpu = time.process_time() - cpu_start
+    arduino.stop()
+    controller.close_connection()
+
+    sent = arduino_stats["lines_sent"] + arduino_stats["lines_dropped"]
+    print(f"lines: {sent} emitted, {received[0]} received, "
+          f"{sent - received[0]} dropped ({arduino_stats['lines_dropped']} at the simulator)")
+    print(f"ack latency: p50 {percentile(latencies, 0.5) * 1000:.2f} ms, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.2f} ms, "
+          f"max {max(latencies, default=float('nan')) * 1000:.2f} ms, {timeouts} timeouts")
+    print(f"process CPU: {cpu / max(received[0], 1) * 1e6:.1f} us per line received "
+          f"(simulator included)")
+
+
+if __name__ == "__main__":
+    main()
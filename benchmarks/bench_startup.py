@@ -0,0 +1,84 @@
+"""
+Connection startup: fixed-delay connect vs parallel discovery.
+
+Creates --silent ptys that never answer (other serial devices) and one
+simulated Arduino, then measures time to connect and time to the first
+telemetry line, both for the old path (open the named port, sleep 2 s)
+and for pultrusion.discovery probing every port at once. Time to first
+frame needs the Tk window: see Help > Startup Timing in the app.
+
+    python benchmarks/bench_startup.py --silent 8
+"""
+import argparse
+import os
+import pty
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pultrusion.discovery import discover
+from pultrusion.protocol import TelemetrySample, parse_line
+from pultrusion.serial_io import ArduinoController
+from pultrusion.simulator import FakeArduino
+
+
+def first_telemetry(controller, started, lines=()):
+    for line, received_at in lines:
+        if isinstance(parse_line(line), TelemetrySample):
+            return received_at - started
+    while True:
+        for line in controller.read_data_from_arduino(wait=True):
+            if isinstance(parse_line(line), TelemetrySample):
+                return time.monotonic() - started
+
+
+def legacy(port):
+    started = time.monotonic()
+    controller = ArduinoController()
+    controller.connect(port)  # settle_time=2.0, as setup_connection() used to
+    connected = time.monotonic() - started
+    telemetry = first_telemetry(controller, started)
+    controller.close_connection()
+    return connected, telemetry
+
+
+def discovered(ports):
+    started = time.monotonic()
+    result = discover(ports)
+    connected = time.monotonic() - started
+    telemetry = first_telemetry(result.controller, started, result.lines)
+    result.controller.close_connection()
+    return connected, telemetry, result.port
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--silent", type=int, default=8, help="ports that never answer")
+    args = parser.parse_args()
+
+    silent = []
+    for _ in range(args.silent):
+        master, slave = pty.openpty()
+        silent.append((master, slave, os.ttyname(slave)))
+    arduino = FakeArduino()
+    port = arduino.open()
+    arduino.start()
+
+    sys.stdout = open(os.devnull, "w")  # Silence connect/PING prints
+    legacy_connected, legacy_telemetry = legacy(port)
+    # The machine's port is listed last, so every silent probe is running
+    connected, telemetry, found = discovered([name for _, _, name in silent] + [port])
+    time.sleep(0.5)  # Let the losing probes close their ports
+    sys.stdout = sys.__stdout__
+
+    arduino.stop()
+    for master, slave, _ in silent:
+        os.close(master)
+        os.close(slave)
+    print(f"fixed delay:  connected {legacy_connected * 1000:7.1f} ms, first telemetry {legacy_telemetry * 1000:7.1f} ms")
+    print(f"discovery:    connected {connected * 1000:7.1f} ms, first telemetry {telemetry * 1000:7.1f} ms "
+          f"({args.silent + 1} ports probed, found {'the machine' if found == port else found})")
+
+
+if __name__ == "__main__":
+    main()
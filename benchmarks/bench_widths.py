@@ -0,0 +1,86 @@
+"""
+Strip-width library: the old list + append-only file vs StripWidthStore.
+
+Builds a strip_widths.txt with --names distinct names each saved --repeats
+times, then times loading, name lookups, saves and a batch calculation.
+
+    python benchmarks/bench_widths.py --names 5000 --repeats 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pultrusion.strip_widths import StripWidthStore, parse_thicknesses, strip_width
+
+
+def legacy_load(path):
+    # What load_saved_widths() used to do
+    widths = []
+    with open(path, "r") as file:
+        for line in file:
+            name, width = line.strip().split(" : ")
+            widths.append((name, float(width)))
+    return widths
+
+
+def legacy_lookup(widths, name):
+    for saved_name, width in reversed(widths):
+        if saved_name == name:
+            return width
+    return None
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--names", type=int, default=5000)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--lookups", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "strip_widths.txt")
+        with open(path, "w") as file:
+            for r in range(args.repeats):
+                for i in range(args.names):
+                    file.write(f"Strip {i} : {0.1 + i * 0.001 + r * 0.01:.2f}\n")
+        lines_before = args.names * args.repeats
+
+        legacy, legacy_load_s = timed(legacy_load, path)
+        names = [f"Strip {i}" for i in np.random.default_rng(0).integers(0, args.names, args.lookups)]
+        _, legacy_lookup_s = timed(lambda: [legacy_lookup(legacy, name) for name in names])
+
+        store, store_load_s = timed(lambda: StripWidthStore(path).load())
+        with open(path) as file:
+            lines_after = sum(1 for _ in file)
+        _, reload_s = timed(lambda: StripWidthStore(path).load())
+        _, store_lookup_s = timed(lambda: [store.get(name) for name in names])
+        _, upsert_s = timed(lambda: [store.upsert(name, 1.0) for name in names])
+
+        thicknesses = parse_thicknesses("0.10:2.00:0.0001")
+        _, batch_s = timed(strip_width, thicknesses)
+        _, loop_s = timed(lambda: [t * 2.5 for t in thicknesses.tolist()])
+
+    print(f"file: {lines_before} lines, {args.names} names -> {lines_after} lines after compaction")
+    print(f"load:   list {legacy_load_s * 1000:8.2f} ms ({len(legacy)} rows)   "
+          f"store {store_load_s * 1000:8.2f} ms ({len(store)} rows, compaction included), "
+          f"{reload_s * 1000:.2f} ms once compacted")
+    print(f"lookup: list {legacy_lookup_s / args.lookups * 1e6:8.2f} us   "
+          f"store {store_lookup_s / args.lookups * 1e6:8.2f} us")
+    print(f"upsert: {upsert_s / args.lookups * 1e6:.2f} us (one appended line each)")
+    print(f"batch:  {len(thicknesses)} thicknesses in {batch_s * 1000:.3f} ms vectorized "
+          f"vs {loop_s * 1000:.3f} ms per item")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,436 @@
+"""
+Benchmark and regression suite for the host control stack.
+
+Runs headless (no display) against pty serial ports and the simulated
+Arduino, and stores the results as JSON:
+
+    reader     ArduinoController + LineReader throughput from a pty (lines/s)
+    handle     the GUI's per-line pipeline: the Machine's parse, coalescer,
+               state and telemetry store, then recording and UI posts
+               (lines/s, us per line)
+    roundtrip  SET_TEMP sent to its acknowledgment and echo (ms)
+    debounce   a dragged slider through the CommandCoalescer: commands
+               actually sent, CPU per set(), time until the last value is acked
+    timers     Scheduler timer lateness under load (ms)
+    cpu        serial loop CPU per telemetry sample at a high line rate (us)
+    logging    cost of a log call per telemetry line: filtered out by level,
+               queued for the writer thread, rate limited; print() for scale (us)
+    soak       a simulated 12-hour run through the pipeline: memory growth
+
+The "handle" pipeline deliberately copies Machine._on_line() and the
+app's on_machine_event() with the same objects: PultrusionApp's
+create_app() needs a display, and the copy keeps Tk out of the timing.
+Record a baseline, then compare a later run against it. With --compare, the exit status is 1
+if any metric got worse by more than --threshold:
+
+    python benchmarks/suite.py --output baseline.json
+    python benchmarks/suite.py --compare baseline.json --output new.json
+    python benchmarks/suite.py --compare baseline.json --input new.json   (no rerun)
+    python benchmarks/suite.py --only handle,roundtrip --quick
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import pty
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from threading import Thread
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pultrusion.async_backend import AsyncSerialBackend
+from pultrusion.coalescer import CommandCoalescer
+from pultrusion.discovery import probe_port
+from pultrusion.log import setup_logging, shutdown_logging
+from pultrusion.machine import MachineState, speed_to_pwm
+from pultrusion.metrics import ParseMetrics
+from pultrusion.protocol import TelemetrySample
+from pultrusion.recipes import Scheduler
+from pultrusion.recorder import RunRecorder
+from pultrusion.serial_io import ArduinoController
+from pultrusion.simulator import FakeArduino
+from pultrusion.telemetry_store import TelemetryStore
+from pultrusion.ui_pump import UiUpdatePump
+
+SUITE_VERSION = 1
+DEFAULT_THRESHOLD = 0.15   # Relative change counted as a regression
+
+
+class Results:
+    """Metrics of one run: name -> value, unit, which direction is better, noise floor."""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def add(self, name, value, unit, better, noise=0.0):
+        # noise: absolute change too small to count, e.g. scheduler jitter on a busy machine
+        self.metrics[name] = {"value": value, "unit": unit, "better": better, "noise": noise}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def telemetry_lines(count):
+    return [TelemetrySample(150 + (i % 200) / 20, 160, i % 3 == 0).to_line() for i in range(count)]
+
+
+class Pipeline:
+    """What the app's Machine and on_machine_event() do with each live line, minus Tk."""
+
+    def __init__(self, directory, coalescer=None):
+        self.parse_metrics = ParseMetrics()
+        self.recorder = RunRecorder(directory)
+        self.coalescer = coalescer or CommandCoalescer(backend=None)
+        self.state = MachineState("bench")
+        self.store = TelemetryStore()
+        self.ui_pump = UiUpdatePump(root=None)   # post() only; nothing drains it here
+        self.temp_var = object()
+        self.ssr_var = object()
+
+    def handle(self, line, received_at=None):
+        event = self.parse_metrics.parse(line)
+        self.coalescer.observe(event)
+        self.state.apply(event, received_at)
+        self.store.add_event(event, received_at)
+        self.recorder.record_event(event)
+        if isinstance(event, TelemetrySample):
+            self.ui_pump.post(self.temp_var, f"Temperature: {event.temperature:.2f}°C\n"
+                                             f"Desired Temperature: {event.set_temperature}°C", received_at)
+            self.ui_pump.post(self.ssr_var, f"SSR State: {'ON' if event.ssr_on else 'OFF'}", received_at)
+
+    def close(self):
+        self.recorder.close()
+
+
+def silenced(function, *args):
+    """Runs function with stdout discarded (connect/send prints)."""
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        return function(*args)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+# ---------------------------
+# Benchmarks
+# ---------------------------
+def bench_reader(results, quick):
+    count = 50000 if quick else 200000
+    data = "".join(line + "\r\n" for line in telemetry_lines(count)).encode("utf-8")
+    master, slave = pty.openpty()
+    controller = ArduinoController()
+    silenced(controller.connect, os.ttyname(slave), 9600, 0)
+
+    def writer():
+        view = memoryview(data)
+        while view:
+            written = os.write(master, view[:4096])
+            view = view[written:]
+
+    received = 0
+    started = time.perf_counter()
+    thread = Thread(target=writer, daemon=True)
+    thread.start()
+    while received < count:
+        received += len(controller.read_data_from_arduino(wait=True))
+    elapsed = time.perf_counter() - started
+    silenced(controller.close_connection)
+    os.close(master)
+    os.close(slave)
+    results.add("reader.lines_per_s", count / elapsed, "lines/s", "higher")
+
+
+def bench_handle(results, quick):
+    count = 50000 if quick else 200000
+    lines = telemetry_lines(count)
+    with tempfile.TemporaryDirectory() as directory:
+        pipeline = Pipeline(directory)
+        now = time.monotonic()
+        started = time.perf_counter()
+        for line in lines:
+            pipeline.handle(line, now)
+        elapsed = time.perf_counter() - started
+        pipeline.close()
+    results.add("handle.lines_per_s", count / elapsed, "lines/s", "higher")
+    results.add("handle.us_per_line", elapsed / count * 1e6, "us", "lower", noise=1.0)
+    results.add("handle.parse_us", pipeline.parse_metrics.time.sum / count * 1e6, "us", "lower", noise=0.5)
+
+
+def bench_roundtrip(results, quick):
+    count = 50 if quick else 200
+    arduino = FakeArduino()
+    arduino.start()
+    backend = AsyncSerialBackend(silenced(probe_port, arduino.port_name).controller)
+    backend.start()
+    latencies = []
+    for i in range(count):
+        value = 100 + i % 100
+        started = time.monotonic()
+        silenced(lambda: backend.submit(f"SET_TEMP:{value}", expect=f"Set Temperature updated to {value}")
+                 .result(5.0))
+        latencies.append(time.monotonic() - started)
+    echo = backend.echo_latency
+    backend.stop()
+    arduino.stop()
+    results.add("roundtrip.ack_p50_ms", percentile(latencies, 0.5) * 1000, "ms", "lower", noise=0.5)
+    results.add("roundtrip.ack_p99_ms", percentile(latencies, 0.99) * 1000, "ms", "lower", noise=2.0)
+    results.add("roundtrip.echo_mean_ms", echo.sum / max(1, echo.count) * 1000, "ms", "lower", noise=0.5)
+
+
+def bench_debounce(results, quick):
+    moves = 300 if quick else 1000
+    arduino = FakeArduino()
+    arduino.start()
+    backend = AsyncSerialBackend(silenced(probe_port, arduino.port_name).controller)
+    coalescer = CommandCoalescer(backend)
+    backend.start()
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    try:
+        # A slider dragged from 0 to 100 % and back at 1 kHz of motion events
+        cpu = 0.0
+        for i in range(moves):
+            percent = abs((i * 200 // moves) % 200 - 100)
+            started = time.thread_time()
+            coalescer.set("fan", speed_to_pwm(percent))
+            cpu += time.thread_time() - started
+            time.sleep(0.001)
+        released = time.monotonic()
+        final = speed_to_pwm(abs((moves - 1) * 200 // moves % 200 - 100))
+        while arduino.fan_pwm != final and time.monotonic() - released < 10:
+            time.sleep(0.001)
+        settle = time.monotonic() - released
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    sent = coalescer.stats()["fan"]["sent"]
+    backend.stop()
+    arduino.stop()
+    results.add("debounce.commands_sent", sent, "commands", "lower", noise=2)
+    results.add("debounce.set_us", cpu / moves * 1e6, "us", "lower", noise=5.0)
+    results.add("debounce.settle_ms", settle * 1000, "ms", "lower", noise=50.0)
+
+
+def bench_timers(results, quick):
+    count = 500 if quick else 2000
+    scheduler = Scheduler("bench-scheduler")
+    scheduler.start()
+    lateness = []
+    base = time.monotonic() + 0.1
+    span = 1.0 if quick else 2.0
+    for i in range(count):
+        due = base + span * ((i * 7919) % count) / count   # Spread out, added out of order
+        scheduler.call_at(due, lambda due=due: lateness.append(time.monotonic() - due))
+    while len(lateness) < count and time.monotonic() < base + span + 5:
+        time.sleep(0.01)
+    scheduler.stop()
+    results.add("timers.late_p50_ms", percentile(lateness, 0.5) * 1000, "ms", "lower", noise=0.5)
+    results.add("timers.late_p99_ms", percentile(lateness, 0.99) * 1000, "ms", "lower", noise=2.0)
+
+
+def bench_cpu(results, quick):
+    seconds = 2.0 if quick else 5.0
+    arduino = FakeArduino(telemetry_hz=500)
+    arduino.start()
+    backend = AsyncSerialBackend(silenced(probe_port, arduino.port_name).controller)
+    with tempfile.TemporaryDirectory() as directory:
+        pipeline = Pipeline(directory)
+        backend.subscribe(pipeline.handle)
+        backend.start()
+        cpu = []
+
+        def mark():
+            # Serial loop thread: its CPU time so far and the lines handled
+            cpu.append((time.thread_time(), pipeline.parse_metrics.lines))
+        backend.call_later(0.5, mark)
+        backend.call_later(0.5 + seconds, mark)
+        time.sleep(seconds + 1.0)
+        backend.stop()
+        arduino.stop()
+        pipeline.close()
+    (cpu0, lines0), (cpu1, lines1) = cpu
+    results.add("cpu.us_per_sample", (cpu1 - cpu0) / max(1, lines1 - lines0) * 1e6, "us", "lower", noise=2.0)
+
+
+def bench_logging(results, quick):
+    count = 50000 if quick else 200000
+    lines = telemetry_lines(count)
+    logger = logging.getLogger("pultrusion.bench")
+
+    def per_line(function):
+        # CPU of the calling thread only; the writer thread's formatting is not the caller's cost
+        started = time.thread_time()
+        for line in lines:
+            function("Received: %s", line)
+        return (time.thread_time() - started) / count * 1e6
+
+    with open(os.devnull, "w") as devnull:
+        pipeline = setup_logging("INFO", stream=devnull, rate=0, queue_size=count + 1)
+        disabled = per_line(logger.debug)
+        queued = per_line(logger.info)
+        pipeline.stop()     # Let the writer thread finish before timing the next case
+        setup_logging("INFO", stream=devnull)
+        limited = per_line(logger.info)   # All but the first burst are suppressed
+        shutdown_logging()
+        printed = per_line(lambda text, line: print(text % line, file=devnull))
+    logging.getLogger().setLevel(logging.WARNING)
+    results.add("logging.disabled_us", disabled, "us", "lower", noise=0.2)
+    results.add("logging.queued_us", queued, "us", "lower", noise=1.0)
+    results.add("logging.rate_limited_us", limited, "us", "lower", noise=1.0)
+    results.add("logging.print_us", printed, "us", "lower", noise=1.0)
+
+
+def bench_soak(results, quick):
+    hours = 1 if quick else 12
+    rate = 10                                   # The firmware's telemetry rate
+    lines = telemetry_lines(3600)               # One hour of distinct lines, reused
+    with tempfile.TemporaryDirectory() as directory:
+        pipeline = Pipeline(directory)
+        tracemalloc.start()
+        after_first_hour = None
+        t = 0.0
+        started = time.perf_counter()
+        for hour in range(hours):
+            for _ in range(rate):
+                for line in lines:
+                    pipeline.handle(line, t)
+                    t += 1.0 / rate
+            pipeline.ui_pump._latest.clear()    # The Tk loop drains these every frame
+            if hour == 0:
+                after_first_hour = tracemalloc.get_traced_memory()[0]
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        elapsed = time.perf_counter() - started
+        pipeline.close()
+    results.add("soak.growth_kb", (current - after_first_hour) / 1024, "KiB", "lower", noise=64)
+    results.add("soak.peak_kb", peak / 1024, "KiB", "lower", noise=256)
+    results.add("soak.hours_per_s", hours / elapsed, "simulated h/s", "higher")
+
+
+BENCHMARKS = {
+    "reader": bench_reader,
+    "handle": bench_handle,
+    "roundtrip": bench_roundtrip,
+    "debounce": bench_debounce,
+    "timers": bench_timers,
+    "cpu": bench_cpu,
+    "logging": bench_logging,
+    "soak": bench_soak,
+}
+
+
+# ---------------------------
+# Running and comparing
+# ---------------------------
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(names, quick, repeat):
+    """Runs each benchmark repeat times and keeps the median of every metric."""
+    runs = []
+    for attempt in range(repeat):
+        results = Results()
+        for name in names:
+            print(f"[{attempt + 1}/{repeat}] {name}...", file=sys.stderr)
+            BENCHMARKS[name](results, quick)
+        runs.append(results.metrics)
+    metrics = {}
+    for name, first in runs[0].items():
+        metric = dict(first)
+        metric["value"] = statistics.median(run[name]["value"] for run in runs)
+        metrics[name] = metric
+    return {
+        "suite_version": SUITE_VERSION,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": quick,
+        "repeat": repeat,
+        "metrics": metrics,
+    }
+
+
+def compare(baseline, current, threshold):
+    """Returns [(name, old, new, change, verdict)] for the metrics in both runs."""
+    rows = []
+    for name, new in current["metrics"].items():
+        old = baseline["metrics"].get(name)
+        if old is None:
+            continue
+        old_value, new_value = old["value"], new["value"]
+        change = (new_value - old_value) / old_value if old_value else 0.0
+        worse = change < 0 if new["better"] == "higher" else change > 0
+        if abs(new_value - old_value) <= new.get("noise", 0.0) or abs(change) <= threshold:
+            verdict = "ok"
+        else:
+            verdict = "REGRESSION" if worse else "improved"
+        rows.append((name, old_value, new_value, change, verdict))
+    return rows
+
+
+def print_results(report):
+    for name, metric in report["metrics"].items():
+        print(f"{name:<26} {metric['value']:>14.3f} {metric['unit']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", help=f"comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--quick", action="store_true", help="smaller runs (results are not comparable "
+                                                            "with full runs)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per benchmark; the median is kept")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--input", help="compare this results file instead of running")
+    parser.add_argument("--compare", metavar="BASELINE", help="results file to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"relative change counted as a regression (default {DEFAULT_THRESHOLD})")
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input) as file:
+            report = json.load(file)
+    else:
+        names = args.only.split(",") if args.only else list(BENCHMARKS)
+        unknown = [name for name in names if name not in BENCHMARKS]
+        if unknown:
+            parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+        report = run(names, args.quick, max(1, args.repeat))
+        print_results(report)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if baseline.get("quick") != report.get("quick"):
+            print("[WARNING] Comparing a --quick run with a full run; sizes differ.")
+        rows = compare(baseline, report, args.threshold)
+        print(f"\nAgainst {args.compare} (revision {baseline.get('revision')}), "
+              f"threshold {args.threshold:.0%}:")
+        for name, old, new, change, verdict in rows:
+            print(f"{name:<26} {old:>12.3f} -> {new:>12.3f}  {change:+7.1%}  {verdict}")
+        regressions = [row for row in rows if row[4] == "REGRESSION"]
+        if regressions:
+            print(f"{len(regressions)} regression(s).")
+            sys.exit(1)
+        print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
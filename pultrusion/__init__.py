@@ -0,0 +1,7 @@
+"""
+Host-side support code for the PET filament pultrusion machine.
+
+PultrusionApp.py (the Tk GUI) builds on the modules in this package. The
+headless core is pultrusion.machine.Machine; python -m pultrusion is its
+command line. Neither imports tkinter.
+"""
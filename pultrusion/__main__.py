@@ -0,0 +1,3 @@
+from pultrusion.cli import main
+
+raise SystemExit(main())
@@ -0,0 +1,381 @@
+"""
+Shift reports from recorded runs, without the GUI.
+
+Reads run recordings (.plr, see pultrusion.recorder) and text logs, and
+writes one summary row per run:
+
+    ssr_duty        share of the time the heater SSR was on
+    in_band         share of the heating time within --band °C of the set point
+    steps           set point increases; overshoot is how far the temperature
+                    rose above each new set point before the next change
+    energy_wh       heater energy: SSR on-time times --heater-watts
+    cooling         shutdowns and the time from "Initiating shutdown" to
+                    "Cooling complete"
+    estops          emergency stops
+
+All files of one recording session make up one run. Each text log is a
+run of its own. Text logs hold firmware lines, either raw captures or the
+output of the app and the daemon. A line may start with an ISO date or epoch
+seconds, or be a JSON object with "t" and "msg" (the LOG_FILE format,
+see pultrusion.log). Lines without a time are spaced at the firmware's
+telemetry rate.
+
+A run is read in chunks of --chunk records. Recordings are memory-mapped, so
+only the chunk being read is in memory, and every chunk is reduced with
+NumPy. Runs are spread over a process pool:
+
+    python -m pultrusion.analytics runs/ --band 5 --csv shift.csv
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from pultrusion import protocol
+from pultrusion.recorder import (EVENT, EVENT_FIELDS, INDEX, RECORD_DTYPE, TELEMETRY, RunReader,
+                                 encode_command, encode_event)
+
+CHUNK_RECORDS = 1 << 20      # Records (32 bytes each) reduced at a time
+TEXT_INTERVAL = 0.1          # s between untimed telemetry lines (the firmware's UPDATE_INTERVAL)
+MAX_GAP = 5.0                # s; longer gaps between samples are recording gaps, not run time
+HEATER_WATTS = 40.0          # CR-10 hotend element
+DEFAULT_BAND = 5.0           # °C
+
+SHUTDOWN_CODE = EVENT_FIELDS[protocol.ShutdownStarted][0]
+COOLED_CODE = EVENT_FIELDS[protocol.CoolingComplete][0]
+ESTOP_CODE = EVENT_FIELDS[protocol.EmergencyStop][0]
+RESTART_CODE = EVENT_FIELDS[protocol.SystemRestarted][0]
+
+COLUMNS = ("run", "files", "start", "hours", "samples", "ssr_duty", "in_band", "steps",
+           "overshoot_mean", "overshoot_max", "energy_wh", "cooling_count", "cooling_s",
+           "estops", "max_temperature")
+
+
+class RunAnalyzer:
+    """
+    Shift figures for one run, fed one chunk of records at a time (a
+    RECORD_DTYPE array, in time order). The state that spans chunks is
+    kept: the last telemetry sample, the set point step in progress and an
+    unfinished cooling phase.
+    """
+
+    def __init__(self, band=DEFAULT_BAND, heater_watts=HEATER_WATTS, max_gap=MAX_GAP):
+        self.band = band
+        self.heater_watts = heater_watts
+        self.max_gap = max_gap
+        self.start = None
+        self.end = None
+        self.samples = 0
+        self.time = 0.0           # Seconds covered by telemetry, gaps left out
+        self.heating_time = 0.0   # ... with a set point above 0
+        self.ssr_time = 0.0
+        self.in_band_time = 0.0
+        self.max_temperature = float("-inf")
+        self.overshoots = []
+        self.cooling = []
+        self.estops = 0
+        self._last = None         # (t, temperature, set point, ssr) of the previous sample
+        self._step = None         # [set point, peak temperature, is an increase]
+        self._last_target = None
+        self._shutdown_at = None
+
+    def feed(self, records):
+        records = records[records["kind"] != INDEX]
+        if not len(records):
+            return
+        if self.start is None:
+            self.start = float(records["t"][0])
+        self.end = float(records["t"][-1])
+        telemetry = records[records["kind"] == TELEMETRY]
+        if len(telemetry):
+            self._telemetry(telemetry["t"], telemetry["v0"].astype(np.float64),
+                            telemetry["v1"].astype(np.float64), telemetry["v2"] > 0)
+        events = records[records["kind"] == EVENT]
+        if len(events):
+            self._events(events["t"], events["code"])
+
+    def _telemetry(self, t, temperature, setpoint, ssr):
+        self.samples += len(t)
+        peak = np.nanmax(temperature) if not np.isnan(temperature).all() else float("-inf")
+        self.max_temperature = max(self.max_temperature, float(peak))
+
+        # Each sample holds until the next one; the previous chunk's last sample comes first
+        if self._last is not None:
+            last_t, last_temperature, last_setpoint, last_ssr = self._last
+            times = np.concatenate(([last_t], t))
+            temperature_held = np.concatenate(([last_temperature], temperature[:-1]))
+            setpoint_held = np.concatenate(([last_setpoint], setpoint[:-1]))
+            ssr_held = np.concatenate(([last_ssr], ssr[:-1]))
+        else:
+            times = t
+            temperature_held, setpoint_held, ssr_held = temperature[:-1], setpoint[:-1], ssr[:-1]
+        dt = np.diff(times)
+        dt[(dt < 0) | (dt > self.max_gap)] = 0.0
+        heating = setpoint_held > 0
+        with np.errstate(invalid="ignore"):
+            in_band = heating & (np.abs(temperature_held - setpoint_held) <= self.band)
+        self.time += float(dt.sum())
+        self.heating_time += float(dt[heating].sum())
+        self.ssr_time += float(dt[ssr_held].sum())
+        self.in_band_time += float(dt[in_band].sum())
+        self._last = (float(t[-1]), float(temperature[-1]), float(setpoint[-1]), bool(ssr[-1]))
+        self._steps(temperature, setpoint)
+
+    def _steps(self, temperature, setpoint):
+        previous = self._step[0] if self._step is not None else np.nan
+        changed = setpoint != np.concatenate(([previous], setpoint[:-1]))
+        starts = np.flatnonzero(changed)
+        # fmax ignores the NaN a broken thermistor reads as
+        first = starts[0] if len(starts) else len(setpoint)
+        if self._step is not None and first:
+            self._step[1] = float(np.fmax(self._step[1], np.fmax.reduce(temperature[:first])))
+        if not len(starts):
+            return
+        peaks = np.fmax.reduceat(temperature, starts)
+        for start, peak in zip(starts, peaks):
+            target = float(setpoint[start])
+            self._finish_step()
+            # The first set point of a run was set before the recording started
+            rising = self._last_target is not None and target > max(0.0, self._last_target)
+            self._step = [target, float(peak), rising]
+            self._last_target = target
+
+    def _finish_step(self):
+        # A step that never reached its set point has no overshoot to speak of
+        if self._step is not None:
+            target, peak, rising = self._step
+            if rising and peak >= target:
+                self.overshoots.append(peak - target)
+            self._step = None
+
+    def _events(self, t, codes):
+        self.estops += int(np.count_nonzero(codes == ESTOP_CODE))
+        interesting = np.flatnonzero(np.isin(codes, (SHUTDOWN_CODE, COOLED_CODE, RESTART_CODE)))
+        for i in interesting:
+            code = codes[i]
+            if code == SHUTDOWN_CODE:
+                if self._shutdown_at is None:
+                    self._shutdown_at = float(t[i])
+            elif code == COOLED_CODE and self._shutdown_at is not None:
+                self.cooling.append(float(t[i]) - self._shutdown_at)
+                self._shutdown_at = None
+            elif code == RESTART_CODE:
+                self._shutdown_at = None     # Power cut during cooling: no duration
+
+    def summary(self):
+        """The run's figures; shares are fractions, times in seconds, None if there was no data."""
+        self._finish_step()
+        overshoots = np.array(self.overshoots)
+        return {
+            "start": self.start,
+            "hours": (self.end - self.start) / 3600 if self.start is not None else 0.0,
+            "samples": self.samples,
+            "ssr_duty": self.ssr_time / self.time if self.time else None,
+            "in_band": self.in_band_time / self.heating_time if self.heating_time else None,
+            "steps": len(overshoots),
+            "overshoot_mean": float(overshoots.mean()) if len(overshoots) else None,
+            "overshoot_max": float(overshoots.max()) if len(overshoots) else None,
+            "energy_wh": self.ssr_time * self.heater_watts / 3600,
+            "cooling_count": len(self.cooling),
+            "cooling_s": float(np.mean(self.cooling)) if self.cooling else None,
+            "estops": self.estops,
+            "max_temperature": self.max_temperature if self.samples else None,
+        }
+
+
+# -------------------------------------------------
+# Reading runs in chunks
+# -------------------------------------------------
+def recording_chunks(path, chunk=CHUNK_RECORDS):
+    """
+    Record arrays of a .plr file, chunk slots at a time. Each chunk is copied
+    out of the memory map, so the map can be closed while the last one is in use.
+    """
+    with RunReader(path) as reader:
+        for start in range(0, len(reader.slots), chunk):
+            yield np.array(reader.slots[start:start + chunk])
+
+
+def _line_time(line):
+    """(t, rest of the line) for a leading ISO date or epoch seconds, else (None, line)."""
+    head, _, rest = line.partition(" ")
+    if head[:1].isdigit():
+        try:
+            return float(head), rest
+        except ValueError:
+            pass
+        stamp = head
+        if len(head) == 10 and rest[:1].isdigit():     # "2026-10-18 12:00:00.123 ..."
+            time_part, _, rest = rest.partition(" ")
+            stamp = f"{head}T{time_part}"
+        try:
+            return datetime.fromisoformat(stamp.replace(",", ".")).timestamp(), rest
+        except ValueError:
+            pass
+    return None, line
+
+
+def _strip_log_prefix(line):
+    """The message of an app log line ("12:00:01 [INFO] ..."), or the line itself."""
+    if "] " in line[:30] and "[" in line[:20]:
+        return line.split("] ", 1)[1]
+    return line
+
+
+def text_chunks(path, chunk=CHUNK_RECORDS, interval=TEXT_INTERVAL):
+    """
+    Record arrays from a text log, parsed chunk lines at a time. "Sent to
+    Arduino: ..." lines become commands; everything else is parsed as a
+    firmware line.
+    """
+    t = 0.0
+    with open(path, encoding="utf-8", errors="replace") as file:
+        while True:
+            lines = list(itertools.islice(file, chunk))
+            if not lines:
+                return
+            rows = []
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    continue
+                if line[0] == "{":
+                    try:
+                        message = json.loads(line)
+                        stamp, line = message.get("t"), str(message.get("msg", ""))
+                    except ValueError:
+                        stamp = None
+                else:
+                    stamp, line = _line_time(line)
+                    line = _strip_log_prefix(line)
+                if line.startswith("Sent to Arduino: "):
+                    encoded = [encode_command(command.strip())
+                               for command in line[17:].split(" | ")]
+                else:
+                    event = protocol.parse_line(line)
+                    encoded = [encode_event(event)] if event is not None else []
+                for record in encoded:
+                    if record is None:
+                        continue
+                    kind, code, values = record
+                    if stamp is not None:
+                        t = float(stamp)
+                    elif kind == TELEMETRY:
+                        t += interval
+                    values = values + (np.nan,) * (4 - len(values))
+                    rows.append((t, kind, code, 0) + values)
+            array = np.zeros(len(rows), dtype=RECORD_DTYPE)
+            if rows:
+                columns = list(zip(*rows))
+                for name, column in zip(("t", "kind", "code", "flags", "v0", "v1", "v2", "v3"), columns):
+                    array[name] = column
+            yield array
+
+
+def analyse_run(paths, band=DEFAULT_BAND, heater_watts=HEATER_WATTS, chunk=CHUNK_RECORDS):
+    """Summary row for one run (a session's .plr files, or one text log)."""
+    analyzer = RunAnalyzer(band, heater_watts)
+    for path in paths:
+        chunks = recording_chunks(path, chunk) if path.endswith(".plr") else text_chunks(path, chunk)
+        for records in chunks:
+            analyzer.feed(records)
+    name = os.path.basename(paths[0])
+    row = {"run": name.rsplit("-", 1)[0] if name.endswith(".plr") else name, "files": len(paths)}
+    row.update(analyzer.summary())
+    return row
+
+
+def find_runs(paths):
+    """Groups the given files and directories into runs: {name: [files]} in name order."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if name.endswith((".plr", ".log", ".txt", ".jsonl")))
+        else:
+            files.append(path)
+    runs = {}
+    for path in files:
+        name = os.path.basename(path)
+        key = os.path.join(os.path.dirname(path), name.rsplit("-", 1)[0]) if name.endswith(".plr") else path
+        runs.setdefault(key, []).append(path)
+    return {key: sorted(group) for key, group in sorted(runs.items())}
+
+
+def analyse(paths, band=DEFAULT_BAND, heater_watts=HEATER_WATTS, workers=None, chunk=CHUNK_RECORDS):
+    """Summary rows for every run under paths; runs are analysed in parallel processes."""
+    runs = list(find_runs(paths).values())
+    if workers == 1 or len(runs) < 2:
+        return [analyse_run(files, band, heater_watts, chunk) for files in runs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(analyse_run, runs, itertools.repeat(band), itertools.repeat(heater_watts),
+                             itertools.repeat(chunk)))
+
+
+# -------------------------------------------------
+# Output
+# -------------------------------------------------
+def _cell(name, value):
+    if value is None:
+        return "-"
+    if name == "start":
+        return time.strftime("%Y-%m-%d %H:%M", time.localtime(value))
+    if name in ("ssr_duty", "in_band"):
+        return f"{value * 100:.1f}%"
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+def format_table(rows):
+    cells = [[_cell(name, row[name]) for name in COLUMNS] for row in rows]
+    widths = [max([len(name)] + [len(line[i]) for line in cells]) for i, name in enumerate(COLUMNS)]
+    lines = ["  ".join(name.ljust(width) for name, width in zip(COLUMNS, widths))]
+    for line in cells:
+        lines.append("  ".join(cell.ljust(width) for cell, width in zip(line, widths)))
+    return "\n".join(lines)
+
+
+def write_csv(rows, path):
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-run shift figures from recorded runs and text logs.")
+    parser.add_argument("paths", nargs="+", help=".plr recordings, text logs, or directories of them")
+    parser.add_argument("--band", type=float, default=DEFAULT_BAND,
+                        help=f"°C either side of the set point counted as in band (default {DEFAULT_BAND:g})")
+    parser.add_argument("--heater-watts", type=float, default=HEATER_WATTS,
+                        help=f"heater power for the energy estimate (default {HEATER_WATTS:g})")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: one per CPU)")
+    parser.add_argument("--chunk", type=int, default=CHUNK_RECORDS, help="records per chunk")
+    parser.add_argument("--csv", help="also write the table to this CSV file")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    rows = analyse(args.paths, args.band, args.heater_watts, args.workers, args.chunk)
+    if not rows:
+        parser.error("no recordings or logs found")
+    if args.json:
+        json.dump(rows, sys.stdout, indent=1)
+        print()
+    else:
+        print(format_table(rows))
+    if args.csv:
+        write_csv(rows, args.csv)
+    print(f"{len(rows)} run(s) in {time.perf_counter() - started:.2f} s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
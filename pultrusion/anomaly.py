@@ -0,0 +1,271 @@
+"""
+Thermal fault detection on the live telemetry stream.
+
+The firmware's only safety logic is the emergency stop switch.
+AnomalyDetector watches the telemetry for three kinds of fault. Each
+sample costs O(1): a few exponentially weighted moving averages (EWMA),
+a rate of change and a CUSUM, with no history kept.
+
+sensor   The thermistor reads nonsense: NaN, or outside
+         [min_temperature, max_temperature] for sensor_samples samples in
+         a row, or repeated jumps of more than max_step °C between
+         samples (the hotend cannot change that fast), or exactly the
+         same reading for stuck_seconds while the SSR is mostly on.
+runaway  The temperature keeps rising with the SSR off, e.g. welded SSR
+         contacts. Once the SSR has been off for runaway_grace seconds
+         (the sensor lags the heater block), a CUSUM adds up the rise in
+         excess of runaway_rate °C/s. The alarm is raised when the sum
+         passes runaway_limit °C. Cooling and the normal overshoot keep
+         the sum at zero.
+no_heat  The heater is driven hard (SSR duty EWMA of at least
+         heating_duty) more than heating_margin below the set point, but
+         the temperature rose by less than min_rise °C over
+         heating_window seconds. Causes include a failed heater, an open
+         SSR or a thermistor that fell out of the block.
+
+Alarms latch until reset(). SafetyMonitor runs a detector on a
+Machine's events on the serial loop thread. On an alarm it can stop
+whatever else is setting temperatures (the machine's recipe, an
+autotune) and send SAFE_STATE_COMMANDS (heater off, fan at full speed)
+in the same write, before the next telemetry line is read.
+"""
+import logging
+import math
+import time
+
+from pultrusion.machine import speed_to_pwm
+from pultrusion.protocol import SystemRestarted, TelemetrySample
+
+log = logging.getLogger(__name__)
+
+RULES = ("sensor", "runaway", "no_heat")
+# Heater off and the fan at full speed (the fan's PWM is inverted: 1 is fastest)
+SAFE_STATE_COMMANDS = ("SET_TEMP:0", f"SET_FAN_PWM:{speed_to_pwm(100)}")
+MAX_GAP = 5.0   # Seconds without telemetry after which rates start over
+
+
+class Alarm:
+    """One raised rule: its name, a message, and the sample that raised it."""
+    __slots__ = ("rule", "message", "t", "temperature", "set_temperature")
+
+    def __init__(self, rule, message, t, temperature, set_temperature):
+        self.rule = rule
+        self.message = message
+        self.t = t
+        self.temperature = temperature
+        self.set_temperature = set_temperature
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"Alarm({self.rule!r}, {self.message!r})"
+
+
+class AnomalyDetector:
+    """
+    Feed every telemetry sample to update() (or every event to observe());
+    both return the alarms the sample raised. Thresholds are in °C and
+    seconds. rules selects which of RULES run.
+    """
+
+    def __init__(self, rules=RULES, min_temperature=-10.0, max_temperature=320.0, sensor_samples=3,
+                 max_step=15.0, max_jumps=3, jump_decay=10.0, stuck_seconds=60.0,
+                 runaway_grace=30.0, runaway_rate=0.05, runaway_limit=5.0, runaway_margin=5.0,
+                 heating_duty=0.9, heating_window=120.0, min_rise=5.0, heating_margin=2.0,
+                 smoothing=2.0, duty_smoothing=20.0):
+        unknown = set(rules) - set(RULES)
+        if unknown:
+            raise ValueError(f"Unknown rules: {', '.join(sorted(unknown))}")
+        self.rules = frozenset(rules)
+        self.min_temperature = min_temperature
+        self.max_temperature = max_temperature
+        self.sensor_samples = sensor_samples
+        self.max_step = max_step
+        self.max_jumps = max_jumps
+        self.jump_decay = jump_decay            # Seconds for the jump count to fall by one
+        self.stuck_seconds = stuck_seconds
+        self.runaway_grace = runaway_grace
+        self.runaway_rate = runaway_rate
+        self.runaway_limit = runaway_limit
+        self.runaway_margin = runaway_margin    # Only above set point + margin
+        self.heating_duty = heating_duty
+        self.heating_window = heating_window
+        self.min_rise = min_rise
+        self.heating_margin = heating_margin    # Only below set point - margin
+        self.smoothing = smoothing              # EWMA time constants (s)
+        self.duty_smoothing = duty_smoothing
+        self.samples = 0
+        self.active = {}                        # rule -> Alarm, until reset()
+        self.raised = 0
+        self.reset()
+
+    def reset(self, rule=None):
+        """Clears the latched alarm(s) and the statistics behind them."""
+        if rule is None:
+            self.active.clear()
+        else:
+            self.active.pop(rule, None)
+        self.last_t = None
+        self.last_reading = None
+        self.temperature = None     # EWMA of the plausible readings
+        self.rate = 0.0             # EWMA of d(temperature)/dt, °C/s
+        self.duty = 0.0             # EWMA of the SSR state
+        self.bad_readings = 0
+        self.jumps = 0.0
+        self.unchanged_since = None # Time the reading last changed
+        self.ssr_off_since = None
+        self.cusum = 0.0
+        self.heating_since = None   # (t, temperature) when the heater was last seen working
+        return self
+
+    def observe(self, event, t=None):
+        if isinstance(event, TelemetrySample):
+            return self.update(time.monotonic() if t is None else t,
+                               event.temperature, event.set_temperature, event.ssr_on)
+        if isinstance(event, SystemRestarted):
+            active = dict(self.active)
+            self.reset()
+            self.active.update(active)
+        return []
+
+    def update(self, t, temperature, set_temperature, ssr_on):
+        self.samples += 1
+        dt = None if self.last_t is None else t - self.last_t
+        self.last_t = t
+        if dt is not None and (dt <= 0 or dt > MAX_GAP):
+            dt = None   # Replayed at full speed, or telemetry stopped for a while
+        alarms = []
+
+        # Sensor: out of range, jumping faster than the hotend can change, or stuck
+        plausible = not math.isnan(temperature) and self.min_temperature <= temperature <= self.max_temperature
+        self.bad_readings = 0 if plausible else self.bad_readings + 1
+        if dt is not None:
+            self.jumps = max(0.0, self.jumps - dt / self.jump_decay)
+        last_reading, self.last_reading = self.last_reading, temperature if plausible else None
+        if plausible and last_reading is not None and abs(temperature - last_reading) > self.max_step:
+            self.jumps += 1
+        if not plausible or temperature != last_reading or dt is None:
+            self.unchanged_since = t
+        if "sensor" in self.rules:
+            if self.bad_readings >= self.sensor_samples:
+                self._raise(alarms, "sensor", f"Thermistor reads {temperature:.2f} °C", t, temperature, set_temperature)
+            elif self.jumps >= self.max_jumps:
+                self._raise(alarms, "sensor", f"Thermistor reading jumps by more than {self.max_step:g} °C",
+                            t, temperature, set_temperature)
+            elif t - self.unchanged_since >= self.stuck_seconds and self.duty >= 0.5:
+                self._raise(alarms, "sensor", f"Thermistor stuck at {temperature:.2f} °C with the heater on",
+                            t, temperature, set_temperature)
+        if not plausible:
+            return alarms
+
+        # EWMA of the temperature and of its rate of change, with time constants in seconds
+        if self.temperature is None or dt is None:
+            previous = None
+            if self.temperature is None:
+                self.temperature = temperature
+        else:
+            previous = self.temperature
+            self.temperature += (temperature - self.temperature) * (1.0 - math.exp(-dt / self.smoothing))
+            slope = (self.temperature - previous) / dt
+            self.rate += (slope - self.rate) * (1.0 - math.exp(-dt / self.smoothing))
+            self.duty += ((1.0 if ssr_on else 0.0) - self.duty) * (1.0 - math.exp(-dt / self.duty_smoothing))
+
+        # Runaway: CUSUM of the rise beyond runaway_rate while the SSR has been off a while
+        if ssr_on:
+            self.ssr_off_since = None
+            self.cusum = 0.0
+        elif self.ssr_off_since is None:
+            self.ssr_off_since = t
+        if (previous is not None and not ssr_on and t - self.ssr_off_since >= self.runaway_grace
+                and self.temperature > set_temperature + self.runaway_margin):
+            self.cusum = max(0.0, self.cusum + (self.rate - self.runaway_rate) * dt)
+            if self.cusum > self.runaway_limit and "runaway" in self.rules:
+                self._raise(alarms, "runaway",
+                            f"Temperature rising at {self.rate * 60:.1f} °C/min with the SSR off",
+                            t, temperature, set_temperature)
+        elif not ssr_on:
+            self.cusum = 0.0
+
+        # No heat: duty high below the set point, yet no rise over heating_window
+        if self.duty >= self.heating_duty and self.temperature < set_temperature - self.heating_margin:
+            if self.heating_since is None:
+                self.heating_since = (t, self.temperature)
+            elif t - self.heating_since[0] >= self.heating_window:
+                rise = self.temperature - self.heating_since[1]
+                if rise < self.min_rise and "no_heat" in self.rules:
+                    self._raise(alarms, "no_heat",
+                                f"Heater on for {t - self.heating_since[0]:.0f} s but the temperature "
+                                f"rose only {rise:.1f} °C", t, temperature, set_temperature)
+                self.heating_since = (t, self.temperature)
+        else:
+            self.heating_since = None
+        return alarms
+
+    def _raise(self, alarms, rule, message, t, temperature, set_temperature):
+        if rule in self.active:
+            return
+        alarm = self.active[rule] = Alarm(rule, message, t, temperature, set_temperature)
+        self.raised += 1
+        alarms.append(alarm)
+
+
+class SafetyMonitor:
+    """
+    Runs an AnomalyDetector on a Machine's events. On a new alarm it logs
+    it and, with safe_state:
+
+    - calls every function in cancel (e.g. an autotune's cancel) and
+      cancels the machine's running recipe, so neither sets a temperature
+      again;
+    - writes commands at once in a single write, and again once the
+      recipe has stopped, in case a ramp step sent one more set point in
+      between;
+    - requests the same values through the machine's coalescer, so a
+      reconnect does not restore the old set point.
+
+    on_alarm(alarm) is then called on the serial loop thread and must not
+    block. last_reaction holds the time from the sample being read to the
+    commands being written.
+    """
+
+    def __init__(self, machine, detector=None, safe_state=True, commands=SAFE_STATE_COMMANDS,
+                 cancel=(), on_alarm=None):
+        self.machine = machine
+        self.detector = detector or AnomalyDetector()
+        self.safe_state = safe_state
+        self.commands = tuple(commands)
+        self.cancel = list(cancel)
+        self.on_alarm = on_alarm
+        self.alarms = []
+        self.last_reaction = None
+        machine.add_listener(self._on_event)
+
+    def reset(self):
+        self.detector.reset()
+
+    def _on_event(self, machine, event, received_at):
+        alarms = self.detector.observe(event, received_at)
+        if not alarms:
+            return
+        if self.safe_state:
+            for cancel in self.cancel:
+                try:
+                    cancel()
+                except Exception as e:
+                    log.error("Error cancelling on a safety alarm: %s", e)
+            machine.backend.send_many(list(self.commands))
+            if received_at is not None:
+                self.last_reaction = time.monotonic() - received_at
+            machine.cancel_recipe(then=lambda: machine.backend.send_many(list(self.commands)))
+            machine.request_temperature(0)
+            machine.set_fan_speed(100)
+        for alarm in alarms:
+            self.alarms.append(alarm)
+            log.error("Safety alarm (%s): %s%s", alarm.rule, alarm.message,
+                      "; heater off, fan on" if self.safe_state else "")
+            if self.on_alarm is not None:
+                try:
+                    self.on_alarm(alarm)
+                except Exception as e:
+                    log.error("Error in alarm callback: %s", e)
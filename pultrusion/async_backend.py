@@ -0,0 +1,218 @@
+"""
+asyncio serial backend.
+
+A drop-in replacement for SerialDispatcher that runs one asyncio event loop
+in a background thread. The loop waits on the port's file descriptor, so a
+line is dispatched as soon as its bytes arrive and an idle port costs no
+wakeups at all. Ack timeouts and other timers (see pultrusion.coalescer)
+run on the loop instead of in sleeping threads. Results reach Tk through UiUpdatePump (root.after).
+
+Several backends can share one SerialLoop, so a process talking to many
+machines still has a single I/O thread. Ports without a selectable file
+descriptor (pyserial on Windows) are read with a blocking read in the
+loop's executor instead.
+"""
+import asyncio
+import logging
+import time
+from threading import Thread
+
+from pultrusion.dispatcher import SerialDispatcher, settle
+
+log = logging.getLogger(__name__)
+
+# Readiness reported this many times in a row without data means the device
+# went away (e.g. the USB cable was pulled); back off instead of spinning.
+MAX_EMPTY_READS = 10
+
+
+class SerialLoop:
+    """An asyncio event loop running in its own daemon thread."""
+
+    def __init__(self, name="serial-asyncio"):
+        self.name = name
+        self.loop = None
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self.loop = asyncio.new_event_loop()
+        self._thread = Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        if self._thread and self.loop is not None:
+            self.call_soon(self.loop.stop)
+            self._thread.join(timeout)
+        self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def call_soon(self, callback, *args):
+        """Runs callback(*args) on the loop thread; a no-op once stopped."""
+        try:
+            self.loop.call_soon_threadsafe(callback, *args)
+        except (AttributeError, RuntimeError):
+            pass  # Not started, or already stopped
+
+    def run_coroutine(self, coroutine):
+        """Schedules a coroutine from any thread; returns a concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            for task in asyncio.all_tasks(self.loop):
+                task.cancel()
+            self.loop.run_until_complete(asyncio.sleep(0))
+            self.loop.close()
+
+
+class AsyncSerialBackend(SerialDispatcher):
+    """
+    Same interface as SerialDispatcher (subscribe, send, submit, start,
+    stop), plus call_later() for timers on the loop.
+
+    Subscribers, ack callbacks and timers all run on the loop
+    thread and must not block. Pass a started SerialLoop as io_loop to share
+    it with other backends; otherwise the backend runs its own.
+    """
+
+    def __init__(self, controller, idle_sleep=0.1, io_loop=None):
+        super().__init__(controller, idle_sleep)
+        self._io = io_loop or SerialLoop()
+        self._owns_loop = io_loop is None
+        self._loop = None
+        self._main = None
+        self._watching = None     # Future that ends the current _watch()
+
+    # ---------------------------
+    # Public API (any thread)
+    # ---------------------------
+    def submit(self, command, expect=None, timeout=5.0):
+        future = super().submit(command, expect, timeout)
+        if expect is not None and self._loop is not None:
+            # The timeout is a loop timer; nothing sweeps the pending list
+            self._call_soon(self._loop.call_later, timeout, self._expire_ack, future)
+        return future
+
+    def submit_many(self, requests, timeout=5.0):
+        requests = list(requests)
+        futures = super().submit_many(requests, timeout)
+        if self._loop is not None:
+            for (_, expect), future in zip(requests, futures):
+                if expect is not None:
+                    self._call_soon(self._loop.call_later, timeout, self._expire_ack, future)
+        return futures
+
+    def set_controller(self, controller):
+        super().set_controller(controller)
+        # The old port may have been closed under the reader without waking it
+        self._call_soon(self._stop_watching)
+
+    def call_later(self, delay, callback, *args):
+        """Runs callback(*args) on the loop thread after delay seconds; needs start()."""
+        loop = self._loop
+        if loop is not None:
+            self._call_soon(loop.call_later, delay, callback, *args)
+
+    def start(self):
+        if self._main is not None and not self._main.done():
+            return
+        if self._owns_loop:
+            self._io.start()
+        self._loop = self._io.loop
+        self._main = self._io.run_coroutine(self._reader())
+
+    def stop(self, timeout=2.0):
+        main = self._main
+        if main is not None:
+            main.cancel()  # Cancels the reader task on the loop thread
+            self._main = None
+        if self._owns_loop:
+            self._io.stop(timeout)
+        self._loop = None
+        self._fail_pending(ConnectionAbortedError("Serial backend stopped"))
+
+    # ---------------------------
+    # Loop thread
+    # ---------------------------
+    def _call_soon(self, callback, *args):
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except (AttributeError, RuntimeError):
+            pass  # Not started, or already stopped
+
+    async def _reader(self):
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        with self._lock:
+            for pending in self._pending:  # Submitted before start()
+                loop.call_later(max(0.0, pending.deadline - now), self._expire_ack, pending.future)
+        while True:
+            controller = self.controller
+            if not self._check_connection(controller):
+                await asyncio.sleep(self.idle_sleep)
+                continue
+            fd = controller.fileno() if hasattr(controller, "fileno") else None
+            if fd is None:
+                lines = await loop.run_in_executor(None, controller.read_data_from_arduino, True)
+                self._dispatch_lines(lines)
+                continue
+            await self._watch(loop, controller, fd)
+
+    async def _watch(self, loop, controller, fd):
+        """Dispatches lines whenever fd is readable, until the port goes away."""
+        done = loop.create_future()
+        empty_reads = 0
+
+        def on_readable():
+            nonlocal empty_reads
+            bytes_before = controller.reader.bytes_total
+            # The fd is readable, so this read returns at once
+            lines = controller.read_data_from_arduino(wait=True)
+            empty_reads = 0 if controller.reader.bytes_total != bytes_before else empty_reads + 1
+            self._dispatch_lines(lines)
+            if done.done():
+                return
+            if (empty_reads >= MAX_EMPTY_READS or not controller.is_connected()
+                    or self.controller is not controller):
+                done.set_result(None)
+
+        loop.add_reader(fd, on_readable)
+        self._watching = done
+        try:
+            await done
+        finally:
+            self._watching = None
+            loop.remove_reader(fd)
+        if empty_reads >= MAX_EMPTY_READS:
+            log.warning("Port reports data but none arrives; pausing reads.")
+            await asyncio.sleep(self.idle_sleep)
+
+    def _stop_watching(self):
+        done = self._watching
+        if done is not None and not done.done():
+            done.set_result(None)
+
+    def _dispatch_lines(self, lines):
+        if not lines:
+            return
+        received_at = time.monotonic()
+        for line in lines:
+            self.dispatch(line, received_at)
+
+    def _expire_ack(self, future):
+        with self._lock:
+            for pending in self._pending:
+                if pending.future is future:
+                    self._pending.remove(pending)
+                    break
+            else:
+                return  # Already acknowledged
+        self.acks_timed_out += 1
+        settle(future, error=TimeoutError(f"No acknowledgment received for {pending.command}"))
@@ -0,0 +1,345 @@
+"""
+Host-side PID autotuning from logged step responses.
+
+The tuner steps the set point under the firmware's bang-bang control and
+logs the telemetry. Telemetry also carries the SSR state, so the heater
+input is known sample by sample. A first-order-plus-dead-time (FOPDT)
+model is fitted to that input and the measured temperature. SIMC tuning
+rules turn the model into PID gains, which are pushed to the firmware's
+PID mode (PID:<kp>,<ki>,<kd> followed by CONTROL:PID). The same step is
+then repeated under PID, and the report compares settle time, overshoot
+and steady-state ripple before and after.
+
+Time is counted in telemetry samples times the firmware's update interval,
+not in host receive times. The fit therefore ignores USB jitter and works
+unchanged against a sped-up simulator.
+
+Gains are in heater fraction (0..1 of the SSR window) per °C. Kp is
+per °C, Ki per °C·s and Kd s per °C.
+"""
+import logging
+import math
+from threading import Condition
+
+import numpy as np
+
+from pultrusion.dispatcher import value_ack
+from pultrusion.protocol import PidGains, TelemetrySample, parse_line
+
+log = logging.getLogger(__name__)
+
+SAMPLE_PERIOD = 0.1      # s, the firmware's UPDATE_INTERVAL
+FIT_PERIOD = 1.0         # s, samples are averaged to this before fitting
+MAX_DEAD_TIME = 30.0     # s, longest dead time tried by the fit
+REACH_TIMEOUT = 5        # observe windows allowed for reaching a set point
+
+
+class FopdtModel:
+    """
+    y(t) = K * u(t - theta) filtered by a first-order lag tau, plus an
+    offset. K is in °C per unit heater fraction; tau and theta in seconds.
+    """
+
+    def __init__(self, gain, tau, dead_time, offset=0.0, rmse=float("nan")):
+        self.gain = gain
+        self.tau = tau
+        self.dead_time = dead_time
+        self.offset = offset
+        self.rmse = rmse
+
+    def __repr__(self):
+        return (f"FopdtModel(K={self.gain:.1f} °C, tau={self.tau:.1f} s, "
+                f"theta={self.dead_time:.1f} s, rmse={self.rmse:.2f} °C)")
+
+
+def gains_command(gains):
+    """The firmware command that stores gains (a protocol.PidGains)."""
+    return f"PID:{gains.kp:.5f},{gains.ki:.5f},{gains.kd:.5f}"
+
+
+def _block_average(values, size):
+    values = np.asarray(values, dtype=float)
+    usable = len(values) // size * size
+    return values[:usable].reshape(-1, size).mean(axis=1)
+
+
+def fit_fopdt(temperatures, heater, lead_in=0, sample_period=SAMPLE_PERIOD,
+              fit_period=FIT_PERIOD, max_dead_time=MAX_DEAD_TIME):
+    """
+    Fits an FOPDT model to a logged response.
+
+    temperatures and heater are per-sample arrays; heater is the SSR state
+    (0/1) or a heater fraction. The first lead_in samples are the settled
+    period before the step; their mean heater duty stands in for the input
+    before the log starts. Samples are averaged to fit_period, which also
+    turns the SSR state into a duty cycle.
+
+    The fit is output-error: for every (tau, dead time) pair on a grid the
+    model is simulated against the logged input, and the initial value,
+    gain and offset follow by linear least squares. Equation-error (ARX)
+    fits are biased towards the fast sensor lag when the data come from a
+    closed bang-bang loop, which this one is not.
+    """
+    size = max(1, int(round(fit_period / sample_period)))
+    y = _block_average(temperatures, size)
+    u = _block_average(heater, size)
+    period = size * sample_period
+    n = len(y)
+    if n < 10:
+        raise ValueError("Not enough samples to fit a model")
+    if np.ptp(u) == 0:
+        raise ValueError("The heater input did not change; nothing to fit")
+    u_before = u[:lead_in // size].mean() if lead_in >= size else u[0]
+
+    delays = np.arange(int(max_dead_time / period) + 1)
+    taus = np.geomspace(2 * period, 5000.0, 100)
+    a = np.exp(-period / taus)
+    index = np.arange(n)[None, :] - delays[:, None]
+    delayed = np.where(index >= 0, u[np.clip(index, 0, None)], u_before)
+
+    # Unit-gain response to the delayed input, for every (tau, delay) at once
+    forced = np.zeros((len(taus), len(delays), n))
+    for k in range(1, n):
+        forced[:, :, k] = a[:, None] * forced[:, :, k - 1] + (1 - a)[:, None] * delayed[None, :, k - 1]
+    free = a[:, None] ** np.arange(n)[None, :]
+
+    # y = y0 * a^k + K * forced + offset * (1 - a^k)
+    X = np.empty((len(taus), len(delays), n, 3))
+    X[..., 0] = free[:, None, :]
+    X[..., 1] = forced
+    X[..., 2] = 1.0 - free[:, None, :]
+    XtX = np.einsum("tdni,tdnj->tdij", X, X) + 1e-12 * np.eye(3)
+    Xty = np.einsum("tdni,n->tdi", X, y)
+    coeffs = np.linalg.solve(XtX, Xty[..., None])[..., 0]
+    sse = ((y - np.einsum("tdni,tdi->tdn", X, coeffs)) ** 2).sum(axis=-1)
+    sse[coeffs[..., 1] <= 0] = np.inf   # Heating must raise the temperature
+    t, d = np.unravel_index(np.argmin(sse), sse.shape)
+    if not np.isfinite(sse[t, d]):
+        raise ValueError("The response does not look like a heating process")
+
+    _, gain, offset = coeffs[t, d]
+    # Half a fit period of extra delay comes from averaging the samples
+    return FopdtModel(float(gain), float(taus[t]), float(delays[d] * period + period / 2),
+                      float(offset), float(np.sqrt(sse[t, d] / n)))
+
+
+def pid_gains(model, closed_loop_tau=None, derivative=False, sample_period=SAMPLE_PERIOD):
+    """
+    SIMC tuning for an FOPDT model. closed_loop_tau defaults to 1.5 times
+    the dead time: SIMC's usual tau_c = theta overshoots when the fitted
+    dead time is a fit period short, and the heater cannot pull the
+    temperature back down.
+
+    The result is PI by default: with thermistor noise at 10 Hz a
+    derivative term mostly adds SSR chatter. derivative=True adds
+    Td = theta / 2, which the firmware applies to the measurement rather
+    than the error.
+    """
+    theta = max(model.dead_time, 2 * sample_period)
+    tc = closed_loop_tau if closed_loop_tau is not None else 1.5 * theta
+    kc = model.tau / (model.gain * (tc + theta))
+    ti = min(model.tau, 4 * (tc + theta))
+    kd = kc * theta / 2 if derivative else 0.0
+    return PidGains(kc, kc / ti, kd)
+
+
+def response_metrics(temperatures, target, band=2.0, sample_period=SAMPLE_PERIOD):
+    """
+    Step response figures for samples logged from the moment the set point
+    changed. Times are in seconds; settle_time is None if the temperature
+    is outside +-band at the end of the window, rise_time is None if it
+    never got within the band.
+    """
+    y = np.asarray(temperatures, dtype=float)
+    if len(y) == 0:
+        raise ValueError("No samples")
+    outside = np.abs(y - target) > band
+    inside = np.flatnonzero(~outside)
+    rise_time = float(inside[0] * sample_period) if len(inside) else None
+    if outside[-1]:
+        settle_time = None
+    else:
+        last_outside = np.flatnonzero(outside)
+        settle_time = float((last_outside[-1] + 1) * sample_period) if len(last_outside) else 0.0
+    tail = y[len(y) * 2 // 3:]
+    return {
+        "rise_time": rise_time,
+        "settle_time": settle_time,
+        "overshoot": float(max(0.0, y.max() - target)),
+        "ripple": float(tail.max() - tail.min()),
+        "steady_state_error": float(tail.mean() - target),
+    }
+
+
+def _seconds(value):
+    return "never" if value is None else f"{value:.1f} s"
+
+
+def format_report(report):
+    """Readable summary of Autotuner.run()'s result."""
+    lines = [
+        f"Step {report['start']:.0f} -> {report['target']:.0f} °C, band ±{report['band']:.1f} °C",
+        f"Model: K={report['model'].gain:.1f} °C, tau={report['model'].tau:.1f} s, "
+        f"dead time={report['model'].dead_time:.1f} s (fit rmse {report['model'].rmse:.2f} °C)",
+        f"Gains: Kp={report['gains'].kp:.5f} Ki={report['gains'].ki:.5f} Kd={report['gains'].kd:.5f}",
+        "",
+        f"{'':20s}{'Bang-bang':>12s}{'PID':>12s}",
+    ]
+    before, after = report["before"], report.get("after")
+    rows = (("Rise time", "rise_time", _seconds), ("Settle time", "settle_time", _seconds),
+            ("Overshoot", "overshoot", lambda v: f"{v:.1f} °C"),
+            ("Ripple", "ripple", lambda v: f"{v:.1f} °C"),
+            ("Steady-state error", "steady_state_error", lambda v: f"{v:+.1f} °C"))
+    for label, key, fmt in rows:
+        lines.append(f"{label:20s}{fmt(before[key]):>12s}{fmt(after[key]) if after else '-':>12s}")
+    return "\n".join(lines)
+
+
+class Autotuner:
+    """
+    Runs the step tests on a live machine. Blocking; call run() from a
+    worker thread.
+
+    dispatcher is the SerialDispatcher (or AsyncSerialBackend) the machine
+    is on. set_temperature(value) changes the set point the way the caller
+    normally does, so the GUI stays in step with the machine. progress(text)
+    is called from the tuner's thread.
+    """
+
+    def __init__(self, dispatcher, set_temperature, target, step=20.0, band=2.0,
+                 settle=60.0, observe=120.0, sample_period=SAMPLE_PERIOD, progress=None):
+        self.dispatcher = dispatcher
+        self.set_temperature = set_temperature
+        self.target = float(target)
+        self.start = float(target) - step
+        self.band = band
+        self.settle = settle
+        self.observe = observe
+        self.sample_period = sample_period
+        self.progress = progress
+        self._samples = []         # (temperature, ssr_on)
+        self._condition = Condition()
+        self._cancelled = False
+        self._bad_reading = None   # The first NaN reading, which aborts the tune
+
+    def cancel(self):
+        with self._condition:
+            self._cancelled = True
+            self._condition.notify_all()
+
+    def run(self):
+        """
+        Tunes and returns the report (see format_report()). Raises
+        RuntimeError if the firmware lacks PID support, telemetry stops, the
+        thermistor reads NaN, a set point is not reached within
+        REACH_TIMEOUT * observe or the tuner is cancelled; the machine is
+        left in bang-bang mode then.
+        """
+        self.dispatcher.subscribe(self._on_line)
+        pid_enabled = False
+        try:
+            self._command("CONTROL:BANGBANG", "Control mode: BANGBANG")
+
+            self._report(f"Settling at {self.start:.0f} °C")
+            self._settle_at(self.start)
+            self._report(f"Step to {self.target:.0f} °C under bang-bang")
+            temperatures, heater, lead_in = self._record_step()
+            before = response_metrics(temperatures[lead_in:], self.target, self.band,
+                                      self.sample_period)
+
+            model = fit_fopdt(temperatures, heater, lead_in, self.sample_period)
+            gains = pid_gains(model, sample_period=self.sample_period)
+            self._report(f"Fitted {model}; {gains.to_line()}")
+            self._command(gains_command(gains), "PID gains set to")
+
+            self._report(f"Settling at {self.start:.0f} °C under PID")
+            self._command("CONTROL:PID", "Control mode: PID")
+            pid_enabled = True
+            self._settle_at(self.start)
+            self._report(f"Step to {self.target:.0f} °C under PID")
+            temperatures, _, lead_in = self._record_step()
+            after = response_metrics(temperatures[lead_in:], self.target, self.band,
+                                     self.sample_period)
+        except Exception:
+            if pid_enabled:
+                self._try_command("CONTROL:BANGBANG", "Control mode: BANGBANG")
+            raise
+        finally:
+            self.dispatcher.unsubscribe(self._on_line)
+        return {"start": self.start, "target": self.target, "band": self.band, "model": model,
+                "gains": gains, "before": before, "after": after}
+
+    # ---------------------------
+    # Steps
+    # ---------------------------
+    def _settle_at(self, temperature):
+        self.set_temperature(temperature)
+        # Wait until the set point is reached, then hold it for a while
+        count = self._wait_samples(1)
+        limit = count + int(REACH_TIMEOUT * self.observe / self.sample_period)
+        while abs(self._samples[count - 1][0] - temperature) > self.band:
+            if count >= limit:
+                raise RuntimeError(f"Did not reach {temperature:.0f} °C within "
+                                   f"{REACH_TIMEOUT * self.observe:.0f} s; last reading "
+                                   f"{self._samples[count - 1][0]:.1f} °C")
+            count = self._wait_samples(count + 1)
+        self._wait_samples(count + int(self.settle / self.sample_period))
+
+    def _record_step(self):
+        """Steps to the target; returns temperatures, heater and the lead-in length."""
+        with self._condition:
+            step = len(self._samples)
+        first = max(0, step - int(MAX_DEAD_TIME / self.sample_period))
+        self.set_temperature(self.target)
+        count = self._wait_samples(step + int(self.observe / self.sample_period))
+        with self._condition:
+            window = self._samples[first:count]
+        return [t for t, _ in window], [1.0 if ssr else 0.0 for _, ssr in window], step - first
+
+    # ---------------------------
+    # Helpers
+    # ---------------------------
+    def _command(self, command, expect):
+        try:
+            self.dispatcher.submit(command, expect=value_ack(expect), timeout=5.0).result()
+        except TimeoutError:
+            raise RuntimeError(f"The firmware did not acknowledge {command}; "
+                               "it may not support PID mode") from None
+
+    def _try_command(self, command, expect):
+        try:
+            self._command(command, expect)
+        except Exception as e:
+            log.warning("%s", e)
+
+    def _wait_samples(self, count, stall_timeout=5.0):
+        """Blocks until count samples are logged; returns the number logged."""
+        with self._condition:
+            while True:
+                if self._bad_reading is not None:
+                    raise RuntimeError(f"Thermistor read {self._bad_reading} during autotune")
+                if len(self._samples) >= count:
+                    break
+                logged = len(self._samples)
+                self._condition.wait(stall_timeout)
+                if self._cancelled:
+                    raise RuntimeError("Autotune cancelled")
+                if len(self._samples) == logged and self._bad_reading is None:
+                    raise RuntimeError("Telemetry stopped during autotune")
+            return len(self._samples)
+
+    def _report(self, text):
+        if self.progress is not None:
+            self.progress(text)
+
+    def _on_line(self, line, received_at):
+        event = parse_line(line)
+        if isinstance(event, TelemetrySample) and event.temperature is not None:
+            with self._condition:
+                if math.isnan(event.temperature):
+                    # "nan"/"ovf" from the firmware: a settle check or a fit over it is meaningless
+                    if self._bad_reading is None:
+                        self._bad_reading = event.temperature
+                else:
+                    self._samples.append((event.temperature, bool(event.ssr_on)))
+                self._condition.notify_all()
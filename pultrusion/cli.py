@@ -0,0 +1,153 @@
+"""
+Command line for one machine, without the GUI.
+
+    python -m pultrusion status [--port COM3] [--json]
+    python -m pultrusion set-temp 160 [--port COM3]
+    python -m pultrusion run-recipe recipes/pp_ramp.json [--port COM3]
+
+Without --port the machine is found like the GUI finds it (the last-used
+port first); --port daemon goes through the headless daemon. Every
+command opens its own Machine (pultrusion.machine), so scripts can do the
+same in a few lines.
+"""
+import argparse
+import json
+import sys
+import time
+
+from pultrusion.daemon import RemoteController, parse_address
+from pultrusion.discovery import discover, load_last_port, probe_port, save_last_port
+from pultrusion.log import setup_logging, shutdown_logging
+from pultrusion.machine import Machine
+
+
+def connect(port=None, baudrate=9600, name="machine", store_capacity=0):
+    """
+    Returns a started Machine connected to port, or to whichever port
+    answers like the firmware. Raises ConnectionError if none does.
+    """
+    machine = Machine(name, port, baudrate=baudrate, store_capacity=store_capacity)
+    machine.start()
+    try:
+        daemon_address = parse_address(port) if port else None
+        if daemon_address is not None:
+            controller = RemoteController()
+            controller.connect(daemon_address)
+            machine.attach(controller, port=port)
+            return machine
+        result = probe_port(port, baudrate) if port else discover(preferred=load_last_port(), baudrate=baudrate)
+        if result is None:
+            raise ConnectionError(f"No pultrusion machine answered on {port}." if port
+                                  else "No pultrusion machine found.")
+        save_last_port(result.port)
+        machine.attach(result.controller, result.lines, result.port)
+        return machine
+    except Exception:
+        machine.close()
+        raise
+
+
+def format_status(state):
+    def on_off(on, speed=None):
+        if on is None:
+            return "unknown"
+        return f"on, {speed} %" if on and speed is not None else ("on" if on else "off")
+
+    temperature = "unknown" if state.temperature is None else f"{state.temperature:.2f} °C"
+    lines = [
+        f"Port: {state.port}",
+        f"Temperature: {temperature} (set {state.set_temperature} °C)",
+        f"SSR: {on_off(state.ssr_on)}",
+        f"Fan: {on_off(state.fan_on, state.fan_speed)}",
+        f"Spool: {on_off(state.winder_on, state.spool_speed)}",
+    ]
+    if state.emergency_stop:
+        lines.append("Emergency stop")
+    if state.shutting_down:
+        lines.append("Shutting down")
+    return "\n".join(lines)
+
+
+def run_recipe(machine, recipe):
+    """Runs a Recipe to the end, printing progress; returns the exit status."""
+    future = machine.run_recipe(recipe, progress=lambda recipe, step, text: print(f"[{recipe.name} {step}] {text}"))
+    try:
+        future.result()
+        return 0
+    except KeyboardInterrupt:
+        machine.recipes.cancel()
+        return 130
+    except Exception as e:
+        print(f"Recipe failed: {e}")
+        return 1
+
+
+def cmd_status(machine, args):
+    deadline = time.monotonic() + args.wait
+    while machine.state.temperature is None and time.monotonic() < deadline:
+        time.sleep(0.05)
+    if machine.read_status(args.timeout) is None:
+        print("The firmware did not answer STATUS; showing telemetry only.", file=sys.stderr)
+    if args.json:
+        print(json.dumps(machine.state.as_dict()))
+    else:
+        print(format_status(machine.state))
+    return 0
+
+
+def cmd_set_temp(machine, args):
+    try:
+        print(machine.set_temperature(args.temperature, timeout=args.timeout).result())
+        return 0
+    except TimeoutError:
+        print(f"No acknowledgment within {args.timeout:g} s.")
+        return 1
+
+
+def cmd_run_recipe(machine, args):
+    from pultrusion.recipes import Recipe
+    try:
+        recipe = Recipe.load(args.recipe)
+    except (OSError, ValueError) as e:
+        print(f"Could not load {args.recipe}: {e}")
+        return 1
+    return run_recipe(machine, recipe)
+
+
+def main(argv=None):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--port", default=None,
+                        help="serial port (COM3, /dev/ttyACM0) or daemon[:HOST:PORT]; default: search")
+    common.add_argument("--baudrate", type=int, default=9600)
+    common.add_argument("--timeout", type=float, default=5.0, help="seconds to wait for an answer")
+    common.add_argument("--log-level", default="WARNING")
+
+    parser = argparse.ArgumentParser(prog="python -m pultrusion",
+                                     description="Control a pultrusion machine without the GUI.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    status = commands.add_parser("status", parents=[common], help="show temperature and settings")
+    status.add_argument("--json", action="store_true")
+    status.add_argument("--wait", type=float, default=2.0, help="seconds to wait for telemetry")
+    status.set_defaults(run=cmd_status)
+    set_temp = commands.add_parser("set-temp", parents=[common], help="set the temperature (°C)")
+    set_temp.add_argument("temperature", type=int)
+    set_temp.set_defaults(run=cmd_set_temp)
+    recipe = commands.add_parser("run-recipe", parents=[common], help="run a JSON recipe to the end")
+    recipe.add_argument("recipe", help="JSON recipe file")
+    recipe.set_defaults(run=cmd_run_recipe)
+    args = parser.parse_args(argv)
+    setup_logging(args.log_level)
+
+    try:
+        machine = connect(args.port, args.baudrate)
+    except (ConnectionError, OSError) as e:
+        print(e)
+        shutdown_logging()
+        return 1
+    try:
+        return args.run(machine, args)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        machine.close()
+        shutdown_logging()
@@ -0,0 +1,265 @@
+"""
+Latest-value-wins command coalescing.
+
+Every control (set temperature, fan, winder, shutdown timer) is a channel
+holding at most one unsent value. Setting a channel replaces that value;
+it is sent once the channel's minimum interval has passed and the previous
+command has been acknowledged, and is dropped if the firmware already has
+it. A dragged slider therefore sends a handful of commands instead of one
+per pixel, and no command waits behind a stale one.
+
+While the port is down a channel keeps its newest value instead of sending
+it; resume() sends what is left once the port is back (see
+pultrusion.supervisor).
+"""
+import logging
+import time
+from threading import Lock
+
+from pultrusion.dispatcher import value_ack
+from pultrusion.protocol import (EjectAdjusted, FanState, SetTemperatureAck, StatusReport,
+                                 SystemRestarted, TelemetrySample, WinderState)
+
+log = logging.getLogger(__name__)
+
+
+class CommandChannel:
+    """
+    How one control is sent and acknowledged.
+
+    command and expect are format strings taking the value. observe maps a
+    firmware event to the value the machine now has (or None), which is
+    what duplicates are checked against. With dedupe=False every value is
+    sent, e.g. a repeated shutdown time restarts the countdown.
+    """
+
+    def __init__(self, name, command, expect=None, min_interval=0.2, timeout=5.0,
+                 observe=None, dedupe=True):
+        self.name = name
+        self.command = command
+        self.expect = expect
+        self.min_interval = min_interval
+        self.timeout = timeout
+        self.observe = observe
+        self.dedupe = dedupe
+
+
+def _set_temperature_of(event):
+    if isinstance(event, (TelemetrySample, SetTemperatureAck, EjectAdjusted, StatusReport)):
+        return event.set_temperature
+    return None
+
+
+def _fan_pwm_of(event):
+    if isinstance(event, StatusReport):
+        return event.fan_pwm if event.fan_on else 0
+    return event.pwm if isinstance(event, FanState) else None
+
+
+def _winder_pwm_of(event):
+    if isinstance(event, StatusReport):
+        return event.winder_pwm if event.winder_on else 0
+    return event.pwm if isinstance(event, WinderState) else None
+
+
+# The firmware's value commands; each is acknowledged by the line it prints
+FIRMWARE_CHANNELS = (
+    CommandChannel("temperature", "SET_TEMP:{}", "Set Temperature updated to {}",
+                   min_interval=0.5, observe=_set_temperature_of),
+    CommandChannel("fan", "SET_FAN_PWM:{}", "Fan PWM set to {}", observe=_fan_pwm_of),
+    CommandChannel("winder", "SET_WINDER_PWM:{}", "Winder PWM set to {}", observe=_winder_pwm_of),
+    CommandChannel("timer", "SET_SHUTDOWN_TIME:{}", "Shutdown scheduled in {} seconds",
+                   min_interval=1.0, dedupe=False),
+)
+
+
+class _ChannelState:
+    __slots__ = ("spec", "pending", "has_pending", "known", "wanted", "in_flight", "scheduled",
+                 "last_sent_at", "requested", "sent", "duplicates", "superseded",
+                 "acked", "timeouts")
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.pending = None
+        self.has_pending = False
+        self.known = None         # Value the firmware last confirmed
+        self.wanted = None        # Value last passed to set()
+        self.in_flight = None     # Value sent and not yet acknowledged
+        self.scheduled = False
+        self.last_sent_at = None
+
+        # Counters
+        self.requested = 0
+        self.sent = 0
+        self.duplicates = 0       # Skipped: the firmware already had the value
+        self.superseded = 0       # Replaced by a newer value before sending
+        self.acked = 0
+        self.timeouts = 0
+
+
+class CommandCoalescer:
+    """
+    Coalesces commands sent through an AsyncSerialBackend, whose loop runs
+    the interval timers and ack callbacks. set() may be called from any
+    thread. Feed every parsed firmware event to observe() so duplicates are
+    judged against what the machine really has.
+
+    on_result(channel, value, error) is called on the serial loop thread
+    after each acknowledged (error None) or unacknowledged command.
+    """
+
+    def __init__(self, backend, channels=FIRMWARE_CHANNELS, on_result=None):
+        self.backend = backend
+        self.on_result = on_result
+        self._channels = {spec.name: _ChannelState(spec) for spec in channels}
+        self._lock = Lock()
+
+    def set(self, channel, value):
+        """Requests value on channel; the newest value wins."""
+        state = self._channels[channel]
+        with self._lock:
+            state.requested += 1
+            state.wanted = value
+            if state.has_pending:
+                state.superseded += 1
+                state.has_pending = False
+            if self._is_duplicate(state, value):
+                state.duplicates += 1
+                return
+            state.pending = value
+            state.has_pending = True
+            if state.scheduled or state.in_flight is not None:
+                return  # Sent when the timer fires or the ack arrives
+            self._schedule(state)
+
+    def observe(self, event):
+        """Updates the known machine state from a parsed firmware event."""
+        if isinstance(event, SystemRestarted):
+            # Settings come back from EEPROM: nothing is known for sure
+            with self._lock:
+                for state in self._channels.values():
+                    state.known = None
+            return
+        for state in self._channels.values():
+            observe = state.spec.observe
+            if observe is not None:
+                value = observe(event)
+                if value is not None:
+                    state.known = value
+
+    def forget(self, channel=None):
+        """Drops the known value(s), so the next set() is always sent."""
+        with self._lock:
+            for name, state in self._channels.items():
+                if channel is None or name == channel:
+                    state.known = None
+
+    def note_requested(self, channel, value):
+        """
+        Records a value sent around the coalescer (e.g. by a recipe) as the
+        requested one, so a resync does not put back an older set(). An
+        unsent older value is dropped.
+        """
+        state = self._channels[channel]
+        with self._lock:
+            if state.has_pending:
+                state.superseded += 1
+                state.pending, state.has_pending = None, False
+            state.wanted = value
+
+    def requested(self):
+        """{channel: value last passed to set()} for the value channels (dedupe=True)."""
+        with self._lock:
+            return {name: s.wanted for name, s in self._channels.items()
+                    if s.spec.dedupe and s.wanted is not None}
+
+    def adopt_known(self):
+        """
+        Takes the machine's values as the requested ones: unsent values on
+        the value channels are dropped. Returns {channel: value} adopted.
+        """
+        adopted = {}
+        with self._lock:
+            for name, state in self._channels.items():
+                if not state.spec.dedupe or state.known is None:
+                    continue
+                if state.has_pending:
+                    state.superseded += 1
+                    state.pending, state.has_pending = None, False
+                state.wanted = adopted[name] = state.known
+        return adopted
+
+    def resume(self):
+        """Sends the values kept back while the port was down."""
+        with self._lock:
+            for state in self._channels.values():
+                if state.has_pending and not state.scheduled and state.in_flight is None:
+                    self._schedule(state)
+
+    def stats(self):
+        with self._lock:
+            return {name: {"requested": s.requested, "sent": s.sent, "duplicates": s.duplicates,
+                           "superseded": s.superseded, "acked": s.acked, "timeouts": s.timeouts,
+                           "suppressed": s.requested - s.sent - int(s.has_pending)}
+                    for name, s in self._channels.items()}
+
+    # ---------------------------
+    # Internals (call with the lock held unless noted)
+    # ---------------------------
+    def _is_duplicate(self, state, value):
+        if not state.spec.dedupe:
+            return False
+        target = state.in_flight if state.in_flight is not None else state.known
+        return target is not None and value == target
+
+    def _schedule(self, state):
+        delay = 0.0
+        if state.last_sent_at is not None:
+            delay = max(0.0, state.last_sent_at + state.spec.min_interval - time.monotonic())
+        state.scheduled = True
+        self.backend.call_later(delay, self._flush, state)
+
+    def _flush(self, state):
+        # Serial loop thread
+        with self._lock:
+            state.scheduled = False
+            if not state.has_pending or state.in_flight is not None:
+                return
+            if not self.backend.controller.is_connected():
+                return  # Kept until resume(); a newer set() still replaces it
+            value, state.pending, state.has_pending = state.pending, None, False
+            if self._is_duplicate(state, value):
+                state.duplicates += 1
+                return
+            spec = state.spec
+            state.sent += 1
+            state.last_sent_at = time.monotonic()
+            if spec.expect is not None:
+                state.in_flight = value
+        command = spec.command.format(value)
+        if spec.expect is None:
+            self.backend.send(command)
+            return
+        ack = self.backend.submit(command, expect=value_ack(spec.expect.format(value)),
+                                  timeout=spec.timeout)
+        ack.add_done_callback(lambda future: self._on_ack(state, value, future))
+
+    def _on_ack(self, state, value, future):
+        # Serial loop thread (or the stopping thread, with ConnectionAbortedError)
+        error = future.exception()
+        with self._lock:
+            state.in_flight = None
+            if error is None:
+                state.acked += 1
+                state.known = value
+            else:
+                if isinstance(error, TimeoutError):
+                    state.timeouts += 1
+                state.known = None  # The machine may or may not have it
+            if state.has_pending and not state.scheduled:
+                self._schedule(state)
+        if self.on_result is not None:
+            try:
+                self.on_result(state.spec.name, value, error)
+            except Exception as e:
+                log.error("Error in command result callback: %s", e)
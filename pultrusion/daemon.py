@@ -0,0 +1,379 @@
+"""
+Headless telemetry daemon.
+
+Owns the Arduino connection and fans every line out, parsed, to any number
+of local clients over a TCP (127.0.0.1) or Unix socket. The protocol is one
+JSON object per line:
+
+    daemon -> client   {"type": "line", "t": 1718000000.1, "line": "...", "event": {...}}
+                       {"type": "reply", "id": 1, "ok": true, "ack": "..."}
+    client -> daemon   {"op": "auth", "token": "..."}
+                       {"op": "send", "command": "SET_TEMP:160", "id": 1,
+                        "expect": "Set Temperature updated to 160", "timeout": 5}
+                       {"op": "stats", "id": 2}
+
+Requests that are not an object, or carry a bad timeout or expect, get
+{"type": "reply", "ok": false, "error": "..."} instead of being acted on.
+Anyone local may subscribe; commands need the token from the token file
+(created on first start, readable only by its owner). Each client has a
+bounded queue: a slow client loses its oldest lines, never the daemon's time.
+
+    python -m pultrusion.daemon COM3
+    python PultrusionApp.py        (then enter "daemon" as the COM port)
+"""
+import argparse
+import asyncio
+import hmac
+import json
+import logging
+import os
+import secrets
+import socket
+import time
+
+from pultrusion.dispatcher import SerialDispatcher
+from pultrusion.log import setup_logging, shutdown_logging
+from pultrusion.protocol import parse_line
+from pultrusion.serial_io import ArduinoController, LineReader
+
+log = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_TOKEN_FILE = os.path.join(os.path.expanduser("~"), ".pultrusion", "daemon_token")
+MAX_ACK_TIMEOUT = 300.0   # s; a client's "timeout" must lie in (0, MAX_ACK_TIMEOUT]
+
+
+def load_token(path=DEFAULT_TOKEN_FILE, create=False):
+    """Reads the control token, creating a random one if asked to."""
+    if os.path.exists(path):
+        with open(path, "r") as file:
+            return file.read().strip()
+    if not create:
+        return None
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    token = secrets.token_hex(16)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as file:
+        file.write(token + "\n")
+    return token
+
+
+def _encode(message):
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+# -------------------------------------------------
+# Daemon
+# -------------------------------------------------
+class ClientSession:
+    """One connected client and its bounded outbound queue."""
+
+    def __init__(self, writer, queue_size):
+        self.writer = writer
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.authenticated = False
+        self.dropped = 0
+        self.sent = 0
+        peer = writer.get_extra_info("peername")
+        self.name = f"{peer[0]}:{peer[1]}" if isinstance(peer, tuple) else "unix"
+
+    def offer(self, data):
+        """Queues data, dropping the oldest queued line if the client lags."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(data)
+
+    def reply(self, message):
+        # Replies skip the queue so they are never dropped
+        self.writer.write(_encode(message))
+
+
+class TelemetryDaemon:
+    def __init__(self, controller, token, host=DEFAULT_HOST, port=DEFAULT_PORT,
+                 unix_path=None, queue_size=256):
+        self.controller = controller
+        self.token = token
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.queue_size = queue_size
+        self.dispatcher = SerialDispatcher(controller)
+        self.clients = set()
+        self.lines_published = 0
+        self._loop = None
+        self._servers = []
+        self._tasks = set()
+
+    async def serve(self):
+        self._loop = asyncio.get_running_loop()
+        self.dispatcher.subscribe(self._on_serial_line)
+        self.dispatcher.start()
+        if self.port is not None:
+            server = await asyncio.start_server(self._handle_client, self.host, self.port)
+            self._servers.append(server)
+            log.info("Daemon listening on %s:%s", self.host, self.port)
+        if self.unix_path:
+            if os.path.exists(self.unix_path):
+                os.unlink(self.unix_path)
+            server = await asyncio.start_unix_server(self._handle_client, self.unix_path)
+            self._servers.append(server)
+            log.info("Daemon listening on %s", self.unix_path)
+        try:
+            await asyncio.gather(*(server.serve_forever() for server in self._servers))
+        finally:
+            self.dispatcher.stop()
+
+    def stats(self):
+        return {
+            "lines_published": self.lines_published,
+            "clients": {c.name: {"sent": c.sent, "dropped": c.dropped, "queued": c.queue.qsize()}
+                        for c in self.clients},
+            "reader": self.controller.reader.stats(),
+            "acks_received": self.dispatcher.acks_received,
+            "acks_timed_out": self.dispatcher.acks_timed_out,
+        }
+
+    # ---------------------------
+    # Serial side (dispatcher thread -> event loop)
+    # ---------------------------
+    def _on_serial_line(self, line, received_at):
+        self._loop.call_soon_threadsafe(self._publish, line, time.time())
+
+    def _publish(self, line, t):
+        event = parse_line(line)
+        data = _encode({"type": "line", "t": t, "line": line,
+                        "event": event.as_dict() if event is not None else None})
+        self.lines_published += 1
+        for client in self.clients:
+            client.offer(data)
+
+    # ---------------------------
+    # Client side
+    # ---------------------------
+    async def _handle_client(self, reader, writer):
+        client = ClientSession(writer, self.queue_size)
+        self.clients.add(client)
+        pump = asyncio.create_task(self._pump(client))
+        try:
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    break
+                try:
+                    request = json.loads(raw)
+                except ValueError:
+                    client.reply({"type": "reply", "ok": False, "error": "invalid JSON"})
+                    continue
+                await self._handle_request(client, request)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            pump.cancel()
+            self.clients.discard(client)
+            writer.close()
+
+    async def _pump(self, client):
+        try:
+            while True:
+                data = await client.queue.get()
+                client.writer.write(data)
+                client.sent += 1
+                await client.writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+    async def _handle_request(self, client, request):
+        if not isinstance(request, dict):
+            client.reply({"type": "reply", "ok": False, "error": "invalid request"})
+            return
+        op = request.get("op")
+        request_id = request.get("id")
+        if op == "auth":
+            client.authenticated = bool(self.token) and hmac.compare_digest(
+                str(request.get("token", "")), self.token)
+            client.reply({"type": "reply", "id": request_id, "ok": client.authenticated})
+        elif op == "stats":
+            client.reply({"type": "reply", "id": request_id, "ok": True, "stats": self.stats()})
+        elif op == "send":
+            if not client.authenticated:
+                client.reply({"type": "reply", "id": request_id, "ok": False, "error": "not authenticated"})
+                return
+            command = str(request.get("command", "")).strip()
+            if not command or "\n" in command:
+                client.reply({"type": "reply", "id": request_id, "ok": False, "error": "invalid command"})
+                return
+            expect = request.get("expect")
+            try:
+                timeout = float(request.get("timeout", 5.0))
+                if not 0 < timeout <= MAX_ACK_TIMEOUT:
+                    raise ValueError(f"timeout must be between 0 and {MAX_ACK_TIMEOUT:g} s")
+                if expect is not None and not isinstance(expect, str):
+                    raise ValueError("expect must be a string")
+            except (TypeError, ValueError) as e:
+                client.reply({"type": "reply", "id": request_id, "ok": False, "error": str(e)})
+                return
+            ack = self.dispatcher.submit(command, expect=expect, timeout=timeout)
+            # Wait for the ack in its own task so the client can keep sending
+            task = asyncio.create_task(self._reply_when_acked(client, request_id, ack))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            client.reply({"type": "reply", "id": request_id, "ok": False, "error": f"unknown op {op!r}"})
+
+    async def _reply_when_acked(self, client, request_id, ack):
+        try:
+            line = await asyncio.wrap_future(ack)
+            client.reply({"type": "reply", "id": request_id, "ok": True, "ack": line})
+        except (TimeoutError, ConnectionAbortedError) as e:
+            client.reply({"type": "reply", "id": request_id, "ok": False, "error": str(e)})
+
+
+# -------------------------------------------------
+# Client
+# -------------------------------------------------
+def parse_address(address):
+    """
+    "daemon" -> default TCP address, "daemon:HOST:PORT" -> TCP,
+    "daemon:/path/to.sock" -> Unix socket. Returns None for serial ports.
+    """
+    if not address.lower().startswith("daemon"):
+        return None
+    rest = address[len("daemon"):].lstrip(":")
+    if not rest:
+        return (DEFAULT_HOST, DEFAULT_PORT)
+    if rest.startswith("/"):
+        return rest
+    host, _, port = rest.rpartition(":")
+    return (host or DEFAULT_HOST, int(port))
+
+
+class RemoteController:
+    """
+    ArduinoController look-alike that talks to the daemon instead of a
+    serial port, so SerialDispatcher and the GUI work unchanged.
+    """
+
+    def __init__(self):
+        self.sock = None
+        self.port_name = None
+        self.last_error = None
+        self.reader = LineReader()
+        self._pending = []
+        self.bad_frames = 0     # Frames are checked by the daemon; kept for the metrics
+        self.bytes_sent = 0
+        self.commands_sent = 0
+
+    def connect(self, address, token=None, token_file=DEFAULT_TOKEN_FILE):
+        if isinstance(address, str):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.connect(address)
+        sock.settimeout(0.1)
+        self.sock = sock
+        self.port_name = f"daemon {address}"
+        self.reader.reset()
+        token = token or load_token(token_file)
+        if token:
+            self._write({"op": "auth", "token": token})
+        else:
+            log.warning("No daemon token found: connected read-only.")
+        log.info("Connected to pultrusion daemon at %s", address)
+
+    def is_connected(self):
+        return self.sock is not None
+
+    def fileno(self):
+        return self.sock.fileno() if self.sock is not None else None
+
+    def send_data_to_arduino(self, command):
+        if self.sock:
+            try:
+                self._write({"op": "send", "command": command})
+                self.commands_sent += 1
+                log.debug("Sent to daemon: %s", command)
+            except OSError as e:
+                log.error("Error sending data: %s", e)
+                self.last_error = str(e)
+                self.close_connection()  # Lets a supervisor reconnect
+
+    def send_commands(self, commands):
+        # The daemon takes one command per request; it owns the port writes
+        for command in commands:
+            self.send_data_to_arduino(command)
+
+    def read_data_from_arduino(self, wait=False):
+        """Returns the firmware lines the daemon forwarded since the last call."""
+        if self.sock is None:
+            return []
+        self.sock.settimeout(0.1 if wait else 0.0)
+        try:
+            data = self.sock.recv(65536)
+        except (socket.timeout, BlockingIOError):
+            return []
+        except OSError as e:
+            log.error("Error reading data: %s", e)
+            self.last_error = str(e)
+            self.close_connection()
+            return []
+        if not data:
+            log.warning("Daemon closed the connection.")
+            self.last_error = "Daemon closed the connection"
+            self.close_connection()
+            return []
+        lines = []
+        for raw in self.reader.feed(data):
+            try:
+                message = json.loads(raw)
+            except ValueError:
+                continue
+            if message.get("type") == "line":
+                lines.append(message["line"])
+            elif message.get("type") == "reply" and not message.get("ok"):
+                log.error("Daemon refused request: %s", message.get("error", "authentication failed"))
+        return lines
+
+    def close_connection(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+            log.info("Closed daemon connection.")
+
+    def _write(self, message):
+        data = _encode(message)
+        self.sock.sendall(data)
+        self.bytes_sent += len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless pultrusion telemetry daemon.")
+    parser.add_argument("port", help="serial port of the Arduino (e.g. COM3 or /dev/ttyACM0)")
+    parser.add_argument("--baud", type=int, default=9600)
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--listen-port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", default=None, help="also listen on this Unix socket path")
+    parser.add_argument("--queue", type=int, default=256, help="lines buffered per client")
+    parser.add_argument("--token-file", default=DEFAULT_TOKEN_FILE)
+    parser.add_argument("--log-level", default="INFO")
+    parser.add_argument("--log-file", default=None, help="also log JSON lines here (rotated at 10 MB)")
+    args = parser.parse_args()
+    setup_logging(args.log_level, json_path=args.log_file)
+
+    token = load_token(args.token_file, create=True)
+    print(f"Control token in {args.token_file}")
+    controller = ArduinoController()
+    controller.connect(args.port, args.baud)
+    daemon = TelemetryDaemon(controller, token, args.host, args.listen_port, args.unix, args.queue)
+    try:
+        asyncio.run(daemon.serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        controller.close_connection()
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
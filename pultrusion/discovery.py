@@ -0,0 +1,155 @@
+"""
+Finding the pultrusion Arduino without asking for a COM port.
+
+Every candidate port is probed on its own thread. A probe opens the port
+and listens. If the port stays silent for PING_AFTER seconds, it sends
+PING. The firmware gives itself away with any line it alone prints: the
+"=== System (Re)Started! ===" banner, telemetry, a PONG, or the
+"Received command:" echo from firmware that predates PING. The first port
+that answers wins, at once, with no fixed settle delay. Its open
+controller is handed over, so the board is not reset a second time.
+
+Opening a port resets Uno-style boards, so only USB serial ports are
+probed, plus the port that was used last time.
+"""
+import logging
+import os
+import time
+from queue import Empty, Queue
+from threading import Event, Lock, Thread
+
+import serial
+
+from pultrusion.protocol import Notice, parse_line
+from pultrusion.serial_io import ArduinoController
+
+log = logging.getLogger(__name__)
+
+LAST_PORT_FILE = os.path.join(os.path.expanduser("~"), ".pultrusion", "last_port")
+PROBE_TIMEOUT = 3.0   # s; a board that resets on open prints its banner after ~2 s
+PING_AFTER = 0.3      # s of silence before a probe sends PING
+
+
+class ProbeResult:
+    """
+    A port that answered like the firmware. controller is connected;
+    lines holds the (line, received_at) pairs read while probing, so the
+    caller can dispatch them instead of losing the banner.
+    """
+
+    def __init__(self, port, controller, lines, elapsed):
+        self.port = port
+        self.controller = controller
+        self.lines = lines
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return f"ProbeResult({self.port!r}, {self.elapsed * 1000:.0f} ms)"
+
+
+def load_last_port(path=LAST_PORT_FILE):
+    try:
+        with open(path, "r") as file:
+            return file.read().strip() or None
+    except OSError:
+        return None
+
+
+def save_last_port(port, path=LAST_PORT_FILE):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as file:
+            file.write(port + "\n")
+    except OSError as e:
+        log.warning("Could not remember port %s: %s", port, e)
+
+
+def candidate_ports(preferred=None):
+    """USB serial ports, with preferred (the last-used port) first."""
+    try:
+        from serial.tools import list_ports
+        ports = [info.device for info in sorted(list_ports.comports(), key=lambda info: info.device)
+                 if info.vid is not None]
+    except Exception as e:
+        log.warning("Could not list serial ports: %s", e)
+        ports = []
+    if preferred:
+        ports = [preferred] + [port for port in ports if port != preferred]
+    return ports
+
+
+def is_firmware_line(line):
+    return not isinstance(parse_line(line), Notice)
+
+
+def probe_port(port, baudrate=9600, timeout=PROBE_TIMEOUT, stop=None):
+    """Returns a ProbeResult if the firmware answers on port within timeout, else None."""
+    started = time.monotonic()
+    controller = ArduinoController()
+    try:
+        controller.connect(port, baudrate, settle_time=0)
+    except (serial.SerialException, OSError, ValueError):
+        return None
+    lines = []
+    pinged = False
+    try:
+        while time.monotonic() - started < timeout and not (stop is not None and stop.is_set()):
+            for line in controller.read_data_from_arduino(wait=True):
+                lines.append((line, time.monotonic()))
+                if is_firmware_line(line):
+                    result = ProbeResult(port, controller, lines, time.monotonic() - started)
+                    controller = None
+                    return result
+            if not pinged and time.monotonic() - started >= PING_AFTER:
+                controller.send_data_to_arduino("PING")
+                pinged = True
+    except (serial.SerialException, OSError) as e:
+        log.debug("Probe of %s failed: %s", port, e)
+    finally:
+        if controller is not None:
+            controller.close_connection()
+    return None
+
+
+def discover(ports=None, preferred=None, baudrate=9600, timeout=PROBE_TIMEOUT):
+    """
+    Probes ports (default: candidate_ports(preferred)) in parallel and
+    returns the first ProbeResult, or None if no port answered. The other
+    probes stop and close their ports.
+    """
+    ports = candidate_ports(preferred) if ports is None else list(ports)
+    if not ports:
+        return None
+    results = Queue()
+    stop = Event()
+    claim = Lock()
+
+    def worker(port):
+        result = probe_port(port, baudrate, timeout, stop)
+        with claim:
+            if result is not None and stop.is_set():
+                result.controller.close_connection()  # Another port already won
+                result = None
+            elif result is not None:
+                stop.set()
+        results.put(result)
+
+    # Plain daemon threads: a port whose open() hangs must not hold up exit
+    for port in ports:
+        Thread(target=worker, args=(port,), name=f"probe-{port}", daemon=True).start()
+    deadline = time.monotonic() + timeout + 1.0
+    for _ in ports:
+        try:
+            result = results.get(timeout=max(0.0, deadline - time.monotonic()))
+        except Empty:
+            break
+        if result is not None:
+            return result
+    with claim:
+        stop.set()
+    # A probe may have won just before the deadline
+    while not results.empty():
+        result = results.get()
+        if result is not None:
+            return result
+    return None
@@ -0,0 +1,345 @@
+"""
+Single-owner serial dispatcher.
+
+One I/O thread owns the Arduino port. Every received line is handed to the
+subscribers, and commands that expect an acknowledgment get a Future that
+resolves as soon as the matching line arrives.
+"""
+import logging
+import re
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+from threading import Event, Lock, Thread
+
+from pultrusion.metrics import Histogram
+
+log = logging.getLogger(__name__)
+
+ECHO_PREFIX = "Received command: "
+
+
+def make_matcher(expect):
+    """
+    Turns an expected response into a predicate on a line.
+    Strings match as substrings, compiled regexes with search(),
+    anything else must already be a callable.
+    """
+    if isinstance(expect, str):
+        return lambda line: expect in line
+    if hasattr(expect, "search"):
+        return lambda line: expect.search(line) is not None
+    return expect
+
+
+def value_ack(text):
+    """
+    Matches text when it is not followed by another digit, so the ack for
+    "Fan PWM set to 1" does not also match "Fan PWM set to 12".
+    """
+    return re.compile(re.escape(text) + r"(?!\d)")
+
+
+def controller_counters(controller):
+    """The traffic counters of one controller (see SerialDispatcher.link_counters)."""
+    if controller is None:
+        return {}
+    reader = controller.reader
+    return {
+        "bytes_received": reader.bytes_total,
+        "lines_received": reader.lines_total,
+        "partial_lines_dropped": reader.dropped_partial_lines,
+        "bytes_sent": controller.bytes_sent,
+        "commands_sent": controller.commands_sent,
+        "bad_frames": controller.bad_frames,
+    }
+
+
+def settle(future, result=None, error=None):
+    """
+    Completes an ack future unless its caller already cancelled it (the
+    daemon cancels them with the client's task). Raising here would kill
+    the thread that reads the port.
+    """
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+class PendingAck:
+    __slots__ = ("command", "matcher", "future", "deadline", "sent_at")
+
+    def __init__(self, command, matcher, future, deadline, sent_at):
+        self.command = command
+        self.matcher = matcher
+        self.future = future
+        self.deadline = deadline
+        self.sent_at = sent_at
+
+
+class SerialDispatcher:
+    """
+    Owns the reading side of an ArduinoController.
+
+    Subscribers are called on the I/O thread as callback(line, received_at),
+    where received_at is the time.monotonic() of the read that produced the
+    line. They must not block.
+
+    With offline_queue set (see pultrusion.supervisor.CommandQueue),
+    commands sent while the port is closed are appended to it instead of
+    being lost; whoever reopens the port sends them.
+    """
+
+    def __init__(self, controller, idle_sleep=0.1):
+        self.controller = controller
+        self.idle_sleep = idle_sleep  # Only used while the port is closed
+        self.offline_queue = None
+        self._subscribers = []
+        self._send_listeners = []
+        self._connection_listeners = []
+        self._link_up = False               # As last seen by the reader
+        self._pending = []
+        self._lock = Lock()
+        self._write_lock = Lock()
+        self._stop = Event()
+        self._thread = None
+
+        # Counters
+        self.acks_received = 0
+        self.acks_timed_out = 0
+        self.last_ack_latency = None
+        self.ack_latency = Histogram()
+        self.echo_latency = Histogram()     # Sent -> the firmware's "Received command:" echo
+        self._retired_counters = {}         # Summed over the controllers replaced so far
+        self._echo_pending = deque(maxlen=64)  # (command, sent_at), oldest first
+
+    # ---------------------------
+    # Subscribers
+    # ---------------------------
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers = self._subscribers + [callback]
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers = [cb for cb in self._subscribers if cb is not callback]
+
+    def set_controller(self, controller):
+        """Switches to another (reconnected) controller; the reader follows it."""
+        with self._lock:
+            old = self.controller
+            if old is not None and old is not controller:
+                for name, value in controller_counters(old).items():
+                    self._retired_counters[name] = self._retired_counters.get(name, 0) + value
+            self.controller = controller
+
+    def link_counters(self):
+        """
+        Traffic counters (controller_counters) summed over every controller
+        this dispatcher has used, so they only grow across reconnects.
+        """
+        with self._lock:
+            totals = dict(self._retired_counters)
+            for name, value in controller_counters(self.controller).items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def add_connection_listener(self, callback):
+        """
+        callback(connected, controller) is called on the reader thread when
+        the port comes up or goes away (a read failed, the supervisor closed
+        a silent port, a reconnected controller was switched in).
+        """
+        self._connection_listeners = self._connection_listeners + [callback]
+        return callback
+
+    def _check_connection(self, controller):
+        """Reader thread: returns controller.is_connected(), telling listeners of a change."""
+        connected = controller.is_connected()
+        if connected != self._link_up:
+            self._link_up = connected
+            for callback in self._connection_listeners:
+                try:
+                    callback(connected, controller)
+                except Exception as e:
+                    log.error("Error in connection listener: %s", e)
+        return connected
+
+    def add_send_listener(self, callback):
+        """callback(command) is called after every command written."""
+        self._send_listeners = self._send_listeners + [callback]
+        return callback
+
+    # ---------------------------
+    # Sending
+    # ---------------------------
+    def send(self, command):
+        """Sends a command without waiting for a response."""
+        if self._queue_offline((command,)):
+            return
+        # Noted before writing so a fast echo cannot slip past us
+        self._echo_pending.append((command.strip(), time.monotonic()))
+        with self._write_lock:
+            self.controller.send_data_to_arduino(command)
+        for callback in self._send_listeners:
+            try:
+                callback(command)
+            except Exception as e:
+                log.error("Error in send listener: %s", e)
+
+    def send_many(self, commands):
+        """Sends several commands in one serial write (see ArduinoController.send_commands)."""
+        commands = list(commands)
+        if self._queue_offline(commands):
+            return
+        now = time.monotonic()
+        self._echo_pending.extend((command.strip(), now) for command in commands)
+        with self._write_lock:
+            self.controller.send_commands(commands)
+        for command in commands:
+            for callback in self._send_listeners:
+                try:
+                    callback(command)
+                except Exception as e:
+                    log.error("Error in send listener: %s", e)
+
+    def submit_many(self, requests, timeout=5.0):
+        """
+        Sends (command, expect) pairs in one write and returns a Future per
+        command, like submit(). Commands with expect None resolve once written.
+        """
+        requests = list(requests)
+        now = time.monotonic()
+        futures = []
+        pending = []
+        for command, expect in requests:
+            future = Future()
+            futures.append(future)
+            if expect is not None:
+                pending.append(PendingAck(command, make_matcher(expect), future, now + timeout, now))
+        with self._lock:
+            self._pending.extend(pending)
+        self.send_many(command for command, _ in requests)
+        for (_, expect), future in zip(requests, futures):
+            if expect is None:
+                future.set_result(None)
+        return futures
+
+    def submit(self, command, expect=None, timeout=5.0):
+        """
+        Sends a command and returns a Future for its acknowledgment.
+
+        The Future resolves with the first line matching `expect`, or fails
+        with TimeoutError after `timeout` seconds. Without `expect` it
+        resolves as soon as the command has been written.
+        """
+        future = Future()
+        if expect is None:
+            self.send(command)
+            future.set_result(None)
+            return future
+
+        now = time.monotonic()
+        pending = PendingAck(command, make_matcher(expect), future, now + timeout, now)
+        # Register before writing so a fast reply cannot slip past us.
+        with self._lock:
+            self._pending.append(pending)
+        self.send(command)
+        return future
+
+    # ---------------------------
+    # I/O thread
+    # ---------------------------
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name="serial-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self._fail_pending(ConnectionAbortedError("Serial dispatcher stopped"))
+
+    def dispatch(self, line, received_at):
+        """Resolves any waiting acknowledgment and notifies subscribers."""
+        if self._pending:
+            self._resolve(line, received_at)
+        if self._echo_pending and line.startswith(ECHO_PREFIX):
+            self._match_echo(line[len(ECHO_PREFIX):].strip(), received_at)
+        for callback in self._subscribers:
+            try:
+                callback(line, received_at)
+            except Exception as e:
+                log.error("Error in serial subscriber: %s", e)
+
+    def _queue_offline(self, commands):
+        queue = self.offline_queue
+        if queue is None or self.controller.is_connected():
+            return False
+        for command in commands:
+            queue.append(command)
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            controller = self.controller
+            if not self._check_connection(controller):
+                self._stop.wait(self.idle_sleep)
+                continue
+            # Blocks until data arrives (or the port timeout expires).
+            lines = controller.read_data_from_arduino(wait=True)
+            received_at = time.monotonic()
+            for line in lines:
+                self.dispatch(line, received_at)
+            if self._pending:
+                self._expire(received_at)
+
+    def _resolve(self, line, received_at):
+        with self._lock:
+            for pending in self._pending:
+                if pending.matcher(line):
+                    self._pending.remove(pending)
+                    break
+            else:
+                return
+        self.acks_received += 1
+        self.last_ack_latency = received_at - pending.sent_at
+        self.ack_latency.observe(self.last_ack_latency)
+        settle(pending.future, result=line)
+
+    def _match_echo(self, command, received_at):
+        # The firmware echoes commands in order; anything older was lost or never echoed
+        pending = self._echo_pending
+        for i, (sent, sent_at) in enumerate(list(pending)):  # Copy: senders append concurrently
+            if sent == command:
+                break
+        else:
+            return  # Sent by another client of the daemon, say
+        for _ in range(i + 1):
+            pending.popleft()
+        self.echo_latency.observe(received_at - sent_at)
+
+    def _expire(self, now):
+        with self._lock:
+            expired = [p for p in self._pending if p.deadline <= now]
+            if not expired:
+                return
+            self._pending = [p for p in self._pending if p.deadline > now]
+        for pending in expired:
+            self.acks_timed_out += 1
+            settle(pending.future, error=TimeoutError(f"No acknowledgment received for {pending.command}"))
+
+    def _fail_pending(self, error):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for p in pending:
+            settle(p.future, error=error)
@@ -0,0 +1,86 @@
+"""
+Several pultrusion machines in one process.
+
+Every Machine shares one SerialLoop, so a fleet of dozens of ports still
+runs a single I/O thread; an idle port costs nothing until it prints.
+"""
+import logging
+import time
+
+from pultrusion.async_backend import SerialLoop
+from pultrusion.machine import MACHINE_STORE_CAPACITY, Machine
+
+log = logging.getLogger(__name__)
+
+
+def parse_machine_spec(spec, index=0):
+    """'press-1=COM3' -> ('press-1', 'COM3'); a bare port is named machine-N."""
+    name, sep, port = spec.partition("=")
+    if not sep:
+        return f"machine-{index + 1}", spec
+    return name.strip(), port.strip()
+
+
+class FleetController:
+    """Owns the machines and the I/O loop they share."""
+
+    def __init__(self, store_capacity=MACHINE_STORE_CAPACITY):
+        self.io_loop = SerialLoop(name="fleet-io")
+        self.store_capacity = store_capacity
+        self.machines = {}
+
+    def __iter__(self):
+        return iter(self.machines.values())
+
+    def __len__(self):
+        return len(self.machines)
+
+    def __getitem__(self, name):
+        return self.machines[name]
+
+    def add(self, name, port, baudrate=9600):
+        if name in self.machines:
+            raise ValueError(f"Duplicate machine name: {name}")
+        machine = Machine(name, port, io_loop=self.io_loop, baudrate=baudrate,
+                          store_capacity=self.store_capacity or 0)
+        self.machines[name] = machine
+        return machine
+
+    def connect_all(self, settle_time=2.0):
+        """
+        Opens every port, waits once for all the Arduinos to initialize and
+        starts reading. Machines that fail to open keep their error in
+        state.error; returns the list of machines that connected.
+        """
+        self.io_loop.start()
+        connected = []
+        for machine in self:
+            try:
+                machine.open(settle_time=0)
+                connected.append(machine)
+            except Exception as e:
+                log.warning("%s: could not open %s: %s", machine.name, machine.port, e)
+        if connected and settle_time:
+            time.sleep(settle_time)
+        for machine in connected:
+            machine.start()
+        return connected
+
+    def close_all(self):
+        for machine in self:
+            machine.close()
+        self.io_loop.stop()
+
+    def add_listener(self, callback):
+        """callback(machine, event, received_at) for every machine's events."""
+        for machine in self:
+            machine.add_listener(callback)
+        return callback
+
+    def broadcast(self, method, *args):
+        """Calls e.g. broadcast("set_fan_speed", 40) on every connected machine."""
+        return {machine.name: getattr(machine, method)(*args)
+                for machine in self if machine.state.connected}
+
+    def snapshot(self):
+        return [machine.state.as_dict() for machine in self]
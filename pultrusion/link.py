@@ -0,0 +1,81 @@
+"""
+Serial link negotiation: compact telemetry and a faster baud rate.
+
+Both are opt-in and fall back safely. Firmware that does not know the
+commands never acknowledges them, so the host stays in text mode at the
+current rate. After BAUD:<rate> the firmware waits about 3 s for any command
+at the new rate and reverts if none arrives. The host's PING is that
+command. If no PONG comes back, the host reverts too.
+
+USB boards such as the Pro Micro ignore the baud rate entirely; a higher
+rate only helps boards that talk through a USB-UART bridge.
+"""
+import logging
+import time
+
+from pultrusion.dispatcher import value_ack
+
+log = logging.getLogger(__name__)
+
+BAUD_CONFIRM_WINDOW = 3.0   # Seconds the firmware waits before reverting a baud change
+
+
+def ping(dispatcher, timeout=1.0):
+    """Round trip time of PING/PONG in seconds, or None without a reply."""
+    sent_at = time.monotonic()
+    try:
+        dispatcher.submit("PING", expect="PONG", timeout=timeout).result()
+    except (TimeoutError, ConnectionAbortedError):
+        return None
+    return time.monotonic() - sent_at
+
+
+def set_compact_telemetry(dispatcher, compact=True, timeout=2.0):
+    """Switches the telemetry format; returns False if the firmware did not confirm."""
+    mode = "COMPACT" if compact else "TEXT"
+    try:
+        dispatcher.submit(f"TELEMETRY:{mode}", expect=f"Telemetry mode: {mode}", timeout=timeout).result()
+    except (TimeoutError, ConnectionAbortedError):
+        return False
+    return True
+
+
+def change_baudrate(dispatcher, baudrate, timeout=2.0, attempts=2):
+    """
+    Moves both ends of the link to baudrate. Returns True on success; on
+    failure both ends are back at the old rate.
+    """
+    controller = dispatcher.controller
+    old = controller.baudrate
+    if old == baudrate:
+        return True
+    try:
+        dispatcher.submit(f"BAUD:{baudrate}", expect=value_ack(f"Baud rate changing to {baudrate}"),
+                          timeout=timeout).result()
+    except (TimeoutError, ConnectionAbortedError):
+        return False  # Firmware without BAUD support: nothing changed
+    time.sleep(0.05)  # Let the Arduino finish Serial.end()/begin()
+    controller.set_baudrate(baudrate)
+    for _ in range(attempts):
+        if ping(dispatcher, timeout=BAUD_CONFIRM_WINDOW / (attempts + 1)) is not None:
+            return True
+    log.warning("No reply at %s baud; going back to %s.", baudrate, old)
+    controller.set_baudrate(old)
+    time.sleep(BAUD_CONFIRM_WINDOW)  # The firmware reverts on its own
+    ping(dispatcher)
+    return False
+
+
+def negotiate(dispatcher, compact=True, baudrate=None):
+    """
+    Applies the requested link settings and reports what the firmware
+    accepted, e.g. {"compact": True, "baudrate": 9600}. Blocks while the
+    acknowledgments arrive (each command beeps for ~0.6 s), so call it
+    from a worker thread, not the Tk thread.
+    """
+    result = {"compact": False, "baudrate": dispatcher.controller.baudrate}
+    if baudrate and change_baudrate(dispatcher, baudrate):
+        result["baudrate"] = baudrate
+    if compact:
+        result["compact"] = set_compact_telemetry(dispatcher, True)
+    return result
@@ -0,0 +1,342 @@
+"""
+A live chart of temperature, set point and SSR state on a Tk canvas.
+
+Redrawing a whole chart for every telemetry line does not keep up at
+100 Hz on a slow PC. LiveChart instead draws on its own timer, at most
+`fps` times per second, and per frame only copies the samples that
+arrived since the last one (TelemetryStore.since). Each pixel column is
+a bucket of window / width seconds. A finished bucket adds its lowest
+and highest value (min/max decimation, so spikes stay visible) to the
+open line item of each series, so a line never holds more than two
+points per pixel column. The view scrolls by moving all lines left with
+one canvas call, and lines that have left the view are deleted. A line
+item is closed after SEGMENT_POINTS points, so appending stays cheap.
+The bucket still filling is drawn as a short tail that is replaced
+every frame.
+
+The temperature axis only grows; when it does, the existing lines are
+rescaled in place. Only a resize or a new window redraws everything.
+render holds the time taken per frame, including Tk's redraw.
+"""
+import math
+import time
+import tkinter as tk
+from collections import deque
+from tkinter import ttk
+
+import numpy as np
+
+from pultrusion.metrics import Histogram
+
+WINDOWS = (("1 min", 60), ("5 min", 300), ("15 min", 900), ("1 h", 3600))
+SEGMENT_POINTS = 64   # Points in a line item before a new one is started
+GAP_SECONDS = 2.0     # Longer pauses in the telemetry break the lines
+AXIS_WIDTH = 44       # Temperature labels on the left
+SSR_HEIGHT = 12       # Strip at the bottom for the SSR state
+MARGIN = 6
+RENDER_BUCKETS = (0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1)
+
+
+def bucket_minmax(buckets, values):
+    """
+    Per run of equal bucket numbers: (bucket, first, second), where first and
+    second are the bucket's min and max in the order that ends nearer its
+    last value. NaN is ignored; a bucket of only NaN gives NaN.
+    """
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+    low = np.fmin.reduceat(values, starts)
+    high = np.fmax.reduceat(values, starts)
+    last = values[ends]
+    rising = np.abs(high - last) <= np.abs(last - low)
+    return buckets[starts], np.where(rising, low, high), np.where(rising, high, low)
+
+
+class _Series:
+    """The line items of one column: closed ones, the open one and the tail."""
+
+    def __init__(self, canvas, column, color, width, tags):
+        self.canvas = canvas
+        self.column = column
+        self.color = color
+        self.width = width
+        self.tags = tags
+        self.closed = deque()      # (item, last bucket)
+        self.item = None           # Open item, once it has two points
+        self.points = []           # (bucket, value) of the open item
+        self.tail = canvas.create_line(0, 0, 0, 0, fill=color, width=width, tags=tags,
+                                       state=tk.HIDDEN)
+
+    def append(self, bucket, value, to_xy, gap):
+        """Adds a point; starts a new item after a gap, NaN or SEGMENT_POINTS points."""
+        points = self.points
+        if math.isnan(value):
+            self._close()
+            return
+        if points and bucket - points[-1][0] > gap:
+            self._close()
+        elif len(points) >= SEGMENT_POINTS:
+            self._close(keep_last=True)
+        points.append((bucket, value))
+        if len(points) >= 2:
+            coords = [c for b, v in points for c in to_xy(b, v)]
+            if self.item is None:
+                self.item = self.canvas.create_line(*coords, fill=self.color, width=self.width,
+                                                    tags=self.tags)
+            else:
+                self.canvas.coords(self.item, *coords)
+
+    def set_tail(self, values, bucket, to_xy, gap):
+        """Draws the bucket still filling, joined to the last drawn point."""
+        values = [v for v in values if not math.isnan(v)]
+        if self.points and bucket - self.points[-1][0] <= gap:
+            values.insert(0, self.points[-1][1])
+            start = self.points[-1][0]
+        else:
+            start = bucket
+        if len(values) < 2:
+            self.canvas.itemconfigure(self.tail, state=tk.HIDDEN)
+            return
+        coords = []
+        for i, value in enumerate(values):
+            coords.extend(to_xy(start if i == 0 else bucket, value))
+        self.canvas.coords(self.tail, *coords)
+        self.canvas.itemconfigure(self.tail, state=tk.NORMAL)
+
+    def drop_before(self, bucket):
+        """Deletes closed items that ended left of bucket."""
+        while self.closed and self.closed[0][1] < bucket:
+            self.canvas.delete(self.closed.popleft()[0])
+
+    def clear(self):
+        for item, _ in self.closed:
+            self.canvas.delete(item)
+        self.closed.clear()
+        if self.item is not None:
+            self.canvas.delete(self.item)
+        self.item = None
+        self.points = []
+        self.canvas.itemconfigure(self.tail, state=tk.HIDDEN)
+
+    def _close(self, keep_last=False):
+        last = self.points[-1] if self.points else None
+        if self.item is not None:
+            self.closed.append((self.item, last[0]))
+        self.item = None
+        self.points = [last] if keep_last and last else []
+
+    @property
+    def items(self):
+        return len(self.closed) + (self.item is not None)
+
+
+class LiveChart(tk.Frame):
+    """
+    Chart of the last `seconds` of a TelemetryStore. Call start() once the
+    window is shown; the chart then polls the store fps times per second.
+    """
+
+    def __init__(self, master, store, seconds=300, fps=10, height=200, bg="white", fg="#333333",
+                 grid="#e0e0e0", temperature_color="#d83b01", set_color="#0078D7",
+                 ssr_color="#107c10", font=("Segoe UI", 9), **kwargs):
+        super().__init__(master, bg=bg, **kwargs)
+        self.store = store
+        self.seconds = seconds
+        self.interval_ms = max(1, int(1000 / fps))
+        self.bg = bg
+        self.fg = fg
+        self.grid = grid
+        self.font = font
+        self._job = None
+
+        # Time per frame, including Tk's redraw
+        self.render = Histogram(RENDER_BUCKETS)
+        self.last_render = None
+        self.frames = 0
+        self.samples = 0
+
+        bar = tk.Frame(self, bg=bg)
+        bar.pack(fill=tk.X)
+        tk.Label(bar, text="■ Temperature", fg=temperature_color, bg=bg, font=font).pack(side=tk.LEFT, padx=4)
+        tk.Label(bar, text="■ Set point", fg=set_color, bg=bg, font=font).pack(side=tk.LEFT, padx=4)
+        tk.Label(bar, text="■ SSR on", fg=ssr_color, bg=bg, font=font).pack(side=tk.LEFT, padx=4)
+        self.window_var = tk.StringVar(self, value=next(
+            (label for label, value in WINDOWS if value == seconds), WINDOWS[1][0]))
+        selector = ttk.Combobox(bar, textvariable=self.window_var, values=[label for label, _ in WINDOWS],
+                                state="readonly", width=7)
+        selector.pack(side=tk.RIGHT, padx=4)
+        selector.bind("<<ComboboxSelected>>", lambda event: self.set_window(dict(WINDOWS)[self.window_var.get()]))
+
+        self.canvas = tk.Canvas(self, height=height, bg=bg, bd=0, highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.series = [_Series(self.canvas, "temperature", temperature_color, 2, ("data", "temp")),
+                       _Series(self.canvas, "set_temperature", set_color, 1, ("data", "temp")),
+                       _Series(self.canvas, "ssr", ssr_color, 1, ("data",))]
+        self._size = (0, 0)
+        self._reset()
+        self.canvas.bind("<Configure>", self._on_configure)
+
+    # ---------------------------
+    # Public
+    # ---------------------------
+    def start(self):
+        if self._job is None:
+            self._job = self.after(self.interval_ms, self._frame)
+
+    def stop(self):
+        if self._job is not None:
+            self.after_cancel(self._job)
+            self._job = None
+
+    def set_window(self, seconds):
+        self.seconds = seconds
+        self.redraw()
+
+    def set_store(self, store):
+        """Shows another TelemetryStore, e.g. a replayed run instead of the live one."""
+        self.store = store
+        self.redraw()
+
+    def redraw(self):
+        """Starts over from the store; only needed after a resize or a new window."""
+        self._reset()
+        self._draw(self.store.last(self.seconds))
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "samples": self.samples,
+            "items": sum(series.items for series in self.series),
+            "last_render": self.last_render,
+            "mean_render": self.render.sum / self.render.count if self.render.count else None,
+        }
+
+    # ---------------------------
+    # Drawing
+    # ---------------------------
+    def _reset(self):
+        for series in self.series:
+            series.clear()
+        width, height = self._size
+        self.plot_width = max(10, width - AXIS_WIDTH - MARGIN)
+        self.top = MARGIN
+        self.bottom = max(self.top + 10, height - SSR_HEIGHT - MARGIN)
+        self.seconds_per_bucket = self.seconds / self.plot_width
+        self.gap = max(1, GAP_SECONDS / self.seconds_per_bucket)
+        self.origin = None         # Time of bucket 0
+        self.shift = 0             # Bucket at the left edge of the plot
+        self.last_time = None      # Newest sample drawn or pending
+        self.pending = None        # Samples of the bucket still filling
+        self.low = self.high = None
+        self.canvas.delete("grid", "axis")
+
+    def _frame(self):
+        self._job = None
+        try:
+            start = time.perf_counter()
+            if self.last_time is None:
+                data = self.store.last(self.seconds)
+            else:
+                data = self.store.since(self.last_time)
+            if len(data["time"]):
+                self._draw(data)
+                self.canvas.update_idletasks()
+                self.last_render = time.perf_counter() - start
+                self.render.observe(self.last_render)
+                self.frames += 1
+        finally:
+            self._job = self.after(self.interval_ms, self._frame)
+
+    def _draw(self, data):
+        times = data["time"]
+        if not len(times):
+            return
+        self.samples += len(times)
+        self.last_time = times[-1]
+        columns = {series.column: data[series.column].astype(np.float64) for series in self.series}
+        if self.pending is not None:
+            times = np.concatenate((self.pending["time"], times))
+            columns = {name: np.concatenate((self.pending[name], values)) for name, values in columns.items()}
+        if self.origin is None:
+            self.origin = times[0] - self.seconds
+        buckets = np.maximum.accumulate(
+            np.floor((times - self.origin) / self.seconds_per_bucket).astype(np.int64))
+        newest = int(buckets[-1])
+        done = int(np.searchsorted(buckets, newest))
+
+        self._fit(columns["temperature"], columns["set_temperature"])
+        self._scroll(newest + 1 - self.plot_width)
+        if done:
+            for series in self.series:
+                for bucket, first, second in zip(*bucket_minmax(buckets[:done], columns[series.column][:done])):
+                    series.append(int(bucket), first, self._to_xy(series), self.gap)
+                    if second != first:
+                        series.append(int(bucket), second, self._to_xy(series), self.gap)
+        self.pending = {"time": times[done:]}
+        self.pending.update((name, values[done:]) for name, values in columns.items())
+        for series in self.series:
+            values = self.pending[series.column]
+            tail = [float(np.nanmin(values)), float(np.nanmax(values))] if not np.isnan(values).all() else []
+            series.set_tail(tail, newest, self._to_xy(series), self.gap)
+        self.canvas.tag_raise("axis")  # Hides the part of the oldest lines left of the plot
+
+    def _to_xy(self, series):
+        left = AXIS_WIDTH - self.shift + 0.5
+        if series.column == "ssr":
+            base = self.bottom + MARGIN + SSR_HEIGHT - 1
+            return lambda bucket, value: (left + bucket, base - value * (SSR_HEIGHT - 2))
+        top, scale, high = self.top, (self.bottom - self.top) / (self.high - self.low), self.high
+        return lambda bucket, value: (left + bucket, top + (high - value) * scale)
+
+    def _scroll(self, shift):
+        if shift <= self.shift:
+            return
+        self.canvas.move("data", self.shift - shift, 0)
+        self.shift = shift
+        for series in self.series:
+            series.drop_before(shift)
+
+    def _fit(self, *columns):
+        """Grows the temperature axis to hold the new values, rescaling what is drawn."""
+        low = min(float(np.nanmin(values)) if not np.isnan(values).all() else math.inf for values in columns)
+        high = max(float(np.nanmax(values)) if not np.isnan(values).all() else -math.inf for values in columns)
+        if low == math.inf:
+            low, high = 0.0, 100.0
+        if self.low is not None and low >= self.low and high <= self.high:
+            return
+        if self.low is not None:
+            low, high = min(low, self.low), max(high, self.high)
+        new_low = math.floor((low - 5) / 10) * 10
+        new_high = math.ceil((high + 5) / 10) * 10
+        if self.low is not None:
+            # y' = top + (high' - v) * k', applied to y = top + (high - v) * k
+            ratio = (self.high - self.low) / (new_high - new_low)
+            self.canvas.scale("temp", 0, self.top, 1, ratio)
+            self.canvas.move("temp", 0, (new_high - self.high) * (self.bottom - self.top) / (new_high - new_low))
+        self.low, self.high = new_low, new_high
+        self._draw_grid()
+
+    def _draw_grid(self):
+        canvas = self.canvas
+        canvas.delete("grid", "axis")
+        canvas.create_rectangle(0, 0, AXIS_WIDTH, self._size[1], fill=self.bg, width=0, tags="axis")
+        span = self.high - self.low
+        step = next(s for s in (5, 10, 20, 25, 50, 100, 200, 500) if span / s <= 6)
+        right = AXIS_WIDTH + self.plot_width
+        value = math.ceil(self.low / step) * step
+        while value <= self.high:
+            y = self.top + (self.high - value) * (self.bottom - self.top) / span
+            canvas.create_line(AXIS_WIDTH, y, right, y, fill=self.grid, tags="grid")
+            canvas.create_text(AXIS_WIDTH - 4, y, text=f"{value:g}°", anchor=tk.E, fill=self.fg,
+                               font=self.font, tags="axis")
+            value += step
+        ssr_top = self.bottom + MARGIN
+        canvas.create_rectangle(AXIS_WIDTH, ssr_top, right, ssr_top + SSR_HEIGHT, outline=self.grid, tags="grid")
+        canvas.create_text(AXIS_WIDTH - 4, ssr_top + SSR_HEIGHT / 2, text="SSR", anchor=tk.E, fill=self.fg,
+                           font=self.font, tags="axis")
+        canvas.tag_lower("grid")
+
+    def _on_configure(self, event):
+        if (event.width, event.height) != self._size:
+            self._size = (event.width, event.height)
+            self.redraw()
@@ -0,0 +1,224 @@
+"""
+Logging that never blocks the serial threads.
+
+setup_logging() sends every record through a QueueHandler. The thread
+that logs only checks the level and the rate limit, then puts the
+unformatted record on a bounded queue. A QueueListener thread formats it
+and writes it to the console and, optionally, to a JSON-lines file that
+is rotated by size. If the queue is full, the record is dropped and
+counted; the caller never waits.
+
+Rate limits apply per key. The key is the logger name plus the unformatted
+message, so "Sent to Arduino: %s" is one key whatever the command. Pass
+extra={"key": ...} to choose the key yourself. When a key runs out of
+tokens, its records are counted. The next record let through says how
+many were suppressed.
+
+Use %-style arguments (log.debug("Sent: %s", command)), not f-strings.
+The message is then only built on the writer thread, and only if the
+record is kept. Arguments are read on that thread, so pass values that
+are not changed afterwards.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from threading import Lock
+
+CONSOLE_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+DEFAULT_RATE = 20.0         # Records per second per key, on average
+DEFAULT_BURST = 50          # Records per key let through at once
+DEFAULT_QUEUE_SIZE = 10000
+MAX_KEYS = 4096             # Rate limit buckets kept before starting afresh
+_SRCFILE = logging._srcfile  # Where logging looks for the caller; None skips the lookup
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per message key; suppressed records are counted, not queued."""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.suppressed = 0
+        self._buckets = {}      # key -> [tokens, last refill, suppressed since last pass]
+        self._lock = Lock()
+
+    def filter(self, record):
+        key = getattr(record, "key", None) or (record.name, record.msg)
+        now = record.created
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= MAX_KEYS:
+                    self._buckets.clear()
+                bucket = self._buckets[key] = [self.burst, now, 0]
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                self.suppressed += 1
+                return False
+            bucket[0] -= 1
+            if bucket[2]:
+                record.suppressed = bucket[2]
+                bucket[2] = 0
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    A QueueHandler that hands over the record as it is, and drops it once
+    maxsize records are waiting. The stdlib version formats the message on
+    the calling thread. The queue is a SimpleQueue, which puts without
+    taking a Python-level lock.
+    """
+
+    def __init__(self, log_queue, maxsize=DEFAULT_QUEUE_SIZE):
+        super().__init__(log_queue)
+        self.maxsize = maxsize
+        self.enqueued = 0
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        if self.queue.qsize() >= self.maxsize:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+        self.enqueued += 1
+
+
+class ConsoleFormatter(logging.Formatter):
+    """CONSOLE_FORMAT, plus how many records like this one were suppressed."""
+
+    def __init__(self, fmt=CONSOLE_FORMAT):
+        super().__init__(fmt, datefmt="%H:%M:%S")
+
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            text += f" ({suppressed} similar messages suppressed)"
+        return text
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One compact JSON object per record: t, level, logger, thread, msg (+ suppressed, exc)."""
+
+    def format(self, record):
+        data = {
+            "t": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            data["suppressed"] = suppressed
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+class LogPipeline:
+    """The queue, its handler on the logging side and the writer thread."""
+
+    def __init__(self, handlers, level=logging.INFO, rate=DEFAULT_RATE, burst=DEFAULT_BURST,
+                 queue_size=DEFAULT_QUEUE_SIZE):
+        self.queue = queue.SimpleQueue()
+        self.handler = NonBlockingQueueHandler(self.queue, queue_size)
+        self.handler.setLevel(level)
+        self.rate_limit = None
+        if rate:
+            self.rate_limit = RateLimitFilter(rate, burst)
+            self.handler.addFilter(self.rate_limit)
+        self.handlers = list(handlers)
+        self.listener = logging.handlers.QueueListener(self.queue, *self.handlers,
+                                                       respect_handler_level=True)
+        self._running = False
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self.listener.start()
+
+    def stop(self):
+        """Writes out what is queued, then stops the writer thread."""
+        if self._running:
+            self._running = False
+            self.listener.stop()
+        for handler in self.handlers:
+            handler.close()
+
+    def stats(self):
+        return {
+            "enqueued": self.handler.enqueued,
+            "dropped": self.handler.dropped,
+            "suppressed": self.rate_limit.suppressed if self.rate_limit else 0,
+            "queued": self.queue.qsize(),
+        }
+
+
+_pipeline = None
+
+
+def setup_logging(level=logging.INFO, console=True, json_path=None, max_bytes=10 * 1024 * 1024,
+                  backups=3, rate=DEFAULT_RATE, burst=DEFAULT_BURST, queue_size=DEFAULT_QUEUE_SIZE,
+                  stream=None, caller_info=False):
+    """
+    Routes the root logger through a new LogPipeline and returns it. level
+    may be a name ("DEBUG"). json_path adds a JSON-lines file, rotated
+    at max_bytes and keeping backups old files. rate=0 disables rate
+    limiting. The console is stdout unless stream is given. Calling it
+    again replaces the previous pipeline.
+
+    Without caller_info, records skip the source file and line lookup and
+    the process fields, which neither format uses. That is most of the cost
+    of making a record.
+    """
+    global _pipeline
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+    handlers = []
+    if console:
+        console_handler = logging.StreamHandler(stream or sys.stdout)
+        console_handler.setFormatter(ConsoleFormatter())
+        handlers.append(console_handler)
+    if json_path:
+        file_handler = logging.handlers.RotatingFileHandler(
+            json_path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        file_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(file_handler)
+
+    logging._srcfile = _SRCFILE if caller_info else None
+    logging.logProcesses = logging.logMultiprocessing = caller_info
+
+    root = logging.getLogger()
+    if _pipeline is not None:
+        root.removeHandler(_pipeline.handler)
+        _pipeline.stop()
+    _pipeline = LogPipeline(handlers, level, rate, burst, queue_size)
+    root.addHandler(_pipeline.handler)
+    # The logger level is checked first and cached, so a disabled debug() costs next to nothing
+    root.setLevel(level)
+    _pipeline.start()
+    return _pipeline
+
+
+def shutdown_logging():
+    global _pipeline
+    if _pipeline is not None:
+        logging.getLogger().removeHandler(_pipeline.handler)
+        _pipeline.stop()
+        _pipeline = None
+
+
+def log_pipeline():
+    """The pipeline installed by setup_logging(), or None."""
+    return _pipeline
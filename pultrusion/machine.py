@@ -0,0 +1,305 @@
+"""
+One pultrusion machine without a GUI.
+
+A Machine bundles the serial connection, its AsyncSerialBackend and
+CommandCoalescer, the live MachineState, a TelemetryStore and a
+RecipeRunner, so several machines can live in one process instead of
+each needing module globals. PultrusionApp.py, FleetApp.py and the
+command line (python -m pultrusion) are views over it.
+
+Nothing here imports tkinter. A Machine keeps no telemetry history
+unless given a store_capacity, and NumPy (for the TelemetryStore) and
+the recipe code are only imported once a machine uses them, so scripts
+and worker processes that just send commands start quickly.
+"""
+import logging
+import time
+
+from pultrusion.async_backend import AsyncSerialBackend
+from pultrusion.coalescer import CommandCoalescer
+from pultrusion.dispatcher import value_ack
+from pultrusion.protocol import (CoolingComplete, EjectAdjusted, EmergencyStop, FanState,
+                                 SetTemperatureAck, ShutdownStarted, StartupTemperature,
+                                 StatusReport, SystemRestarted, TelemetrySample, WinderState, parse_line)
+from pultrusion.serial_io import ArduinoController
+
+log = logging.getLogger(__name__)
+
+# One hour at the firmware's 10 Hz; plenty for a live view of one machine (the fleet's default)
+MACHINE_STORE_CAPACITY = 60 * 60 * 10
+
+
+def speed_to_pwm(percent):
+    """Maps a 0 (slowest) .. 100 (fastest) slider value to the firmware's PWM value."""
+    return int((100 - percent) / 100.0 * 254) + 1
+
+
+def pwm_to_speed(pwm):
+    """Inverse of speed_to_pwm(), rounded to a whole percent. PWM 0 is off: 0 %."""
+    if pwm <= 0:
+        return 0
+    return round(100 - (pwm - 1) / 254.0 * 100)
+
+
+class MachineState:
+    """
+    The latest known state of one machine, updated from firmware events.
+    Values are None until the firmware has reported them.
+    """
+
+    def __init__(self, name, port=None):
+        self.name = name
+        self.port = port
+        self.connected = False
+        self.error = None
+        self.temperature = None
+        self.set_temperature = None
+        self.ssr_on = None
+        self.fan_on = None
+        self.fan_pwm = None
+        self.winder_on = None
+        self.winder_pwm = None
+        self.emergency_stop = False
+        self.shutting_down = False
+        self.lines = 0
+        self.last_update = None    # time.monotonic() of the last line
+
+    def apply(self, event, received_at=None):
+        self.lines += 1
+        self.last_update = received_at if received_at is not None else time.monotonic()
+        if isinstance(event, TelemetrySample):
+            self.temperature = event.temperature
+            self.set_temperature = event.set_temperature
+            self.ssr_on = event.ssr_on
+        elif isinstance(event, (SetTemperatureAck, EjectAdjusted)):
+            self.set_temperature = event.set_temperature
+        elif isinstance(event, StartupTemperature):
+            self.temperature = event.temperature
+        elif isinstance(event, FanState):
+            self.fan_on = event.on
+            self.fan_pwm = event.pwm
+        elif isinstance(event, WinderState):
+            self.winder_on = event.on
+            if event.pwm is not None:
+                self.winder_pwm = event.pwm
+        elif isinstance(event, StatusReport):
+            self.set_temperature = event.set_temperature
+            self.fan_on, self.fan_pwm = event.fan_on, event.fan_pwm
+            self.winder_on, self.winder_pwm = event.winder_on, event.winder_pwm
+        elif isinstance(event, EmergencyStop):
+            self.emergency_stop = True
+            self.ssr_on = False
+        elif isinstance(event, ShutdownStarted):
+            self.shutting_down = True
+        elif isinstance(event, (CoolingComplete, SystemRestarted)):
+            self.shutting_down = False
+            self.emergency_stop = False
+
+    @property
+    def fan_speed(self):
+        return pwm_to_speed(self.fan_pwm) if self.fan_pwm is not None else None
+
+    @property
+    def spool_speed(self):
+        return pwm_to_speed(self.winder_pwm) if self.winder_pwm is not None else None
+
+    def age(self, now=None):
+        """Seconds since the machine last printed anything, or None."""
+        if self.last_update is None:
+            return None
+        return (now if now is not None else time.monotonic()) - self.last_update
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "port": self.port,
+            "connected": self.connected,
+            "error": self.error,
+            "temperature": self.temperature,
+            "set_temperature": self.set_temperature,
+            "ssr_on": self.ssr_on,
+            "fan_on": self.fan_on,
+            "fan_speed": self.fan_speed,
+            "winder_on": self.winder_on,
+            "spool_speed": self.spool_speed,
+            "emergency_stop": self.emergency_stop,
+            "shutting_down": self.shutting_down,
+            "lines": self.lines,
+            "age": self.age(),
+        }
+
+
+class Machine:
+    """
+    A connected machine. Pass a shared SerialLoop as io_loop to serve many
+    machines from one I/O thread. Either open() the port, or attach() a
+    controller that is already connected (from pultrusion.discovery, or a
+    daemon's RemoteController).
+
+    Event listeners are called on the serial loop thread as
+    callback(machine, event, received_at) and must not block. parse turns
+    a line into an event (ParseMetrics.parse to time it).
+    store_capacity samples of telemetry are kept in self.store; with the
+    default 0 there is no store and NumPy is not imported.
+    """
+
+    def __init__(self, name, port=None, io_loop=None, baudrate=9600,
+                 store_capacity=0, controller=None, parse=parse_line):
+        self.name = name
+        self.port = port
+        self.baudrate = baudrate
+        self.backend = AsyncSerialBackend(controller or ArduinoController(), io_loop=io_loop)
+        self.commands = CommandCoalescer(self.backend)
+        self.state = MachineState(name, port)
+        self.store = None
+        if store_capacity:
+            from pultrusion.telemetry_store import TelemetryStore
+            self.store = TelemetryStore(store_capacity)
+        self.parse = parse
+        self._recipes = None
+        self._listeners = []
+        self.backend.subscribe(self._on_line)
+        self.backend.add_connection_listener(self._on_connection)
+
+    def __repr__(self):
+        return f"Machine({self.name!r}, {self.port!r})"
+
+    @property
+    def controller(self):
+        """The connection in use; the backend follows reconnects."""
+        return self.backend.controller
+
+    @property
+    def recipes(self):
+        """This machine's RecipeRunner, made on first use."""
+        if self._recipes is None:
+            from pultrusion.recipes import RecipeRunner
+            self._recipes = RecipeRunner(self.backend, coalescer=self.commands)
+        return self._recipes
+
+    # ---------------------------
+    # Lifecycle
+    # ---------------------------
+    def open(self, settle_time=2.0):
+        """Opens the serial port; raises serial.SerialException on failure."""
+        try:
+            self.controller.connect(self.port, self.baudrate, settle_time=settle_time)
+        except Exception as e:
+            self.state.error = str(e)
+            raise
+        self.state.connected = True
+        self.state.error = None
+
+    def attach(self, controller, lines=(), port=None):
+        """
+        Switches to a controller that is already connected. lines are
+        (line, received_at) pairs read before, e.g. while probing the port;
+        they are handled first so the banner is not lost.
+        """
+        for line, received_at in lines:
+            self.backend.dispatch(line, received_at)
+        self.backend.set_controller(controller)
+        if port is not None:
+            self.port = self.state.port = port
+        self.state.connected = True
+        self.state.error = None
+
+    def start(self):
+        self.backend.start()
+
+    def close(self):
+        if self._recipes is not None:
+            self._recipes.scheduler.stop()
+        self.backend.stop()
+        self.controller.close_connection()
+        self.state.connected = False
+
+    def add_listener(self, callback):
+        self._listeners = self._listeners + [callback]
+        return callback
+
+    # ---------------------------
+    # Commands
+    # ---------------------------
+    def set_temperature(self, temperature, timeout=5.0):
+        """
+        Sends SET_TEMP right away and returns a Future resolving with the
+        firmware's acknowledgment. request_temperature() coalesces instead.
+        """
+        temperature = int(temperature)
+        return self.backend.submit(f"SET_TEMP:{temperature}",
+                                   expect=value_ack(f"Set Temperature updated to {temperature}"),
+                                   timeout=timeout)
+
+    def request_temperature(self, temperature):
+        self.commands.set("temperature", int(temperature))
+
+    def set_fan_speed(self, percent):
+        self.commands.set("fan", speed_to_pwm(percent))
+
+    def set_spool_speed(self, percent):
+        self.commands.set("winder", speed_to_pwm(percent))
+
+    def set_shutdown_time(self, seconds):
+        self.commands.set("timer", int(seconds))
+
+    def cancel_shutdown(self):
+        self.backend.send("CANCEL_SHUTDOWN")
+
+    def eject(self):
+        self.backend.send("EJECT")
+
+    def read_status(self, timeout=5.0):
+        """
+        Asks the firmware for its settings and waits for the StatusReport;
+        None if it does not answer (firmware without STATUS). Blocks, so
+        never call it on the serial loop thread.
+        """
+        future = self.backend.submit("STATUS", expect="Status: ", timeout=timeout)
+        try:
+            event = parse_line(future.result(timeout + 1.0))
+        except Exception:
+            return None
+        return event if isinstance(event, StatusReport) else None
+
+    def cancel_recipe(self, then=None):
+        """
+        Stops the running recipe, if any, and returns whether one was
+        running. then() runs on the recipe scheduler thread once the
+        recipe has stopped, after anything it had already sent.
+        """
+        runner = self._recipes
+        if runner is None or not runner.running:
+            return False
+        runner.cancel()
+        if then is not None:
+            runner.scheduler.call_soon(then)
+        return True
+
+    def run_recipe(self, recipe, progress=None):
+        """Starts a Recipe; returns a Future for the whole run. progress as for RecipeRunner."""
+        if progress is not None:
+            self.recipes.progress = progress
+        return self.recipes.run(recipe)
+
+    # ---------------------------
+    # Incoming lines (serial loop thread)
+    # ---------------------------
+    def _on_connection(self, connected, controller):
+        self.state.connected = connected
+        if connected:
+            self.state.error = None
+        else:
+            self.state.error = getattr(controller, "last_error", None) or "Connection lost"
+
+    def _on_line(self, line, received_at):
+        event = self.parse(line)
+        self.commands.observe(event)
+        self.state.apply(event, received_at)
+        if self.store is not None:
+            self.store.add_event(event, received_at)
+        for callback in self._listeners:
+            try:
+                callback(self, event, received_at)
+            except Exception as e:
+                log.error("Error in listener for %s: %s", self.name, e)
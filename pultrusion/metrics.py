@@ -0,0 +1,296 @@
+"""
+Cheap runtime metrics for the serial link and the GUI.
+
+The hot paths only bump plain integer counters and Histogram buckets. That
+is one increment under the GIL and takes no lock. Each counter has a
+single writer thread. A MetricsRegistry reads them only when asked, for
+the Diagnostics window or for a MetricsExporter that writes a Prometheus
+text file or a JSON file every few seconds for monitoring to scrape.
+
+LoopMonitor measures how busy an event loop thread is (the serial asyncio
+loop, the Tk main loop, the recipe scheduler) and how late its timers run.
+"""
+import json
+import logging
+import os
+import tempfile
+import time
+from bisect import bisect_left
+from threading import Event, Thread
+
+from pultrusion.protocol import Notice, parse_line
+
+log = logging.getLogger(__name__)
+
+# Upper bounds in seconds; the last bucket is +Inf
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+PARSE_BUCKETS = (1e-6, 2e-6, 5e-6, 1e-5, 2e-5, 5e-5, 1e-4, 1e-3)
+
+
+class Histogram:
+    """Counts of observed values per fixed bucket, plus their count and sum."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q quantile (None when empty, inf past the last bucket)."""
+        counts = list(self.counts)
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def summary(self):
+        count = self.count
+        return {
+            "count": count,
+            "mean": self.sum / count if count else None,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+        }
+
+
+class ParseMetrics:
+    """parse_line() with its time per line and the unrecognised lines counted."""
+
+    def __init__(self):
+        self.time = Histogram(PARSE_BUCKETS)
+        self.lines = 0
+        self.unparsed = 0       # Lines that came back as Notice
+
+    def parse(self, line):
+        started = time.perf_counter()
+        event = parse_line(line)
+        self.time.observe(time.perf_counter() - started)
+        self.lines += 1
+        if type(event) is Notice:
+            self.unparsed += 1
+        return event
+
+
+class LoopMonitor:
+    """
+    Utilisation and timer lag of one event loop thread. schedule(delay,
+    callback) must run callback on that thread after delay seconds, e.g.
+    AsyncSerialBackend.call_later or a wrapper around root.after. Every
+    interval, the thread's CPU time is compared with the wall time since
+    the previous tick.
+    """
+
+    def __init__(self, name, schedule, interval=1.0):
+        self.name = name
+        self.schedule = schedule
+        self.interval = interval
+        self.utilisation = None     # Fraction of wall time the thread spent on the CPU
+        self.lag = Histogram()      # How late each tick ran
+        self._running = False
+        self._last = None
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self._last = None
+            self.schedule(0, self._tick)
+
+    def stop(self):
+        self._running = False
+
+    def _tick(self):
+        if not self._running:
+            return
+        now = time.monotonic()
+        cpu = time.thread_time()
+        if self._last is not None:
+            last_now, last_cpu = self._last
+            self.lag.observe(max(0.0, now - last_now - self.interval))
+            if now > last_now:
+                self.utilisation = min(1.0, (cpu - last_cpu) / (now - last_now))
+        self._last = (now, cpu)
+        self.schedule(self.interval, self._tick)
+
+
+class MetricsRegistry:
+    """
+    Named metrics read through callbacks when collected. Counters only go
+    up, gauges are point values, and histograms are Histogram objects.
+    """
+
+    def __init__(self, prefix="pultrusion_"):
+        self.prefix = prefix
+        self._metrics = []          # (name, kind, help, source)
+
+    def counter(self, name, help, read):
+        self._metrics.append((name, "counter", help, read))
+
+    def gauge(self, name, help, read):
+        self._metrics.append((name, "gauge", help, read))
+
+    def histogram(self, name, help, histogram):
+        self._metrics.append((name, "histogram", help, lambda: histogram))
+        return histogram
+
+    def collect(self):
+        """[(name, kind, help, value)]; a metric whose callback fails is left out."""
+        collected = []
+        for name, kind, help, read in self._metrics:
+            try:
+                value = read()
+            except Exception:
+                continue
+            collected.append((name, kind, help, value))
+        return collected
+
+    def snapshot(self):
+        """{name: value}, histograms as Histogram.summary()."""
+        return {name: value.summary() if kind == "histogram" else value
+                for name, kind, _, value in self.collect()}
+
+    def to_json(self):
+        return json.dumps({"time": time.time(), "metrics": self.snapshot()}, indent=1)
+
+    def to_prometheus(self):
+        lines = []
+        for name, kind, help, value in self.collect():
+            name = self.prefix + name
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind != "histogram":
+                lines.append(f"{name} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(value.buckets, list(value.counts)):
+                cumulative += count
+                lines.append(f'{name}_bucket{{le="{bound:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{le="+Inf"}} {value.count}')
+            lines.append(f"{name}_sum {value.sum!r}")
+            lines.append(f"{name}_count {value.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _number(value):
+    if value is None:
+        return "NaN"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsExporter:
+    """
+    Writes registry to path every interval seconds: JSON if path ends in
+    .json, Prometheus text format otherwise (point node_exporter's textfile
+    collector at it, or serve the directory). The file is replaced
+    atomically, so a scraper never reads half of it.
+    """
+
+    def __init__(self, registry, path, interval=10.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.json = path.lower().endswith(".json")
+        self.writes = 0
+        self._stop = Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name="metrics-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def write(self):
+        text = self.registry.to_json() if self.json else self.registry.to_prometheus()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(prefix=".metrics.", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as file:
+                file.write(text)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.writes += 1
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.write()
+            except OSError as e:
+                log.warning("Could not export metrics to %s: %s", self.path, e)
+            self._stop.wait(self.interval)
+
+
+def register_link(registry, dispatcher, parse_metrics=None):
+    """
+    Serial traffic, acknowledgments and lost lines of a dispatcher. The
+    traffic counters add up every controller the dispatcher has used, so
+    they keep growing across reconnects.
+    """
+    def counter(name):
+        return lambda: dispatcher.link_counters()[name]
+
+    registry.counter("serial_bytes_received_total", "Bytes read from the serial port",
+                     counter("bytes_received"))
+    registry.counter("serial_bytes_sent_total", "Bytes written to the serial port",
+                     counter("bytes_sent"))
+    registry.counter("serial_lines_received_total", "Complete lines read",
+                     counter("lines_received"))
+    registry.counter("serial_commands_sent_total", "Commands written",
+                     counter("commands_sent"))
+    registry.counter("serial_partial_lines_dropped_total", "Overlong or interrupted lines discarded",
+                     counter("partial_lines_dropped"))
+    registry.counter("serial_bad_frames_total", "Compact frames with a bad checksum",
+                     counter("bad_frames"))
+    registry.gauge("serial_connected", "1 while the port is open",
+                   lambda: dispatcher.controller.is_connected())
+    registry.counter("acks_received_total", "Acknowledged commands", lambda: dispatcher.acks_received)
+    registry.counter("acks_timed_out_total", "Commands never acknowledged",
+                     lambda: dispatcher.acks_timed_out)
+    registry.histogram("ack_latency_seconds", "Command sent to its acknowledgment line",
+                       dispatcher.ack_latency)
+    registry.histogram("echo_latency_seconds", "Command sent to the firmware's \"Received command\" echo",
+                       dispatcher.echo_latency)
+    if parse_metrics is not None:
+        registry.counter("lines_parsed_total", "Lines classified by parse_line()",
+                         lambda: parse_metrics.lines)
+        registry.counter("lines_unparsed_total", "Lines not recognised (Notice)",
+                         lambda: parse_metrics.unparsed)
+        registry.histogram("parse_seconds", "parse_line() time per line", parse_metrics.time)
+
+
+def register_ui(registry, ui_pump):
+    registry.counter("ui_updates_posted_total", "Tk variable updates posted",
+                     lambda: ui_pump.updates_posted)
+    registry.counter("ui_updates_applied_total", "Tk variable updates drawn (the rest were coalesced)",
+                     lambda: ui_pump.updates_applied)
+    registry.histogram("ui_lag_seconds", "Serial line received to its value drawn", ui_pump.lag)
+
+
+def register_loop(registry, monitor):
+    name = monitor.name.replace("-", "_")
+    registry.gauge(f"{name}_loop_utilisation", f"Share of wall time the {monitor.name} thread was busy",
+                   lambda: monitor.utilisation)
+    registry.histogram(f"{name}_loop_lag_seconds", f"How late {monitor.name} timers ran", monitor.lag)
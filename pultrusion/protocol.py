@@ -0,0 +1,547 @@
+"""
+Parser for the lines printed by the pultrusion firmware (sketch_oct7a.ino).
+
+Each line is classified by its first word, then the matching precompiled
+pattern pulls out the fields into a small event object. Lines that are not
+recognised come back as Notice so nothing is silently dropped.
+
+In compact mode (TELEMETRY:COMPACT) telemetry arrives as short framed
+records instead, NMEA style with an XOR checksum:
+
+    $T,152.34,160,1*61      temperature, set temperature, SSR on
+"""
+import re
+
+
+def _number(text):
+    """Arduino prints "nan"/"inf"/"ovf" for a broken thermistor reading."""
+    try:
+        return float(text)
+    except ValueError:
+        return float("nan")
+
+
+class FirmwareEvent:
+    __slots__ = ()
+    kind = "event"
+
+    def to_line(self):
+        """The firmware's text for this event (parse_line(e.to_line()) == e)."""
+        raise NotImplementedError
+
+    def as_dict(self):
+        data = {"kind": self.kind}
+        for name in self.__slots__:
+            data[name] = getattr(self, name)
+        return data
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+# -------------------------------------------------
+# Event Types
+# -------------------------------------------------
+class TelemetrySample(FirmwareEvent):
+    """Current Temperature: 25.50 °C | Set Temperature: 100 °C | SSR State: ON"""
+    __slots__ = ("temperature", "set_temperature", "ssr_on")
+    kind = "telemetry"
+
+    def __init__(self, temperature, set_temperature, ssr_on):
+        self.temperature = temperature
+        self.set_temperature = set_temperature
+        self.ssr_on = ssr_on
+
+    def to_line(self):
+        return (f"Current Temperature: {self.temperature:.2f} °C | Set Temperature: {self.set_temperature} °C"
+                f" | SSR State: {'ON' if self.ssr_on else 'OFF'}")
+
+    def to_frame(self):
+        """The compact-mode frame for this sample."""
+        return make_frame(f"T,{self.temperature:.2f},{self.set_temperature},{1 if self.ssr_on else 0}")
+
+
+class CommandEcho(FirmwareEvent):
+    """Received command: SET_TEMP:160"""
+    __slots__ = ("command",)
+    kind = "command_echo"
+
+    def __init__(self, command):
+        self.command = command
+
+    def to_line(self):
+        return f"Received command: {self.command}"
+
+
+class CommandRejected(FirmwareEvent):
+    """Shutdown in progress / invalid value messages."""
+    __slots__ = ("reason",)
+    kind = "command_rejected"
+
+    def __init__(self, reason):
+        self.reason = reason
+
+    def to_line(self):
+        return self.reason
+
+
+class SetTemperatureAck(FirmwareEvent):
+    """Set Temperature updated to 160 °C"""
+    __slots__ = ("set_temperature",)
+    kind = "set_temperature"
+
+    def __init__(self, set_temperature):
+        self.set_temperature = set_temperature
+
+    def to_line(self):
+        return f"Set Temperature updated to {self.set_temperature} °C"
+
+
+class FanState(FirmwareEvent):
+    """turnFanOn()/turnFanOff()/Fan PWM set to N"""
+    __slots__ = ("on", "pwm")
+    kind = "fan"
+
+    def __init__(self, on, pwm):
+        self.on = on
+        self.pwm = pwm
+
+    def to_line(self):
+        return f"Fan PWM set to {self.pwm}"
+
+
+class WinderState(FirmwareEvent):
+    """Winder PWM set to N / Winder Motor is ON. pwm is None when not reported."""
+    __slots__ = ("on", "pwm")
+    kind = "winder"
+
+    def __init__(self, on, pwm):
+        self.on = on
+        self.pwm = pwm
+
+    def to_line(self):
+        if self.pwm is None:
+            return f"Winder Motor is {'ON' if self.on else 'OFF'}"
+        return f"Winder PWM set to {self.pwm}"
+
+
+class ShutdownScheduled(FirmwareEvent):
+    """Shutdown scheduled in 600 seconds."""
+    __slots__ = ("seconds",)
+    kind = "shutdown_scheduled"
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def to_line(self):
+        return f"Shutdown scheduled in {self.seconds} seconds."
+
+
+class ShutdownProgress(FirmwareEvent):
+    """Shutdown countdown: 1000 ms elapsed (target: 60000 ms)"""
+    __slots__ = ("elapsed_ms", "target_ms")
+    kind = "shutdown_progress"
+
+    def __init__(self, elapsed_ms, target_ms):
+        self.elapsed_ms = elapsed_ms
+        self.target_ms = target_ms
+
+    def to_line(self):
+        return f"Shutdown countdown: {self.elapsed_ms} ms elapsed (target: {self.target_ms} ms)"
+
+
+class ShutdownElapsed(FirmwareEvent):
+    """Shutdown Timer Elapsed. Current Temperature: 158.20 °C"""
+    __slots__ = ("temperature",)
+    kind = "shutdown_elapsed"
+
+    def __init__(self, temperature):
+        self.temperature = temperature
+
+    def to_line(self):
+        return f"Shutdown Timer Elapsed. Current Temperature: {self.temperature:.2f} °C"
+
+
+class ShutdownCancelled(FirmwareEvent):
+    """Shutdown cancelled."""
+    __slots__ = ()
+    kind = "shutdown_cancelled"
+
+    def to_line(self):
+        return "Shutdown cancelled."
+
+
+class ShutdownStarted(FirmwareEvent):
+    """Initiating shutdown sequence."""
+    __slots__ = ()
+    kind = "shutdown_started"
+
+    def to_line(self):
+        return "Initiating shutdown sequence."
+
+
+class CoolingComplete(FirmwareEvent):
+    """Cooling complete. Turning off fan."""
+    __slots__ = ()
+    kind = "cooling_complete"
+
+    def to_line(self):
+        return "Cooling complete. Turning off fan."
+
+
+class EjectAdjusted(FirmwareEvent):
+    """EJECT command received. Adjusted setTemperature from 160 to 130"""
+    __slots__ = ("old_set_temperature", "set_temperature")
+    kind = "eject"
+
+    def __init__(self, old_set_temperature, set_temperature):
+        self.old_set_temperature = old_set_temperature
+        self.set_temperature = set_temperature
+
+    def to_line(self):
+        return (f"EJECT command received. Adjusted setTemperature from {self.old_set_temperature}"
+                f" to {self.set_temperature}")
+
+
+class EmergencyStop(FirmwareEvent):
+    """Emergency Stop Activated! (source is "switch" for the inductive switch)"""
+    __slots__ = ("source",)
+    kind = "emergency_stop"
+
+    def __init__(self, source):
+        self.source = source
+
+    def to_line(self):
+        if self.source == "switch":
+            return "Inductive Switch Pressed: Emergency Stop Activated!"
+        return "Emergency Stop Activated!"
+
+
+class SystemRestarted(FirmwareEvent):
+    """=== System (Re)Started! ==="""
+    __slots__ = ()
+    kind = "restarted"
+
+    def to_line(self):
+        return "=== System (Re)Started! ==="
+
+
+class StartupTemperature(FirmwareEvent):
+    """Startup Temperature Reading: 24.80 °C"""
+    __slots__ = ("temperature",)
+    kind = "startup_temperature"
+
+    def __init__(self, temperature):
+        self.temperature = temperature
+
+    def to_line(self):
+        return f"Startup Temperature Reading: {self.temperature:.2f} °C"
+
+
+class LinkMode(FirmwareEvent):
+    """Telemetry mode: COMPACT"""
+    __slots__ = ("compact",)
+    kind = "link_mode"
+
+    def __init__(self, compact):
+        self.compact = compact
+
+    def to_line(self):
+        return f"Telemetry mode: {'COMPACT' if self.compact else 'TEXT'}"
+
+
+class BaudChange(FirmwareEvent):
+    """Baud rate changing to 115200 / Baud change not confirmed, reverted to 9600"""
+    __slots__ = ("baudrate", "reverted")
+    kind = "baud"
+
+    def __init__(self, baudrate, reverted=False):
+        self.baudrate = baudrate
+        self.reverted = reverted
+
+    def to_line(self):
+        if self.reverted:
+            return f"Baud change not confirmed, reverted to {self.baudrate}"
+        return f"Baud rate changing to {self.baudrate}"
+
+
+class ControlMode(FirmwareEvent):
+    """Control mode: PID / Control mode: BANGBANG"""
+    __slots__ = ("pid",)
+    kind = "control_mode"
+
+    def __init__(self, pid):
+        self.pid = pid
+
+    def to_line(self):
+        return f"Control mode: {'PID' if self.pid else 'BANGBANG'}"
+
+
+class PidGains(FirmwareEvent):
+    """PID gains set to Kp=0.05000 Ki=0.00050 Kd=0.10000"""
+    __slots__ = ("kp", "ki", "kd")
+    kind = "pid_gains"
+
+    def __init__(self, kp, ki, kd):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+
+    def to_line(self):
+        return f"PID gains set to Kp={self.kp:.5f} Ki={self.ki:.5f} Kd={self.kd:.5f}"
+
+
+class StatusReport(FirmwareEvent):
+    """Status: Set Temperature: 160 °C | Fan: ON (PWM 229) | Winder: OFF (PWM 153) | Control: BANGBANG"""
+    __slots__ = ("set_temperature", "fan_on", "fan_pwm", "winder_on", "winder_pwm", "pid")
+    kind = "status"
+
+    def __init__(self, set_temperature, fan_on, fan_pwm, winder_on, winder_pwm, pid):
+        self.set_temperature = set_temperature
+        self.fan_on = fan_on
+        self.fan_pwm = fan_pwm
+        self.winder_on = winder_on
+        self.winder_pwm = winder_pwm
+        self.pid = pid
+
+    def to_line(self):
+        return (f"Status: Set Temperature: {self.set_temperature} °C"
+                f" | Fan: {'ON' if self.fan_on else 'OFF'} (PWM {self.fan_pwm})"
+                f" | Winder: {'ON' if self.winder_on else 'OFF'} (PWM {self.winder_pwm})"
+                f" | Control: {'PID' if self.pid else 'BANGBANG'}")
+
+
+class Pong(FirmwareEvent):
+    """PONG (reply to PING)"""
+    __slots__ = ()
+    kind = "pong"
+
+    def to_line(self):
+        return "PONG"
+
+
+class Notice(FirmwareEvent):
+    """Any other line (debug chatter, settings restored, ...)."""
+    __slots__ = ("text",)
+    kind = "notice"
+
+    def __init__(self, text):
+        self.text = text
+
+    def to_line(self):
+        return self.text
+
+
+# -------------------------------------------------
+# Compact frames
+# -------------------------------------------------
+def frame_checksum(body):
+    """XOR of the bytes between '$' and '*', as two hex digits."""
+    checksum = 0
+    for byte in body.encode("ascii", errors="replace"):
+        checksum ^= byte
+    return f"{checksum:02X}"
+
+
+def make_frame(body):
+    return f"${body}*{frame_checksum(body)}"
+
+
+def verify_frame(line):
+    """Returns the body of a well-formed frame, or None if it is corrupt."""
+    star = line.rfind("*")
+    if not line.startswith("$") or star < 0 or len(line) - star != 3:
+        return None
+    body = line[1:star]
+    if frame_checksum(body) != line[star + 1:].upper():
+        return None
+    return body
+
+
+def _frame(line):
+    body = verify_frame(line)
+    if body is None:
+        return None
+    fields = body.split(",")
+    try:
+        if fields[0] == "T" and len(fields) == 4:
+            return TelemetrySample(_number(fields[1]), int(fields[2]), fields[3] == "1")
+    except ValueError:
+        pass
+    return None
+
+
+# -------------------------------------------------
+# Patterns
+# -------------------------------------------------
+_TEMP = r" *([^ °C|]+) *°?C"
+_TELEMETRY = re.compile(r"Current Temperature:" + _TEMP +
+                        r" *\| *Set Temperature: *(-?\d+) *°?C *\| *SSR State: *(ON|OFF)")
+_SET_TEMP_ACK = re.compile(r"Set Temperature (?:updated|set) to (-?\d+)")
+_FAN_ON = re.compile(r"turnFanOn\(\):.*PWM = (\d+)")
+_FAN_PWM = re.compile(r"Fan PWM set to (\d+)")
+_FAN_COOLING = re.compile(r"Fan turned ON in cooling mode \(PWM=(\d+)\)")
+_WINDER_PWM = re.compile(r"Winder PWM set to (\d+)")
+_SHUTDOWN_SCHEDULED = re.compile(r"Shutdown scheduled in (\d+) seconds")
+_SHUTDOWN_COUNTDOWN = re.compile(r"Shutdown countdown: (\d+) ms elapsed \(target: (\d+) ms\)")
+_BAUD = re.compile(r"Baud (?:rate changing to|change not confirmed, reverted to) (\d+)")
+_PID_GAINS = re.compile(r"PID gains set to Kp=(\S+) Ki=(\S+) Kd=(\S+)")
+_STATUS = re.compile(r"Status: Set Temperature: *(-?\d+) *°?C *\| *Fan: *(ON|OFF) \(PWM (\d+)\)"
+                     r" *\| *Winder: *(ON|OFF) \(PWM (\d+)\) *\| *Control: *(PID|BANGBANG)")
+_SHUTDOWN_ELAPSED = re.compile(r"Shutdown Timer Elapsed\. Current Temperature:" + _TEMP)
+_EJECT = re.compile(r"EJECT command received\. Adjusted setTemperature from (-?\d+) to (-?\d+)")
+_STARTUP_TEMP = re.compile(r"Startup Temperature Reading:" + _TEMP)
+
+
+def _telemetry(line):
+    # Fast path for the exact firmware format, the regex handles the rest.
+    try:
+        current, setpoint, ssr = line[20:].split("|")
+        ssr = ssr.strip()
+        if ssr == "SSR State: ON" or ssr == "SSR State: OFF":
+            return TelemetrySample(float(current.split()[0]), int(setpoint.split()[2]), ssr[-1] == "N")
+    except (ValueError, IndexError):
+        pass
+    m = _TELEMETRY.match(line)
+    if m:
+        temperature, set_temperature, ssr = m.groups()
+        return TelemetrySample(_number(temperature), int(set_temperature), ssr == "ON")
+
+
+def _set_temp_ack(line):
+    m = _SET_TEMP_ACK.match(line)
+    if m:
+        return SetTemperatureAck(int(m.group(1)))
+
+
+def _pwm_event(cls, pattern):
+    def parse(line):
+        m = pattern.match(line)
+        if m:
+            pwm = int(m.group(1))
+            return cls(pwm > 0, pwm)
+    return parse
+
+
+def _shutdown_scheduled(line):
+    m = _SHUTDOWN_SCHEDULED.match(line)
+    if m:
+        return ShutdownScheduled(int(m.group(1)))
+
+
+def _shutdown_countdown(line):
+    m = _SHUTDOWN_COUNTDOWN.match(line)
+    if m:
+        return ShutdownProgress(int(m.group(1)), int(m.group(2)))
+
+
+def _shutdown_elapsed(line):
+    m = _SHUTDOWN_ELAPSED.match(line)
+    if m:
+        return ShutdownElapsed(_number(m.group(1)))
+
+
+def _eject(line):
+    m = _EJECT.match(line)
+    if m:
+        return EjectAdjusted(int(m.group(1)), int(m.group(2)))
+
+
+def _startup_temp(line):
+    m = _STARTUP_TEMP.match(line)
+    if m:
+        return StartupTemperature(_number(m.group(1)))
+
+
+def _baud(line):
+    m = _BAUD.match(line)
+    if m:
+        return BaudChange(int(m.group(1)), "reverted" in line)
+
+
+def _pid_gains(line):
+    m = _PID_GAINS.match(line)
+    if m:
+        return PidGains(*(_number(value) for value in m.groups()))
+
+
+def _status(line):
+    m = _STATUS.match(line)
+    if m:
+        return StatusReport(int(m.group(1)), m.group(2) == "ON", int(m.group(3)),
+                            m.group(4) == "ON", int(m.group(5)), m.group(6) == "PID")
+
+
+def _constant(cls, *args):
+    return lambda line: cls(*args)
+
+
+# First word -> [(prefix, parser), ...], tried in order.
+_DISPATCH = {}
+
+
+def _register(prefix, parser):
+    _DISPATCH.setdefault(prefix.split(" ", 1)[0], []).append((prefix, parser))
+
+
+_register("Current Temperature:", _telemetry)
+_register("Received command: ", lambda line: CommandEcho(line[18:].strip()))
+_register("Set Temperature ", _set_temp_ack)
+_register("turnFanOn():", _pwm_event(FanState, _FAN_ON))
+_register("turnFanOff():", _constant(FanState, False, 0))
+_register("Fan PWM set to ", _pwm_event(FanState, _FAN_PWM))
+_register("Fan turned ON in cooling mode", _pwm_event(FanState, _FAN_COOLING))
+_register("Winder PWM set to ", _pwm_event(WinderState, _WINDER_PWM))
+_register("Winder Motor is ON", _constant(WinderState, True, None))
+_register("Winder Motor is OFF", _constant(WinderState, False, 0))
+_register("Winder Motor turned OFF", _constant(WinderState, False, 0))
+_register("Shutdown countdown:", _shutdown_countdown)
+_register("Shutdown scheduled in ", _shutdown_scheduled)
+_register("Shutdown Timer Elapsed.", _shutdown_elapsed)
+_register("Shutdown cancelled.", _constant(ShutdownCancelled))
+_register("Shutdown in progress", lambda line: CommandRejected(line))
+_register("Invalid ", lambda line: CommandRejected(line))
+_register("Initiating shutdown sequence", _constant(ShutdownStarted))
+_register("Cooling complete", _constant(CoolingComplete))
+_register("EJECT command received.", _eject)
+_register("Emergency Stop Activated!", _constant(EmergencyStop, "firmware"))
+_register("Inductive Switch Pressed:", _constant(EmergencyStop, "switch"))
+_register("=== System (Re)Started! ===", _constant(SystemRestarted))
+_register("Startup Temperature Reading:", _startup_temp)
+_register("Telemetry mode: COMPACT", _constant(LinkMode, True))
+_register("Telemetry mode: TEXT", _constant(LinkMode, False))
+_register("Baud ", _baud)
+_register("PONG", _constant(Pong))
+_register("Control mode: PID", _constant(ControlMode, True))
+_register("Control mode: BANGBANG", _constant(ControlMode, False))
+_register("PID gains set to ", _pid_gains)
+_register("Status: ", _status)
+
+
+def parse_line(line):
+    """
+    Classifies one line from the Arduino. Returns None for blank lines and
+    Notice for anything unrecognised (or recognised but malformed).
+    """
+    if not line:
+        return None
+    # Telemetry is ~10 lines/s; skip the table lookup for it.
+    if line.startswith("Current Temperature:"):
+        return _telemetry(line) or Notice(line)
+    if line.startswith("$"):
+        return _frame(line) or Notice(line)
+    space = line.find(" ")
+    candidates = _DISPATCH.get(line[:space] if space > 0 else line)
+    if candidates:
+        for prefix, parser in candidates:
+            if line.startswith(prefix):
+                event = parser(line)
+                if event is not None:
+                    return event
+                break
+    return Notice(line)
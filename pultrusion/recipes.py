@@ -0,0 +1,503 @@
+"""
+Recipes: timelines of machine settings that run unattended.
+
+A recipe is a list of steps, run in order:
+
+    {"set": {"temperature": 160, "fan": 10, "spool": 40}}
+        Sends every value at once, as one serial write, and waits for all
+        the acknowledgments. fan and spool are slider percentages; timer
+        is the shutdown timer in seconds.
+    {"ramp": 160, "rate": 5}
+        Moves the set temperature to 160 °C at 5 °C/s.
+    {"hold": 2, "for": 30, "timeout": 900}
+        Waits until the temperature has stayed within ±2 °C of the set
+        temperature (or of "target") for 30 s. Fails after timeout seconds.
+    {"wait": 10}
+        Waits 10 seconds.
+
+Recipe files are JSON: {"name": "PP", "steps": [...]}. The runner works
+from a heap of timers on a single thread, and telemetry wakes up steps that
+are waiting on a temperature. A failed or cancelled recipe leaves the
+machine at its last settings.
+
+    python -m pultrusion.recipes COM3 recipes/pp_ramp.json
+"""
+import heapq
+import itertools
+import json
+import logging
+import os
+import time
+from concurrent.futures import Future
+from threading import Condition, Thread
+
+from pultrusion.coalescer import FIRMWARE_CHANNELS
+from pultrusion.dispatcher import value_ack
+from pultrusion.machine import speed_to_pwm
+from pultrusion.protocol import SetTemperatureAck, TelemetrySample, parse_line
+
+log = logging.getLogger(__name__)
+
+ACK_TIMEOUT = 5.0         # s per acknowledgment; the firmware beeps ~0.6 s per command
+RAMP_INTERVAL = 1.0       # s between set point updates while ramping
+TELEMETRY_TIMEOUT = 10.0  # s to wait for the first telemetry sample
+
+_CHANNELS = {spec.name: spec for spec in FIRMWARE_CHANNELS}
+# Recipe keys -> (coalescer channel, conversion to the firmware value)
+SETTINGS = {
+    "temperature": ("temperature", int),
+    "fan": ("fan", speed_to_pwm),
+    "spool": ("winder", speed_to_pwm),
+    "timer": ("timer", int),
+}
+
+
+# ---------------------------
+# Steps
+# ---------------------------
+class SetStep:
+    kind = "set"
+
+    def __init__(self, values):
+        unknown = set(values) - set(SETTINGS)
+        if unknown or not values:
+            raise ValueError(f"set needs some of {', '.join(SETTINGS)}; got {', '.join(unknown) or 'nothing'}")
+        self.values = {key: float(value) for key, value in values.items()}
+
+    def commands(self):
+        """(command, expected ack) for every value, in SETTINGS order."""
+        requests = []
+        for key, (channel, convert) in SETTINGS.items():
+            if key in self.values:
+                spec = _CHANNELS[channel]
+                value = convert(self.values[key])
+                requests.append((spec.command.format(value), value_ack(spec.expect.format(value))))
+        return requests
+
+    def describe(self):
+        return "set " + ", ".join(f"{key} {value:g}" for key, value in self.values.items())
+
+
+class RampStep:
+    kind = "ramp"
+
+    def __init__(self, target, rate):
+        self.target = int(target)
+        self.rate = float(rate)
+        if self.rate <= 0:
+            raise ValueError("ramp rate must be positive")
+
+    def describe(self):
+        return f"ramp to {self.target} °C at {self.rate:g} °C/s"
+
+
+class HoldStep:
+    kind = "hold"
+
+    def __init__(self, within, seconds, timeout=None, target=None):
+        self.within = float(within)
+        self.seconds = float(seconds)
+        self.timeout = float(timeout) if timeout is not None else None
+        self.target = float(target) if target is not None else None
+
+    def describe(self):
+        target = f"{self.target:g} °C" if self.target is not None else "the set point"
+        return f"hold within ±{self.within:g} °C of {target} for {self.seconds:g} s"
+
+
+class WaitStep:
+    kind = "wait"
+
+    def __init__(self, seconds):
+        self.seconds = float(seconds)
+
+    def describe(self):
+        return f"wait {self.seconds:g} s"
+
+
+def parse_step(data):
+    if not isinstance(data, dict):
+        raise ValueError(f"a step must be an object, not {data!r}")
+    if "set" in data:
+        return SetStep(data["set"])
+    if "ramp" in data:
+        return RampStep(data["ramp"], data.get("rate", 1.0))
+    if "hold" in data:
+        return HoldStep(data["hold"], data.get("for", 0.0), data.get("timeout"), data.get("target"))
+    if "wait" in data:
+        return WaitStep(data["wait"])
+    raise ValueError(f"unknown step {data!r}")
+
+
+class Recipe:
+    def __init__(self, name, steps):
+        self.name = name
+        self.steps = list(steps)
+
+    def __repr__(self):
+        return f"Recipe({self.name!r}, {len(self.steps)} steps)"
+
+    @classmethod
+    def from_dict(cls, data, default_name="recipe"):
+        steps = []
+        for i, step in enumerate(data.get("steps", [])):
+            try:
+                steps.append(parse_step(step))
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"step {i + 1}: {e}") from None
+        if not steps:
+            raise ValueError("the recipe has no steps")
+        return cls(data.get("name", default_name), steps)
+
+    @classmethod
+    def load(cls, path):
+        """Reads a JSON recipe file; raises ValueError if it is malformed."""
+        with open(path, "r") as file:
+            try:
+                data = json.load(file)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}: {e}") from None
+        name = os.path.splitext(os.path.basename(path))[0]
+        return cls.from_dict(data, default_name=name)
+
+
+# ---------------------------
+# Scheduler
+# ---------------------------
+class Timer:
+    __slots__ = ("when", "seq", "callback", "args", "cancelled")
+
+    def __init__(self, when, seq, callback, args):
+        self.when = when
+        self.seq = seq
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.when, self.seq) < (other.when, other.seq)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler:
+    """
+    Timers kept in a heap ordered by due time, run one at a time on a
+    single thread. Callbacks therefore never race each other, and they
+    must not block. Timers due at the same moment run in the order they
+    were added.
+    """
+
+    def __init__(self, name="recipe-scheduler"):
+        self.name = name
+        self._heap = []
+        self._seq = itertools.count()
+        self._condition = Condition()
+        self._thread = None
+        self._stopping = False
+
+    def call_at(self, when, callback, *args):
+        """Runs callback(*args) at time.monotonic() == when; returns a cancellable Timer."""
+        timer = Timer(when, next(self._seq), callback, args)
+        with self._condition:
+            heapq.heappush(self._heap, timer)
+            if self._heap[0] is timer:
+                self._condition.notify()
+        return timer
+
+    def call_later(self, delay, callback, *args):
+        return self.call_at(time.monotonic() + delay, callback, *args)
+
+    def call_soon(self, callback, *args):
+        return self.call_at(time.monotonic(), callback, *args)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._stopping:
+                        return
+                    now = time.monotonic()
+                    if self._heap and self._heap[0].when <= now:
+                        timer = heapq.heappop(self._heap)
+                        break
+                    self._condition.wait(self._heap[0].when - now if self._heap else None)
+            if timer.cancelled:
+                continue
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                log.error("Error in scheduled callback: %s", e)
+
+
+# ---------------------------
+# Runner
+# ---------------------------
+class RecipeRunner:
+    """
+    Runs one recipe at a time through a SerialDispatcher or
+    AsyncSerialBackend. run() returns a Future for the whole recipe.
+
+    progress(recipe, step_number, text) is called on the scheduler thread
+    as each step starts and must not block. Values are sent around the
+    machine's CommandCoalescer (to wait for each ack); pass it as coalescer
+    so it records them as requested and a reconnect resync keeps them.
+    """
+
+    def __init__(self, dispatcher, scheduler=None, progress=None, coalescer=None):
+        self.dispatcher = dispatcher
+        self.coalescer = coalescer
+        self.scheduler = scheduler or Scheduler()
+        self.progress = progress
+        self.recipe = None
+        self.step_number = 0
+        self.temperature = None
+        self.set_temperature = None
+        self._future = None
+        self._run_id = 0          # Callbacks from an earlier run or step are ignored
+        self._timers = []
+        self._on_sample = None    # The current step's telemetry handler
+
+    @property
+    def running(self):
+        return self._future is not None and not self._future.done()
+
+    def run(self, recipe):
+        if self.running:
+            raise RuntimeError(f"Recipe {self.recipe.name!r} is still running")
+        self.scheduler.start()
+        future = Future()
+        self._future = future
+        self.scheduler.call_soon(self._begin, recipe, future)
+        return future
+
+    def cancel(self):
+        self.scheduler.call_soon(self._finish, RuntimeError("Recipe cancelled"))
+
+    # ---------------------------
+    # Scheduler thread
+    # ---------------------------
+    def _begin(self, recipe, future):
+        self._run_id += 1
+        self.recipe = recipe
+        self.step_number = 0
+        self.temperature = None
+        self.set_temperature = None
+        self.dispatcher.subscribe(self._on_line)
+        self._report(f"Starting {recipe.name}: waiting for telemetry")
+        self._await_sample(self._first_sample, TELEMETRY_TIMEOUT, "No telemetry from the machine")
+
+    def _first_sample(self):
+        self._next_step()
+
+    def _next_step(self):
+        self._cancel_timers()
+        self._on_sample = None
+        self._run_id += 1
+        if self.step_number >= len(self.recipe.steps):
+            self._finish(None)
+            return
+        step = self.recipe.steps[self.step_number]
+        self.step_number += 1
+        self._report(step.describe())
+        getattr(self, "_begin_" + step.kind)(step, self._run_id)
+
+    def _finish(self, error):
+        future = self._future
+        if future is None or future.done():
+            return
+        self._cancel_timers()
+        self._on_sample = None
+        self._run_id += 1
+        self.dispatcher.unsubscribe(self._on_line)
+        if error is None:
+            self._report(f"{self.recipe.name} finished")
+            future.set_result(self.recipe)
+        else:
+            self._report(f"{self.recipe.name} stopped: {error}")
+            future.set_exception(error)
+
+    def _note_requested(self, channel, value):
+        if self.coalescer is not None:
+            self.coalescer.note_requested(channel, value)
+
+    # Set -------------------------------------------------------------
+    def _begin_set(self, step, run_id):
+        futures = self.dispatcher.submit_many(step.commands(), timeout=ACK_TIMEOUT)
+        for key, (channel, convert) in SETTINGS.items():
+            if key in step.values:
+                self._note_requested(channel, convert(step.values[key]))
+        remaining = [len(futures)]
+        if "temperature" in step.values:
+            self.set_temperature = int(step.values["temperature"])
+
+        def on_ack(future):
+            if run_id != self._run_id:
+                return
+            if future.exception() is not None:
+                self._finish(future.exception())
+                return
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                self._next_step()
+
+        for future in futures:
+            future.add_done_callback(lambda f: self.scheduler.call_soon(on_ack, f))
+
+    # Ramp ------------------------------------------------------------
+    def _begin_ramp(self, step, run_id):
+        start = self.set_temperature if self.set_temperature is not None else self.temperature
+        started_at = time.monotonic()
+        direction = 1 if step.target >= start else -1
+        # Telemetry keeps reporting the old set point until the ack, so track what was sent
+        sent = [int(round(start))]
+
+        def tick():
+            if run_id != self._run_id:
+                return
+            # The value follows the clock, so slow acks do not slow the ramp down
+            value = start + direction * step.rate * (time.monotonic() - started_at)
+            value = min(value, step.target) if direction > 0 else max(value, step.target)
+            value = int(round(value))
+            if value == sent[0]:
+                after_ack(None)
+                return
+            spec = _CHANNELS["temperature"]
+            future = self.dispatcher.submit(spec.command.format(value),
+                                            expect=value_ack(spec.expect.format(value)),
+                                            timeout=ACK_TIMEOUT)
+            self._note_requested("temperature", value)
+            sent[0] = value
+            future.add_done_callback(lambda f: self.scheduler.call_soon(after_ack, f))
+
+        def after_ack(future):
+            if run_id != self._run_id:
+                return
+            if future is not None and future.exception() is not None:
+                self._finish(future.exception())
+            elif sent[0] == step.target:
+                self._next_step()
+            else:
+                self._timers.append(self.scheduler.call_later(RAMP_INTERVAL, tick))
+
+        tick()
+
+    # Hold ------------------------------------------------------------
+    def _begin_hold(self, step, run_id):
+        since = [None]
+
+        def on_sample():
+            target = step.target if step.target is not None else self.set_temperature
+            # Written so a NaN reading (disconnected thermistor) counts as out of band
+            if target is None or not abs(self.temperature - target) <= step.within:
+                since[0] = None
+                return
+            now = time.monotonic()
+            if since[0] is None:
+                since[0] = now
+            if now - since[0] >= step.seconds:
+                self._next_step()
+
+        self._on_sample = on_sample
+        if step.timeout is not None:
+            self._timers.append(self.scheduler.call_later(
+                step.timeout, self._step_timeout, run_id,
+                f"Temperature did not settle within {step.timeout:g} s"))
+
+    # Wait ------------------------------------------------------------
+    def _begin_wait(self, step, run_id):
+        self._timers.append(self.scheduler.call_later(step.seconds, self._step_done, run_id))
+
+    # Helpers ---------------------------------------------------------
+    def _step_done(self, run_id):
+        if run_id == self._run_id:
+            self._next_step()
+
+    def _step_timeout(self, run_id, message):
+        if run_id == self._run_id:
+            self._finish(TimeoutError(message))
+
+    def _await_sample(self, callback, timeout, message):
+        run_id = self._run_id
+
+        def on_sample():
+            self._on_sample = None
+            callback()
+
+        self._on_sample = on_sample
+        self._timers.append(self.scheduler.call_later(timeout, self._step_timeout, run_id, message))
+
+    def _cancel_timers(self):
+        for timer in self._timers:
+            timer.cancel()
+        self._timers = []
+
+    def _sample(self, temperature, set_temperature):
+        self.temperature = temperature
+        if set_temperature is not None:
+            self.set_temperature = set_temperature
+        if self._on_sample is not None:
+            self._on_sample()
+
+    def _report(self, text):
+        if self.progress is not None:
+            try:
+                self.progress(self.recipe, self.step_number, text)
+            except Exception as e:
+                log.error("Error in recipe progress callback: %s", e)
+
+    def _on_line(self, line, received_at):
+        # Serial thread: hand telemetry over to the scheduler thread
+        event = parse_line(line)
+        if isinstance(event, TelemetrySample) and event.temperature is not None:
+            self.scheduler.call_soon(self._sample, event.temperature, event.set_temperature)
+        elif isinstance(event, SetTemperatureAck):
+            self.scheduler.call_soon(setattr, self, "set_temperature", event.set_temperature)
+
+
+def main():
+    import argparse
+
+    from pultrusion.cli import run_recipe
+    from pultrusion.log import setup_logging, shutdown_logging
+    from pultrusion.machine import Machine
+
+    parser = argparse.ArgumentParser(description="Run a pultrusion recipe without the GUI.")
+    parser.add_argument("port", help="serial port, e.g. COM3 or /dev/ttyACM0")
+    parser.add_argument("recipe", help="JSON recipe file")
+    parser.add_argument("--baudrate", type=int, default=9600)
+    parser.add_argument("--settle", type=float, default=2.0, help="seconds to wait after opening the port")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+    setup_logging(args.log_level)
+
+    recipe = Recipe.load(args.recipe)
+    machine = Machine("recipe", args.port, baudrate=args.baudrate, store_capacity=0)
+    machine.open(settle_time=args.settle)
+    machine.start()
+    try:
+        status = run_recipe(machine, recipe)
+    finally:
+        machine.close()
+        shutdown_logging()
+    raise SystemExit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""
+Compact run recorder and memory-mapped reader.
+
+A run file is a 64-byte header followed by 32-byte slots. Most slots are
+records (telemetry, outbound commands, firmware events); after every
+INDEX_EVERY records an index slot summarises the chunk before it. Record
+times never decrease, so the reader can binary-search any time range of
+a memory-mapped multi-day log without loading it.
+"""
+import mmap
+import os
+import struct
+import time
+from threading import Lock
+
+import numpy as np
+
+from pultrusion import protocol
+
+MAGIC = b"PULTREC1"
+VERSION = 1
+HEADER = struct.Struct("<8sHHId40x")       # magic, version, slot size, index interval, created
+RECORD = struct.Struct("<dBBHffff4x")      # time, kind, code, flags, v0..v3
+HEADER_SIZE = HEADER.size
+RECORD_SIZE = RECORD.size
+INDEX_EVERY = 1024
+
+RECORD_DTYPE = np.dtype([
+    ("t", "<f8"), ("kind", "u1"), ("code", "u1"), ("flags", "<u2"),
+    ("v0", "<f4"), ("v1", "<f4"), ("v2", "<f4"), ("v3", "<f4"), ("pad", "V4"),
+])
+
+# Record kinds
+TELEMETRY = 1   # v0 temperature, v1 set temperature, v2 SSR (0/1)
+COMMAND = 2     # code from COMMAND_CODES, v0 value
+EVENT = 3       # code from EVENT_CODES, fields in v0..v3
+INDEX = 255     # t = last record time, flags = records, v0 = chunk duration,
+                # v1/v2 = min/max temperature, v3 = telemetry samples with SSR on
+
+COMMAND_CODES = {"SET_TEMP": 1, "SET_FAN_PWM": 2, "SET_WINDER_PWM": 3,
+                 "SET_SHUTDOWN_TIME": 4, "EJECT": 5, "CANCEL_SHUTDOWN": 6}
+COMMAND_NAMES = {code: name for name, code in COMMAND_CODES.items()}
+
+# Event class -> (code, fields stored in v0..v3)
+EVENT_FIELDS = {
+    protocol.SetTemperatureAck: (1, ("set_temperature",)),
+    protocol.FanState: (2, ("on", "pwm")),
+    protocol.WinderState: (3, ("on", "pwm")),
+    protocol.ShutdownScheduled: (4, ("seconds",)),
+    protocol.ShutdownProgress: (5, ("elapsed_ms", "target_ms")),
+    protocol.ShutdownElapsed: (6, ("temperature",)),
+    protocol.ShutdownStarted: (7, ()),
+    protocol.CoolingComplete: (8, ()),
+    protocol.EjectAdjusted: (9, ("old_set_temperature", "set_temperature")),
+    protocol.EmergencyStop: (10, ("source",)),
+    protocol.SystemRestarted: (11, ()),
+    protocol.StartupTemperature: (12, ("temperature",)),
+    protocol.ShutdownCancelled: (13, ()),
+}
+EVENT_CLASSES = {code: (cls, fields) for cls, (code, fields) in EVENT_FIELDS.items()}
+
+
+def _encode_field(value):
+    if value is None:
+        return float("nan")
+    if isinstance(value, str):      # EmergencyStop.source
+        return 1.0 if value == "switch" else 0.0
+    return float(value)
+
+
+def _decode_fields(cls, fields, values):
+    args = []
+    for name, value in zip(fields, values):
+        if name == "on":
+            args.append(bool(value))
+        elif name == "source":
+            args.append("switch" if value else "firmware")
+        elif name in ("temperature",):
+            args.append(float(value))
+        elif np.isnan(value):
+            args.append(None)
+        else:
+            args.append(int(value))
+    return cls(*args)
+
+
+def encode_event(event):
+    """(kind, code, values) of the record for a parsed event, or None for text-only events."""
+    if isinstance(event, protocol.TelemetrySample):
+        return TELEMETRY, 0, (event.temperature, event.set_temperature, 1.0 if event.ssr_on else 0.0)
+    spec = EVENT_FIELDS.get(type(event))
+    if spec is None:
+        return None
+    code, fields = spec
+    return EVENT, code, tuple(_encode_field(getattr(event, f)) for f in fields)
+
+
+def encode_command(command):
+    """(kind, code, values) of the record for an outbound command such as "SET_TEMP:160"."""
+    name, _, value = command.partition(":")
+    try:
+        value = float(value) if value else float("nan")
+    except ValueError:
+        value = float("nan")
+    return COMMAND, COMMAND_CODES.get(name.upper(), 0), (value,)
+
+
+# -------------------------------------------------
+# Writing
+# -------------------------------------------------
+class RunRecorder:
+    """
+    Appends records for one session to `directory`, rotating to a new file
+    once the current one reaches max_bytes. Files are named
+    run-<session start>-<part>.plr so a session sorts together.
+
+    Record times are wall-clock seconds, but they advance with
+    time.monotonic() from when the recorder was created, so adjusting the
+    system clock cannot make them go backwards. Explicit times earlier
+    than the last record are raised to it.
+    """
+
+    def __init__(self, directory="runs", max_bytes=64 * 1024 * 1024, flush_interval=1.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.session = time.strftime("%Y%m%d-%H%M%S")
+        self.part = 0
+        self.path = None
+        self._file = None
+        self._size = 0
+        self._lock = Lock()
+        self._last_flush = 0.0
+        self._last_t = float("-inf")
+        self._wall_start = time.time()
+        self._monotonic_start = time.monotonic()
+        self._reset_chunk()
+
+    # ---------------------------
+    # Public API
+    # ---------------------------
+    def record_event(self, event, t=None):
+        """Records a parsed firmware event; text-only events are skipped."""
+        record = encode_event(event)
+        if record is not None:
+            kind, code, values = record
+            self._write(self.now() if t is None else t, kind, code, *values)
+
+    def record_command(self, command, t=None):
+        """Records an outbound command such as "SET_TEMP:160"."""
+        kind, code, values = encode_command(command)
+        self._write(self.now() if t is None else t, kind, code, *values)
+
+    def now(self):
+        """The time a record written now gets; see the class docstring."""
+        return self._wall_start + (time.monotonic() - self._monotonic_start)
+
+    def flush(self):
+        with self._lock:
+            if self._file:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    # ---------------------------
+    # Internals
+    # ---------------------------
+    def _reset_chunk(self):
+        self._chunk_records = 0
+        self._chunk_first = None
+        self._chunk_min = float("inf")
+        self._chunk_max = float("-inf")
+        self._chunk_ssr_on = 0
+
+    def _open_next(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f"run-{self.session}-{self.part:03d}.plr")
+        self.part += 1
+        self._file = open(self.path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, RECORD_SIZE, INDEX_EVERY, time.time()))
+        self._size = HEADER_SIZE
+        self._reset_chunk()
+
+    def _write(self, t, kind, code, v0=float("nan"), v1=float("nan"), v2=float("nan"), v3=float("nan")):
+        with self._lock:
+            if t < self._last_t:
+                t = self._last_t    # RunReader binary-searches on time
+            self._last_t = t
+            if self._file is None or self._size >= self.max_bytes:
+                if self._file is not None:
+                    self._file.close()
+                self._open_next()
+            self._file.write(RECORD.pack(t, kind, code, 0, v0, v1, v2, v3))
+            self._size += RECORD_SIZE
+
+            if self._chunk_first is None:
+                self._chunk_first = t
+            self._chunk_records += 1
+            if kind == TELEMETRY:
+                if v0 < self._chunk_min:
+                    self._chunk_min = v0
+                if v0 > self._chunk_max:
+                    self._chunk_max = v0
+                if v2:
+                    self._chunk_ssr_on += 1
+
+            if self._chunk_records == INDEX_EVERY:
+                self._file.write(RECORD.pack(t, INDEX, 0, self._chunk_records, t - self._chunk_first,
+                                             self._chunk_min, self._chunk_max, self._chunk_ssr_on))
+                self._size += RECORD_SIZE
+                self._reset_chunk()
+                self._file.flush()
+                self._last_flush = time.monotonic()
+            elif time.monotonic() - self._last_flush >= self.flush_interval:
+                self._file.flush()
+                self._last_flush = time.monotonic()
+
+
+# -------------------------------------------------
+# Reading
+# -------------------------------------------------
+class RunReader:
+    """
+    Memory-maps one run file. slots/records are NumPy views of RECORD_DTYPE;
+    pages are only read from disk when touched.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < HEADER_SIZE:
+            self._file.close()
+            raise ValueError(f"{path} is not a run recording")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, slot_size, self.index_every, self.created = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or slot_size != RECORD_SIZE:
+            self.close()
+            raise ValueError(f"{path} is not a run recording")
+        # A crash can leave a torn last slot; ignore it.
+        count = (size - HEADER_SIZE) // RECORD_SIZE
+        self.slots = np.frombuffer(self._map, dtype=RECORD_DTYPE, count=count, offset=HEADER_SIZE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.slots = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    @property
+    def start_time(self):
+        return float(self.slots["t"][0]) if len(self.slots) else None
+
+    @property
+    def end_time(self):
+        return float(self.slots["t"][-1]) if len(self.slots) else None
+
+    def index(self):
+        """The index slots (one per full chunk), without scanning the records."""
+        step = self.index_every + 1
+        return self.slots[self.index_every::step]
+
+    def records(self, start=None, end=None, kinds=None):
+        """Records with start <= t < end (copies), index slots left out."""
+        times = self.slots["t"]
+        lo = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+        hi = len(times) if end is None else int(np.searchsorted(times, end, side="left"))
+        window = self.slots[lo:hi]
+        keep = window["kind"] != INDEX
+        if kinds is not None:
+            keep &= np.isin(window["kind"], kinds)
+        return window[keep]
+
+    def telemetry(self, start=None, end=None):
+        """Telemetry columns for a time range as a dict of arrays."""
+        rows = self.records(start, end, kinds=[TELEMETRY])
+        return {"time": rows["t"], "temperature": rows["v0"],
+                "set_temperature": rows["v1"], "ssr": rows["v2"]}
+
+
+def record_to_line(record):
+    """
+    Rebuilds the firmware line for a recorded telemetry or event record.
+    Outbound commands and index slots return None.
+    """
+    kind = record["kind"]
+    if kind == TELEMETRY:
+        return protocol.TelemetrySample(float(record["v0"]), int(record["v1"]),
+                                        bool(record["v2"])).to_line()
+    if kind == EVENT:
+        spec = EVENT_CLASSES.get(int(record["code"]))
+        if spec is not None:
+            cls, fields = spec
+            values = (record["v0"], record["v1"], record["v2"], record["v3"])
+            return _decode_fields(cls, fields, values).to_line()
+    return None
+
+
+def session_files(path):
+    """All files of the session that `path` belongs to, in order."""
+    directory, name = os.path.split(os.path.abspath(path))
+    prefix = name.rsplit("-", 1)[0] + "-"
+    return sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                  if f.startswith(prefix) and f.endswith(".plr"))
+
+
+# -------------------------------------------------
+# Replay
+# -------------------------------------------------
+def replay(paths, sink, speed=1.0, start=None, end=None, stop_event=None):
+    """
+    Feeds recorded firmware lines to sink(line, received_at) with the
+    original spacing divided by `speed` (speed <= 0 replays as fast as
+    possible). Returns the number of lines replayed.
+    """
+    count = 0
+    previous = None
+    for path in paths:
+        with RunReader(path) as reader:
+            for record in reader.records(start, end, kinds=[TELEMETRY, EVENT]):
+                if stop_event is not None and stop_event.is_set():
+                    return count
+                t = float(record["t"])
+                if previous is not None and speed > 0 and t > previous:
+                    delay = (t - previous) / speed
+                    if stop_event is not None:
+                        if stop_event.wait(delay):
+                            return count
+                    else:
+                        time.sleep(delay)
+                previous = t
+                line = record_to_line(record)
+                if line:
+                    sink(line, time.monotonic())
+                    count += 1
+    return count
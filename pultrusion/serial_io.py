@@ -0,0 +1,238 @@
+"""
+Serial link helpers for talking to the pultrusion Arduino.
+"""
+import logging
+import time
+
+import serial
+
+from pultrusion.protocol import verify_frame
+
+log = logging.getLogger(__name__)
+
+# The Arduino's serial receive buffer. The firmware reads one command per
+# loop() pass and beeps in between, so a batch of commands must fit in it.
+ARDUINO_RX_BUFFER = 64
+
+
+class LineReader:
+    """
+    Frames newline-terminated lines coming from the Arduino.
+
+    Everything waiting on the port is drained with a single read into one
+    reusable buffer, and every complete line in it is returned at once.
+    A trailing partial line stays buffered until its newline arrives.
+    """
+
+    def __init__(self, port=None, max_line_length=512, encoding="utf-8"):
+        self.port = port
+        self.max_line_length = max_line_length
+        self.encoding = encoding
+        self._buffer = bytearray()
+
+        # Counters
+        self.bytes_total = 0
+        self.lines_total = 0
+        self.dropped_partial_lines = 0
+        self.bytes_per_second = 0.0
+        self._rate_started = time.monotonic()
+        self._rate_bytes = 0
+
+    def read_lines(self, wait=False):
+        """
+        Reads whatever is waiting on the port and returns the complete lines.
+        With wait=True an empty port is waited on for up to port.timeout.
+        """
+        port = self.port
+        waiting = port.in_waiting
+        if waiting:
+            data = port.read(waiting)
+        elif wait:
+            data = port.read(1)
+            if data:
+                waiting = port.in_waiting
+                if waiting:
+                    data += port.read(waiting)
+        else:
+            data = b""
+        return self.feed(data)
+
+    def iter_lines(self, wait=False):
+        """Generator form of read_lines()."""
+        yield from self.read_lines(wait)
+
+    def feed(self, data):
+        """Adds raw bytes to the buffer and returns any complete lines."""
+        self._update_rate(len(data))
+        if not data:
+            return []
+
+        buffer = self._buffer
+        buffer += data
+        end = buffer.rfind(b"\n")
+        if end < 0:
+            if len(buffer) > self.max_line_length:
+                # No newline in sight: line noise or a lost terminator.
+                self.dropped_partial_lines += 1
+                buffer.clear()
+            return []
+
+        text = buffer[:end].decode(self.encoding, errors="ignore")
+        del buffer[:end + 1]
+
+        lines = [line.strip() for line in text.split("\n")]
+        lines = [line for line in lines if line]
+        self.lines_total += len(lines)
+        return lines
+
+    def reset(self):
+        """Discards any buffered partial line, e.g. after reopening the port."""
+        if self._buffer:
+            self.dropped_partial_lines += 1
+            self._buffer.clear()
+
+    def stats(self):
+        return {
+            "bytes_total": self.bytes_total,
+            "lines_total": self.lines_total,
+            "dropped_partial_lines": self.dropped_partial_lines,
+            "bytes_per_second": self.bytes_per_second,
+        }
+
+    def _update_rate(self, count):
+        self.bytes_total += count
+        self._rate_bytes += count
+        now = time.monotonic()
+        elapsed = now - self._rate_started
+        if elapsed >= 1.0:
+            self.bytes_per_second = self._rate_bytes / elapsed
+            self._rate_started = now
+            self._rate_bytes = 0
+
+
+class ArduinoController:
+    """
+    Owns the pyserial port to the Arduino and frames what it prints.
+    Compact-mode frames ("$...*HH") with a bad checksum are dropped and
+    counted in bad_frames instead of being passed on.
+
+    A read or write that fails (the USB cable was pulled, say) closes the
+    port, so is_connected() turns False and a supervisor can reconnect;
+    last_error says why.
+    """
+
+    def __init__(self):
+        self.arduino = None
+        self.port_name = None
+        self.last_error = None
+        self.reader = LineReader()
+        self.bad_frames = 0
+        self.bytes_sent = 0
+        self.commands_sent = 0
+
+    def connect(self, com_port, baudrate=9600, settle_time=2.0):
+        """
+        Opens the port; raises serial.SerialException on failure.
+        settle_time gives the Arduino time to initialize.
+        """
+        # Short timeout: a blocking read waits at most this long
+        self.arduino = serial.Serial(com_port, baudrate, timeout=0.1)
+        self.port_name = com_port
+        self.reader.port = self.arduino
+        self.reader.reset()
+        log.info("Connected to Arduino on %s at %s baud", com_port, baudrate)
+        if settle_time:
+            time.sleep(settle_time)  # Wait for Arduino to initialize
+
+    def send_data_to_arduino(self, command):
+        if self.arduino and self.arduino.is_open:
+            try:
+                data = (command + '\r\n').encode('utf-8')
+                self.arduino.write(data)
+                self.bytes_sent += len(data)
+                self.commands_sent += 1
+                log.debug("Sent to Arduino: %s", command)
+            except Exception as e:
+                self._port_lost(e)
+
+    def send_commands(self, commands):
+        """
+        Writes several commands with as few writes as possible: one per
+        ARDUINO_RX_BUFFER bytes, so a UART board's buffer cannot overflow.
+        """
+        if not (self.arduino and self.arduino.is_open):
+            return
+        chunk = bytearray()
+        try:
+            for command in commands:
+                data = (command + '\r\n').encode('utf-8')
+                if chunk and len(chunk) + len(data) > ARDUINO_RX_BUFFER:
+                    self.arduino.write(chunk)
+                    self.bytes_sent += len(chunk)
+                    chunk = bytearray()
+                chunk += data
+                self.commands_sent += 1
+            if chunk:
+                self.arduino.write(chunk)
+                self.bytes_sent += len(chunk)
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Sent to Arduino: %s", " | ".join(commands))
+        except Exception as e:
+            self._port_lost(e)
+
+    def is_connected(self):
+        return self.arduino is not None and self.arduino.is_open
+
+    @property
+    def baudrate(self):
+        return self.arduino.baudrate if self.arduino else None
+
+    def set_baudrate(self, baudrate):
+        """Reconfigures the open port; the Arduino must switch at the same time."""
+        self.arduino.baudrate = baudrate
+        self.reader.reset()  # Anything half-received is garbage at the new rate
+        log.info("Serial port %s now at %s baud", self.port_name, baudrate)
+
+    def fileno(self):
+        """The port's file descriptor, or None where pyserial has none (Windows)."""
+        try:
+            return self.arduino.fileno() if self.is_connected() else None
+        except (AttributeError, ValueError, serial.SerialException):
+            return None
+
+    def read_data_from_arduino(self, wait=False):
+        """Returns every complete line received since the last call."""
+        try:
+            lines = self.reader.read_lines(wait)
+        except Exception as e:
+            self._port_lost(e)
+            return []
+        for line in lines:
+            if line[0] == "$":
+                return self._check_frames(lines)
+        return lines
+
+    def close_connection(self):
+        if self.arduino:
+            self.arduino.close()
+            log.info("Closed serial connection.")
+
+    def _port_lost(self, error):
+        port, self.arduino = self.arduino, None
+        if port is None:
+            return  # Another thread got there first
+        self.last_error = str(error)
+        log.warning("Lost serial port %s: %s", self.port_name, error)
+        try:
+            port.close()
+        except Exception:
+            pass  # The device is gone; only the handle is left to release
+
+    def _check_frames(self, lines):
+        good = []
+        for line in lines:
+            if line[0] != "$" or verify_frame(line) is not None:
+                good.append(line)
+            else:
+                self.bad_frames += 1
+        return good
@@ -0,0 +1,565 @@
+"""
+Simulated pultrusion Arduino on a pseudo-terminal (Linux/macOS).
+
+Implements the same serial commands and prints the same lines as
+sketch_oct7a.ino, with a simple thermal model of the hotend under the
+firmware's bang-bang SSR control. PultrusionApp.py (or anything using
+ArduinoController) connects to the printed pty path like a real port.
+
+    python -m pultrusion.simulator --rate 1000 --speedup 10
+
+Type "estop" and Enter in the simulator's terminal to inject an
+emergency stop, "fault KIND" to inject one of FAULTS ("fault off" to
+clear it), "stats" for counters, "quit" to exit.
+"""
+import argparse
+import os
+import random
+import select
+import sys
+import time
+import tty
+from threading import Event, Thread
+
+from pultrusion.protocol import make_frame
+
+UPDATE_INTERVAL = 100                 # ms, as in the firmware
+SHUTOFF_TEMP_THRESHOLD = 30.0
+DEFAULT_SET_TEMPERATURE = 10          # Firmware default for an erased EEPROM
+DEFAULT_BAUD_RATE = 9600
+BAUD_CONFIRM_WINDOW = 3000            # ms before an unconfirmed baud change reverts
+SSR_WINDOW = 2000                     # ms, time-proportioning window in PID mode
+
+# Hardware faults ThermalModel can simulate (see pultrusion.anomaly)
+FAULTS = ("open_sensor", "stuck_sensor", "noisy_sensor", "welded_ssr", "heater_failure")
+
+
+class ThermalModel:
+    """
+    Two-node hotend model: the heater block is driven by the SSR and loses
+    heat to ambient (faster with the fan on); the thermistor follows the
+    block with its own lag, which is what makes bang-bang control overshoot.
+
+    fault is None or one of FAULTS: an open or stuck thermistor, one that
+    reads spikes, an SSR that heats whatever its input, or a heater that
+    gives no heat.
+    """
+
+    def __init__(self, ambient=22.0, heat_rate=2.5, loss_tau=180.0, sensor_tau=6.0,
+                 fan_loss=0.4, noise=0.15, seed=None):
+        self.ambient = ambient
+        self.heat_rate = heat_rate      # °C/s with the heater on
+        self.loss_tau = loss_tau        # s, block -> ambient
+        self.sensor_tau = sensor_tau    # s, block -> thermistor
+        self.fan_loss = fan_loss        # Extra loss at full fan, as a fraction
+        self.noise = noise
+        self.block = ambient
+        self.sensor = ambient
+        self.random = random.Random(seed)
+        self.fault = None
+        self._stuck_at = None
+
+    def set_fault(self, fault):
+        if fault is not None and fault not in FAULTS:
+            raise ValueError(f"Unknown fault: {fault}")
+        self.fault = None
+        self._stuck_at = self.read()
+        self.fault = fault
+
+    def step(self, dt, heater_on, fan_fraction=0.0):
+        if self.fault == "welded_ssr":
+            heater_on = True
+        elif self.fault == "heater_failure":
+            heater_on = False
+        loss = (self.block - self.ambient) / self.loss_tau * (1.0 + self.fan_loss * fan_fraction)
+        self.block += ((self.heat_rate if heater_on else 0.0) - loss) * dt
+        self.sensor += (self.block - self.sensor) * min(1.0, dt / self.sensor_tau)
+
+    def read(self):
+        if self.fault == "open_sensor":
+            return -273.15
+        if self.fault == "stuck_sensor":
+            return self._stuck_at
+        reading = self.sensor + self.random.gauss(0.0, self.noise)
+        if self.fault == "noisy_sensor" and self.random.random() < 0.2:
+            reading += self.random.choice((-1, 1)) * self.random.uniform(30.0, 80.0)
+        return reading
+
+
+class FakeArduino:
+    """
+    The firmware's loop() running against a pty.
+
+    telemetry_hz is the real-time rate of "Current Temperature" lines
+    (default: the firmware's 10 Hz scaled by speedup). speedup scales the
+    simulated clock used by the thermal model and the shutdown/cooling timers.
+    """
+
+    def __init__(self, telemetry_hz=None, speedup=1.0, beep_delay=False, model=None, eeprom=None):
+        self.speedup = speedup
+        self.telemetry_hz = telemetry_hz or (1000.0 / UPDATE_INTERVAL) * speedup
+        self.beep_delay = beep_delay    # Simulate the blocking beep() per command
+        self.model = model or ThermalModel()
+        self.eeprom = eeprom if eeprom is not None else {}
+
+        self.master = None
+        self.slave = None
+        self.port_name = None
+        self._thread = None
+        self._stop = Event()
+        self._inbox = b""
+        self._injected = []
+
+        # Counters
+        self.lines_sent = 0
+        self.bytes_sent = 0
+        self.lines_dropped = 0          # Writes the host did not drain in time
+        self.commands_received = 0
+
+        self._restore_settings()
+
+    # ---------------------------
+    # Lifecycle
+    # ---------------------------
+    def open(self):
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.port_name = os.ttyname(self.slave)
+        return self.port_name
+
+    def start(self):
+        if self.master is None:
+            self.open()
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name="fake-arduino", daemon=True)
+        self._thread.start()
+        return self.port_name
+
+    def halt(self):
+        """Stops the firmware loop but keeps the pty open, so the host can drain it."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(2.0)
+            self._thread = None
+
+    def stop(self):
+        self.halt()
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                os.close(fd)
+        self.master = self.slave = None
+
+    def replug(self):
+        """
+        Acts as if the USB cable were pulled and plugged back in: the open
+        port goes away, the board resets from EEPROM and comes back on a
+        new pty. Returns the new port name.
+        """
+        self.stop()
+        self._inbox = b""
+        self._restore_settings()
+        return self.start()
+
+    def inject_emergency_stop(self):
+        """Acts as if the inductive switch had been triggered."""
+        self._injected.append("estop")
+
+    def inject_fault(self, fault):
+        """Starts one of FAULTS in the thermal model; None clears it."""
+        self.model.set_fault(fault)
+
+    def stats(self):
+        return {
+            "lines_sent": self.lines_sent,
+            "bytes_sent": self.bytes_sent,
+            "lines_dropped": self.lines_dropped,
+            "commands_received": self.commands_received,
+            "set_temperature": self.set_temperature,
+            "temperature": round(self.model.sensor, 2),
+        }
+
+    # ---------------------------
+    # Simulated Arduino API
+    # ---------------------------
+    def millis(self):
+        return int((time.monotonic() - self._started) * self.speedup * 1000)
+
+    def println(self, text=""):
+        data = (text + "\r\n").encode("utf-8")
+        try:
+            written = os.write(self.master, data)
+        except BlockingIOError:
+            written = 0
+        except OSError:
+            return
+        if written < len(data):
+            # USB CDC drops what the host does not read in time
+            self.lines_dropped += 1
+            return
+        if text:
+            self.lines_sent += 1  # Blank lines never reach the host's subscribers
+        self.bytes_sent += written
+
+    def beep(self):
+        if self.beep_delay:
+            time.sleep(0.6 / self.speedup)
+
+    # ---------------------------
+    # Firmware logic (mirrors sketch_oct7a.ino)
+    # ---------------------------
+    def _restore_settings(self):
+        self.fan_switch = self.eeprom.get("fan_switch", 0)
+        self.fan_pwm = self.eeprom.get("fan_pwm", 0)
+        self.winder_switch = self.eeprom.get("winder_switch", 0)
+        self.winder_pwm = self.eeprom.get("winder_pwm", 0)
+        self.set_temperature = self.eeprom.get("set_temperature", DEFAULT_SET_TEMPERATURE)
+        self.ssr_on = False
+        self.shutdown_scheduled = False
+        self.shutoff_time = 0
+        self.shutoff_start = 0
+        self.shutdown_active = False
+        self.cooling = False
+        self.cooling_start = 0
+        self.compact_telemetry = False
+        self.baud_rate = DEFAULT_BAUD_RATE
+        self.previous_baud_rate = DEFAULT_BAUD_RATE
+        self.baud_change_pending = False
+        self.baud_change_time = 0
+        self.pid_kp, self.pid_ki, self.pid_kd = self.eeprom.get("pid_gains", (0.0, 0.0, 0.0))
+        self.pid_mode = "pid_gains" in self.eeprom and self.eeprom.get("control_mode") == 1
+        self.pid_integral = 0.0
+        self.pid_last_temp = None
+        self.heater_output = 0.0
+        self.ssr_window_start = 0
+
+    def _setup(self):
+        self._started = time.monotonic()
+        self.println()
+        self.println("=== System (Re)Started! ===")
+        self.println("Settings restored from EEPROM.")
+        start_temp = self.model.read()
+        self.println(f"Startup Temperature Reading: {start_temp:.2f} °C")
+        self._control_temperature(start_temp)
+
+    def _control_temperature(self, current):
+        if not self.pid_mode:
+            self.ssr_on = current < self.set_temperature
+            return
+        dt = UPDATE_INTERVAL / 1000.0
+        if self.set_temperature <= 0 or current != current:
+            self.pid_integral = 0.0
+            self.heater_output = 0.0
+            self.pid_last_temp = current
+            return
+        error = self.set_temperature - current
+        derivative = 0.0 if self.pid_last_temp is None else -(current - self.pid_last_temp) / dt
+        self.pid_last_temp = current
+        proportional = self.pid_kp * error + self.pid_kd * derivative
+        integral = min(1.0, max(0.0, self.pid_integral + self.pid_ki * error * dt))
+        if 0.0 < proportional + integral < 1.0:
+            self.pid_integral = integral   # Anti-windup, as in the firmware
+        self.heater_output = min(1.0, max(0.0, proportional + self.pid_integral))
+
+    def _update_ssr(self):
+        now = self.millis()
+        if now - self.ssr_window_start >= SSR_WINDOW:
+            self.ssr_window_start += SSR_WINDOW * ((now - self.ssr_window_start) // SSR_WINDOW)
+        self.ssr_on = (now - self.ssr_window_start) < self.heater_output * SSR_WINDOW
+
+    def _set_control_mode(self, pid):
+        self.pid_mode = pid
+        self.pid_integral = 0.0
+        self.pid_last_temp = None
+        self.heater_output = 0.0
+        self.ssr_window_start = self.millis()
+        self.eeprom["control_mode"] = 1 if pid else 0
+        self.println(f"Control mode: {'PID' if pid else 'BANGBANG'}")
+
+    def _fan_fraction(self):
+        # The fan driver is inverted: PWM 1 is full speed, 255 the slowest
+        if not self.fan_switch or self.fan_pwm <= 0:
+            return 0.0
+        return (256 - self.fan_pwm) / 255.0
+
+    def _turn_fan_on(self, pwm):
+        self.fan_switch, self.fan_pwm = 1, pwm
+        self.eeprom.update(fan_switch=1, fan_pwm=pwm)
+        self.println(f"turnFanOn(): FanSwitch set HIGH, PWM = {pwm}")
+
+    def _turn_fan_off(self):
+        self.fan_switch, self.fan_pwm = 0, 0
+        self.eeprom.update(fan_switch=0, fan_pwm=0)
+        self.println("turnFanOff(): FanSwitch set LOW, PWM = 0")
+
+    def _handle_command(self, command):
+        command = command.strip()
+        if self.shutdown_active:
+            self.println("Shutdown in progress: Command ignored.")
+            return
+
+        if command.upper() == "EJECT":
+            self.println("DEBUG: EJECT command branch entered.")
+            old = self.set_temperature
+            self.set_temperature = self.set_temperature - 30 if self.set_temperature >= 30 else 0
+            self.println(f"EJECT command received. Adjusted setTemperature from {old} to {self.set_temperature}")
+            self.eeprom["set_temperature"] = self.set_temperature
+            self.beep()
+            return
+
+        if command == "PING":
+            self.baud_change_pending = False
+            self.println("PONG")
+
+        if command == "STATUS":
+            self.println(f"Status: Set Temperature: {self.set_temperature} °C"
+                         f" | Fan: {'ON' if self.fan_switch else 'OFF'} (PWM {self.eeprom.get('fan_pwm', 0)})"
+                         f" | Winder: {'ON' if self.winder_switch else 'OFF'} (PWM {self.eeprom.get('winder_pwm', 0)})"
+                         f" | Control: {'PID' if self.pid_mode else 'BANGBANG'}")
+
+        if command == "TELEMETRY:COMPACT":
+            self.compact_telemetry = True
+            self.println("Telemetry mode: COMPACT")
+        elif command == "TELEMETRY:TEXT":
+            self.compact_telemetry = False
+            self.println("Telemetry mode: TEXT")
+
+        if command.startswith("BAUD:"):
+            # A pty carries any rate, so the change always "works" here
+            baud_rate = _to_int(command[5:])
+            if 1200 <= baud_rate <= 1000000:
+                self.println(f"Baud rate changing to {baud_rate}")
+                self.previous_baud_rate, self.baud_rate = self.baud_rate, baud_rate
+                self.baud_change_pending = True
+                self.baud_change_time = time.monotonic()  # Real time: the host's timeouts are
+            else:
+                self.println("Invalid baud rate received.")
+
+        if command.startswith("PID:"):
+            try:
+                kp, ki, kd = (float(value) for value in command[4:].split(","))
+            except ValueError:
+                self.println("Invalid PID gains received.")
+            else:
+                self.pid_kp, self.pid_ki, self.pid_kd = kp, ki, kd
+                self.eeprom["pid_gains"] = (kp, ki, kd)
+                self.pid_integral = 0.0
+                self.println(f"PID gains set to Kp={kp:.5f} Ki={ki:.5f} Kd={kd:.5f}")
+
+        if command == "CONTROL:PID":
+            self._set_control_mode(True)
+        elif command == "CONTROL:BANGBANG":
+            self._set_control_mode(False)
+
+        if command == "FAN_ON":
+            self._turn_fan_on(255)
+            self.println("FAN_ON command executed.")
+        elif command == "FAN_OFF":
+            self._turn_fan_off()
+            self.println("FAN_OFF command executed.")
+
+        if command.startswith("SET_FAN_PWM:"):
+            pwm = max(0, min(255, _to_int(command[12:])))
+            self.fan_switch, self.fan_pwm = int(pwm > 0), pwm
+            self.eeprom["fan_pwm"] = pwm
+            self.println(f"Fan PWM set to {pwm}")
+
+        if command.startswith("SET_WINDER_PWM:"):
+            pwm = max(0, min(255, _to_int(command[15:])))
+            self.winder_switch, self.winder_pwm = int(pwm > 0), pwm
+            self.eeprom["winder_pwm"] = pwm
+            self.println(f"Winder PWM set to {pwm}")
+
+        if command == "WINDER_ON":
+            self.winder_switch, self.winder_pwm = 1, 255
+            self.eeprom["winder_switch"] = 1
+            self.println("Winder Motor is ON")
+        elif command == "WINDER_OFF":
+            self.winder_switch, self.winder_pwm = 0, 0
+            self.eeprom["winder_switch"] = 0
+            self.println("Winder Motor is OFF")
+
+        if command.startswith("SET_SHUTDOWN_TIME:"):
+            self.println("Received SET_SHUTDOWN_TIME")
+            seconds = _to_int(command.split(":", 1)[1])
+            if seconds > 0:
+                self.shutoff_time = seconds * 1000
+                self.shutoff_start = self.millis()
+                self.shutdown_scheduled = True
+                self.println(f"Shutdown scheduled in {seconds} seconds.")
+            else:
+                self.println("Invalid shutdown time received.")
+
+        if command == "CANCEL_SHUTDOWN":
+            self.shutdown_scheduled = False
+            self.println("Shutdown cancelled.")
+
+        if command.startswith("SET_TEMP:"):
+            value = _to_int(command[9:])
+            if value >= 0:
+                self.set_temperature = value
+                self.eeprom["set_temperature"] = value
+                self.println(f"Set Temperature updated to {value} °C")
+            else:
+                self.println("Invalid temperature value received.")
+
+    def _initiate_shutdown(self):
+        self.println("Initiating shutdown sequence.")
+        self.set_temperature = 0
+        self.eeprom["set_temperature"] = 0
+        self.println("Set Temperature set to 0 °C.")
+        self.shutdown_active = True
+        self.winder_switch, self.winder_pwm = 0, 0
+        self.println("Winder Motor turned OFF.")
+        self.fan_switch, self.fan_pwm = 1, 1
+        self.eeprom.update(fan_switch=1, fan_pwm=1)
+        self.println("Fan turned ON in cooling mode (PWM=1).")
+        self.cooling = True
+
+    def _emergency_stop(self):
+        self.println("Inductive Switch Pressed: Emergency Stop Activated!")
+        self.println("Emergency Stop Activated!")
+        self._turn_fan_off()
+        self.ssr_on = False
+        self.winder_switch, self.winder_pwm = 0, 0
+        self.eeprom["winder_pwm"] = 0
+        self.shutdown_scheduled = False
+        self.cooling = False
+
+    def _loop_once(self, now_ms):
+        while self._injected:
+            if self._injected.pop(0) == "estop":
+                self._emergency_stop()
+
+        if self.shutdown_scheduled:
+            elapsed = now_ms - self.shutoff_start
+            if now_ms - self._last_countdown >= 1000:
+                self.println(f"Shutdown countdown: {elapsed} ms elapsed (target: {self.shutoff_time} ms)")
+                self._last_countdown = now_ms
+            if elapsed >= self.shutoff_time:
+                self.shutdown_scheduled = False
+                self.println(f"Shutdown Timer Elapsed. Current Temperature: {self.model.read():.2f} °C")
+                self._initiate_shutdown()
+
+        if (self.baud_change_pending
+                and (time.monotonic() - self.baud_change_time) * 1000 > BAUD_CONFIRM_WINDOW):
+            self.baud_change_pending = False
+            self.baud_rate = self.previous_baud_rate
+            self.println(f"Baud change not confirmed, reverted to {self.baud_rate}")
+
+        if self.cooling:
+            if self.model.sensor < SHUTOFF_TEMP_THRESHOLD:
+                if self.cooling_start == 0:
+                    self.cooling_start = now_ms
+                if now_ms - self.cooling_start > 10000:
+                    self.println("Cooling complete. Turning off fan.")
+                    self._turn_fan_off()
+                    self.cooling = False
+                    self.cooling_start = 0
+                    self.beep()
+                    self.shutdown_active = False
+            else:
+                self.cooling_start = 0
+
+        if not self.shutdown_active:
+            for command in self._read_commands():
+                self.commands_received += 1
+                self.beep()
+                self.println(f"Received command: {command.strip()}")
+                self._handle_command(command)
+
+    def _telemetry(self):
+        current = self.model.read()
+        if self.compact_telemetry:
+            self.println(make_frame(f"T,{current:.2f},{self.set_temperature},{1 if self.ssr_on else 0}"))
+        else:
+            self.println(f"Current Temperature: {current:.2f} °C | Set Temperature: {self.set_temperature} °C"
+                         f" | SSR State: {'ON' if self.ssr_on else 'OFF'}")
+        self._control_temperature(current)
+
+    def _read_commands(self):
+        try:
+            self._inbox += os.read(self.master, 4096)
+        except (BlockingIOError, OSError):
+            pass
+        if b"\n" not in self._inbox:
+            return []
+        *lines, self._inbox = self._inbox.split(b"\n")
+        return [line.decode("utf-8", errors="ignore") for line in lines]
+
+    def _run(self):
+        self._setup()
+        self._last_countdown = 0
+        period = 1.0 / self.telemetry_hz
+        next_tick = time.monotonic()
+        last_ms = self.millis()
+        while not self._stop.is_set():
+            timeout = max(0.0, next_tick - time.monotonic())
+            readable, _, _ = select.select([self.master], [], [], timeout)
+            now_ms = self.millis()
+            self.model.step((now_ms - last_ms) / 1000.0, self.ssr_on, self._fan_fraction())
+            last_ms = now_ms
+            self._loop_once(now_ms)
+            if self.pid_mode:
+                self._update_ssr()
+            if time.monotonic() >= next_tick:
+                self._telemetry()
+                next_tick += period
+                if next_tick < time.monotonic() - 1.0:
+                    next_tick = time.monotonic()  # Don't try to catch up after a stall
+
+
+def _to_int(text):
+    """Arduino String.toInt(): leading integer, 0 if none."""
+    text = text.strip()
+    digits = ""
+    for i, char in enumerate(text):
+        if char.isdigit() or (i == 0 and char in "+-"):
+            digits += char
+        else:
+            break
+    try:
+        return int(digits)
+    except ValueError:
+        return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated pultrusion Arduino on a pty.")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="telemetry lines per second (default: 10 x speedup)")
+    parser.add_argument("--speedup", type=float, default=1.0, help="simulated time acceleration")
+    parser.add_argument("--beep", action="store_true", help="simulate the blocking beep per command")
+    parser.add_argument("--set-temp", type=int, default=DEFAULT_SET_TEMPERATURE,
+                        help="set temperature restored from the simulated EEPROM")
+    args = parser.parse_args()
+
+    arduino = FakeArduino(telemetry_hz=args.rate, speedup=args.speedup, beep_delay=args.beep,
+                          eeprom={"set_temperature": args.set_temp})
+    port = arduino.start()
+    print(f"Simulated Arduino on {port} ({arduino.telemetry_hz:g} lines/s, {args.speedup:g}x time)")
+    print(f"Commands: estop, fault {{{'|'.join(FAULTS)}|off}}, stats, quit")
+    try:
+        for line in sys.stdin:
+            command = line.strip().lower()
+            if command == "estop":
+                arduino.inject_emergency_stop()
+            elif command.startswith("fault"):
+                fault = command[len("fault"):].strip()
+                try:
+                    arduino.inject_fault(None if fault in ("", "off") else fault)
+                except ValueError as e:
+                    print(e)
+            elif command == "stats":
+                print(arduino.stats())
+            elif command in ("quit", "exit"):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(arduino.stats())
+        arduino.stop()
+
+
+if __name__ == "__main__":
+    main()
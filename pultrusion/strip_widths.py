@@ -0,0 +1,201 @@
+"""
+Named strip widths, kept in strip_widths.txt.
+
+The file keeps its original "name : width" format, one entry per line, so
+older versions of the app can still read it. Saving appends a line, and
+the last line for a name wins when the file is loaded. Once superseded
+lines outnumber live ones, the file is rewritten. A temporary file is
+written and then moved over the original, so a crash leaves either the
+old file or the new one.
+
+Batch helpers compute widths for many thicknesses at once with NumPy,
+taken from a "start:stop:step" sweep, a list, or a CSV file.
+"""
+import csv
+import os
+import tempfile
+
+import numpy as np
+
+# Example formula for width estimation: width = inner thickness * WIDTH_FACTOR
+WIDTH_FACTOR = 2.5
+MAX_BATCH = 100000          # Largest sweep accepted from the batch calculator
+COMPACT_MIN_STALE = 100     # Don't rewrite the file for a handful of stale lines
+
+
+def strip_width(thickness):
+    """Estimated width in mm; thickness may be a number or a NumPy array."""
+    return thickness * WIDTH_FACTOR
+
+
+def parse_thicknesses(text):
+    """
+    Thicknesses from "start:stop:step" (stop included) or a comma/space
+    separated list. Raises ValueError on bad input.
+    """
+    text = text.strip()
+    if ":" in text:
+        try:
+            start, stop, step = (float(part) for part in text.split(":"))
+        except ValueError:
+            raise ValueError("Use start:stop:step, e.g. 0.20:0.50:0.05") from None
+        if step <= 0 or stop < start:
+            raise ValueError("The sweep needs step > 0 and stop >= start")
+        count = int(np.floor((stop - start) / step + 1e-9)) + 1
+        if count > MAX_BATCH:
+            raise ValueError(f"The sweep has {count} steps; the limit is {MAX_BATCH}")
+        return start + step * np.arange(count)
+    values = np.array([float(part) for part in text.replace(",", " ").split()], dtype=float)
+    if len(values) == 0:
+        raise ValueError("No thicknesses given")
+    return values
+
+
+def read_thickness_csv(path):
+    """
+    Reads (names, thicknesses) from a CSV file. Rows are "thickness" or
+    "name,thickness"; a header row and blank rows are skipped. Names are
+    None for rows without one.
+    """
+    names = []
+    thicknesses = []
+    with open(path, newline="") as file:
+        for row in csv.reader(file):
+            row = [cell.strip() for cell in row if cell.strip()]
+            if not row:
+                continue
+            try:
+                thickness = float(row[-1])
+            except ValueError:
+                continue  # Header or comment
+            names.append(row[0] if len(row) > 1 else None)
+            thicknesses.append(thickness)
+    if not thicknesses:
+        raise ValueError(f"No thicknesses found in {path}")
+    return names, np.array(thicknesses, dtype=float)
+
+
+def _parse_line(line):
+    name, separator, width = line.rstrip("\n").rpartition(" : ")
+    if not separator or not name.strip():
+        raise ValueError(line)
+    return name.strip(), float(width)
+
+
+def _clean_name(name):
+    name = " ".join(str(name).split())  # No newlines in a line-based file
+    if not name:
+        raise ValueError("A strip needs a name")
+    return name
+
+
+class StripWidthStore:
+    """
+    Name -> width in mm, with O(1) lookup and upsert. Rows keep the order
+    in which names were first saved; row(i) gives the i-th (name, width)
+    for list views that only draw what is visible.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._widths = {}
+        self._names = []
+        self._lines = 0            # Lines in the file, stale ones included
+        self.skipped = 0           # Malformed lines ignored by load()
+
+    def load(self):
+        self._widths = {}
+        self._names = []
+        self._lines = 0
+        self.skipped = 0
+        if not os.path.exists(self.path):
+            return self
+        with open(self.path, "r") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                self._lines += 1
+                try:
+                    name, width = _parse_line(line)
+                except ValueError:
+                    self.skipped += 1
+                    continue
+                self._set(name, width)
+        self._compact_if_stale()
+        return self
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._widths
+
+    def __iter__(self):
+        return iter(self.items())
+
+    def get(self, name, default=None):
+        entry = self._widths.get(name)
+        return entry[0] if entry is not None else default
+
+    def index(self, name):
+        """Row of name (O(1)); raises KeyError if it is not saved."""
+        return self._widths[name][1]
+
+    def row(self, i):
+        name = self._names[i]
+        return name, self._widths[name][0]
+
+    def items(self):
+        return [(name, self._widths[name][0]) for name in self._names]
+
+    @property
+    def stale_lines(self):
+        return self._lines - len(self._names)
+
+    def upsert(self, name, width):
+        """Saves width under name, replacing any earlier width. Returns True if name was new."""
+        return self.upsert_many([(name, width)]) == 1
+
+    def upsert_many(self, entries):
+        """Saves (name, width) pairs with one file write; returns how many names were new."""
+        entries = [(_clean_name(name), float(width)) for name, width in entries]
+        added = 0
+        lines = []
+        for name, width in entries:
+            added += self._set(name, width)
+            lines.append(f"{name} : {width:.2f}\n")
+        with open(self.path, "a") as file:
+            file.writelines(lines)
+        self._lines += len(lines)
+        self._compact_if_stale()
+        return added
+
+    def compact(self):
+        """Rewrites the file with one line per name, atomically. Malformed lines are dropped."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(prefix=".strip_widths.", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as file:
+                file.writelines(f"{name} : {width:.2f}\n" for name, width in self.items())
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self._lines = len(self._names)
+
+    def _compact_if_stale(self):
+        if self.stale_lines >= max(COMPACT_MIN_STALE, len(self._names)):
+            self.compact()
+
+    def _set(self, name, width):
+        # Widths are stored rounded like the file, so reloading changes nothing
+        width = round(width, 2)
+        entry = self._widths.get(name)
+        if entry is not None:
+            self._widths[name] = (width, entry[1])
+            return 0
+        self._widths[name] = (width, len(self._names))
+        self._names.append(name)
+        return 1
@@ -0,0 +1,266 @@
+"""
+Reconnecting to the machine after the link drops.
+
+ConnectionSupervisor watches a dispatcher's controller. When the port is
+lost (a failed read or write closes it, see ArduinoController), it calls
+reconnect() with jittered exponential backoff until the machine answers
+again, then:
+
+1. sends the commands queued while offline (CommandQueue),
+2. asks the firmware for its settings with STATUS, which after a reset are
+   whatever EEPROM held and may not match the GUI,
+3. reconciles: policy "push" re-sends the values last requested through the
+   CommandCoalescer (only those that differ), policy "adopt" takes the
+   machine's values and reports them through on_adopt.
+
+Firmware without STATUS gets everything pushed again. Downtime and resync
+time are kept in stats().
+"""
+import logging
+import random
+import time
+from collections import deque
+from threading import Event, Lock, Thread
+
+from pultrusion.protocol import StatusReport, parse_line
+
+log = logging.getLogger(__name__)
+
+POLICIES = ("push", "adopt")
+
+
+class CommandQueue:
+    """
+    Commands sent while the port was down, oldest first. Bounded: once
+    maxlen commands are waiting, each new one drops the oldest.
+    """
+
+    def __init__(self, maxlen=32):
+        self._commands = deque(maxlen=maxlen)
+        self._lock = Lock()
+        self.dropped = 0
+
+    def append(self, command):
+        with self._lock:
+            if len(self._commands) == self._commands.maxlen:
+                self.dropped += 1
+            self._commands.append(command)
+
+    def drain(self):
+        """Removes and returns every queued command."""
+        with self._lock:
+            commands = list(self._commands)
+            self._commands.clear()
+        return commands
+
+    def __len__(self):
+        return len(self._commands)
+
+
+class ConnectionSupervisor:
+    """
+    backend is a SerialDispatcher or AsyncSerialBackend; its offline_queue
+    is set to a CommandQueue of queue_size. reconnect() is called on the
+    supervisor thread and returns a pultrusion.discovery.ProbeResult (or
+    None if the machine is not back yet). on_reconnect(result) runs after
+    the new controller is in place, before the resync, e.g. to renegotiate
+    the link; on_adopt(status) gets the StatusReport under policy "adopt";
+    on_state(state) sees every change of state ("waiting", "online",
+    "reconnecting", "resyncing", "stopped").
+
+    stale_after, if set, treats a port that stays silent that many seconds
+    as lost too (the firmware prints telemetry at 10 Hz).
+    """
+
+    def __init__(self, backend, reconnect, coalescer=None, policy="push", on_adopt=None,
+                 on_reconnect=None, on_state=None, base_delay=0.5, max_delay=30.0,
+                 stale_after=None, queue_size=32, status_timeout=3.0, poll_interval=0.25):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown resync policy {policy!r} (expected one of {POLICIES})")
+        self.backend = backend
+        self.reconnect = reconnect
+        self.coalescer = coalescer
+        self.policy = policy
+        self.on_adopt = on_adopt
+        self.on_reconnect = on_reconnect
+        self.on_state = on_state
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stale_after = stale_after
+        self.status_timeout = status_timeout
+        self.poll_interval = poll_interval
+        self.queue = CommandQueue(queue_size)
+        backend.offline_queue = self.queue
+        self.state = "waiting"          # Until the first connection is made elsewhere
+        self.last_status = None
+        self._last_line = None
+        self._lost_at = None
+        self._stop = Event()
+        self._thread = None
+
+        # Metrics
+        self.disconnects = 0
+        self.attempts = 0               # reconnect() calls, all outages together
+        self.last_downtime = None       # s from losing the port to having it back
+        self.total_downtime = 0.0
+        self.last_resync = None         # s from having the port back to state reconciled
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self.backend.subscribe(self._on_line)
+        self._thread = Thread(target=self._run, name="connection-supervisor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        self.backend.unsubscribe(self._on_line)
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self._set_state("stopped")
+
+    def backoff(self, attempt):
+        """Delay before reconnect attempt number attempt (0-based): exponential, jittered."""
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    def stats(self):
+        downtime = None
+        if self._lost_at is not None:
+            downtime = time.monotonic() - self._lost_at
+        return {
+            "state": self.state,
+            "disconnects": self.disconnects,
+            "attempts": self.attempts,
+            "downtime": downtime,
+            "last_downtime": self.last_downtime,
+            "total_downtime": self.total_downtime + (downtime or 0.0),
+            "last_resync": self.last_resync,
+            "queued": len(self.queue),
+            "dropped": self.queue.dropped,
+        }
+
+    # ---------------------------
+    # Supervisor thread
+    # ---------------------------
+    def _on_line(self, line, received_at):
+        self._last_line = received_at
+
+    def _set_state(self, state):
+        if state == self.state:
+            return
+        self.state = state
+        if self.on_state is not None:
+            try:
+                self.on_state(state)
+            except Exception as e:
+                log.error("Error in connection state callback: %s", e)
+
+    def _is_up(self):
+        controller = self.backend.controller
+        if not controller.is_connected():
+            return False
+        if self.stale_after is not None and self._last_line is not None:
+            if time.monotonic() - self._last_line > self.stale_after:
+                log.warning("No data for %g s; treating the port as lost.", self.stale_after)
+                controller.last_error = f"No data for {self.stale_after:g} s"
+                controller.close_connection()
+                return False
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self._is_up():
+                if self.state == "waiting":
+                    self._last_line = time.monotonic()
+                    # Commands sent before the first connection
+                    self._flush_queue()
+                    if self.coalescer is not None:
+                        self.coalescer.resume()
+                    self._set_state("online")
+                self._stop.wait(self.poll_interval)
+            elif self.state == "waiting":
+                self._stop.wait(self.poll_interval)
+            else:
+                self._recover()
+
+    def _recover(self):
+        self.disconnects += 1
+        self._lost_at = time.monotonic()
+        self._set_state("reconnecting")
+        log.warning("Lost the connection to the machine; reconnecting...")
+        attempt = 0
+        result = None
+        while not self._stop.is_set():
+            self.attempts += 1
+            try:
+                result = self.reconnect()
+            except Exception as e:
+                log.info("Reconnect attempt failed: %s", e)
+                result = None
+            if result is not None:
+                break
+            self._stop.wait(self.backoff(attempt))
+            attempt += 1
+        if result is None:
+            return  # Stopping
+
+        back_at = time.monotonic()
+        self.last_downtime = back_at - self._lost_at
+        self.total_downtime += self.last_downtime
+        self._lost_at = None
+        self._set_state("resyncing")
+        # Lines read while probing (the reset banner) go first
+        for line, received_at in result.lines:
+            self.backend.dispatch(line, received_at)
+        self._last_line = back_at
+        self.backend.set_controller(result.controller)
+        if self.on_reconnect is not None:
+            try:
+                self.on_reconnect(result)
+            except Exception as e:
+                log.error("Error in reconnect callback: %s", e)
+        self._flush_queue()
+        self._resync()
+        self.last_resync = time.monotonic() - back_at
+        log.info("Reconnected to %s after %.1f s (%d attempts), resynced in %.2f s",
+                 result.port, self.last_downtime, attempt + 1, self.last_resync)
+        self._set_state("online")
+
+    def _flush_queue(self):
+        commands = self.queue.drain()
+        if commands:
+            self.backend.send_many(commands)
+
+    def _read_status(self):
+        future = self.backend.submit("STATUS", expect="Status: ", timeout=self.status_timeout)
+        try:
+            event = parse_line(future.result(self.status_timeout + 1.0))
+        except Exception:
+            return None  # Firmware without STATUS, or the port dropped again
+        return event if isinstance(event, StatusReport) else None
+
+    def _resync(self):
+        status = self.last_status = self._read_status()
+        adopt = status is not None and self.policy == "adopt"
+        coalescer = self.coalescer
+        if coalescer is not None:
+            if status is None:
+                log.warning("Firmware did not report its settings; sending them all again.")
+                coalescer.forget()
+            else:
+                coalescer.observe(status)
+            if adopt:
+                coalescer.adopt_known()
+            else:
+                # Only values that differ from what the machine reported are sent
+                for channel, value in coalescer.requested().items():
+                    coalescer.set(channel, value)
+            coalescer.resume()
+        if adopt and self.on_adopt is not None:
+            try:
+                self.on_adopt(status)
+            except Exception as e:
+                log.error("Error in adopt callback: %s", e)
@@ -0,0 +1,232 @@
+"""
+Fixed-memory telemetry history.
+
+Samples live in preallocated NumPy columns used as a ring buffer, so a
+24-hour run costs the same memory as a 5-minute one. Queries return the
+last N seconds, or that window decimated to K points for charting.
+"""
+import time
+from threading import Lock
+
+import numpy as np
+
+from pultrusion.protocol import FanState, SetTemperatureAck, TelemetrySample, WinderState
+
+COLUMNS = ("temperature", "set_temperature", "ssr", "fan_pwm", "winder_pwm")
+
+DEFAULT_CAPACITY = 24 * 60 * 60 * 10  # 24 hours at the firmware's 10 Hz
+
+
+class TelemetryStore:
+    """
+    Ring buffer of telemetry samples.
+
+    Every row holds a timestamp plus the COLUMNS. Fan and winder PWM are not
+    part of the firmware's telemetry line, so the last acknowledged values
+    are carried forward into each new row (NaN until first known).
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._time = np.zeros(capacity, dtype=np.float64)
+        self._columns = {name: np.full(capacity, np.nan, dtype=np.float32) for name in COLUMNS}
+        self._head = 0    # Next physical row to write
+        self._count = 0
+        self._lock = Lock()
+
+        self.fan_pwm = np.nan
+        self.winder_pwm = np.nan
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def nbytes(self):
+        return self._time.nbytes + sum(column.nbytes for column in self._columns.values())
+
+    # ---------------------------
+    # Writing
+    # ---------------------------
+    def append(self, t, temperature, set_temperature, ssr_on):
+        with self._lock:
+            i = self._head
+            self._time[i] = t
+            columns = self._columns
+            columns["temperature"][i] = temperature
+            columns["set_temperature"][i] = set_temperature
+            columns["ssr"][i] = 1.0 if ssr_on else 0.0
+            columns["fan_pwm"][i] = self.fan_pwm
+            columns["winder_pwm"][i] = self.winder_pwm
+            self._head = (i + 1) % self.capacity
+            if self._count < self.capacity:
+                self._count += 1
+
+    def add_event(self, event, t=None):
+        """Feeds a parsed firmware event (see pultrusion.protocol)."""
+        if isinstance(event, TelemetrySample):
+            self.append(time.monotonic() if t is None else t,
+                        event.temperature, event.set_temperature, event.ssr_on)
+        elif isinstance(event, FanState):
+            self.fan_pwm = event.pwm
+        elif isinstance(event, WinderState):
+            if event.pwm is not None:
+                self.winder_pwm = event.pwm
+        elif isinstance(event, SetTemperatureAck):
+            pass  # Shows up in the next telemetry line anyway
+
+    def clear(self):
+        with self._lock:
+            self._head = 0
+            self._count = 0
+
+    # ---------------------------
+    # Queries
+    # ---------------------------
+    def last(self, seconds=None):
+        """
+        Returns {"time": ..., column: ...} arrays (copies) for the samples of
+        the last `seconds` seconds, or everything when seconds is None.
+        """
+        with self._lock:
+            return self._window(seconds)
+
+    def since(self, t):
+        """
+        Like last(), but only the samples newer than time t. Lets a reader
+        that polls (the live chart) copy just what arrived since its last
+        poll, however long its window.
+        """
+        with self._lock:
+            segments = [(start + int(np.searchsorted(self._time[start:stop], t, side="right")), stop)
+                        for start, stop in self._segments()]
+            return self._collect([(start, stop) for start, stop in segments if stop > start])
+
+    def latest(self):
+        """Returns the newest sample as a dict, or None when empty."""
+        with self._lock:
+            if not self._count:
+                return None
+            i = (self._head - 1) % self.capacity
+            sample = {name: float(column[i]) for name, column in self._columns.items()}
+            sample["time"] = float(self._time[i])
+            return sample
+
+    def downsample(self, points, seconds=None, column="temperature", method="minmax"):
+        """
+        Returns at most `points` samples of the window, chosen on `column`.
+
+        "minmax" keeps the lowest and highest sample of each bucket, so spikes
+        survive decimation. "lttb" (largest triangle three buckets) keeps the
+        visual shape with one sample per bucket. The other columns are taken
+        at the same rows.
+        """
+        with self._lock:
+            segments = self._window_segments(seconds)
+            times = self._gather(self._time, segments)
+            if len(times) <= points or points < 3:
+                return self._collect(segments)
+            values = self._gather(self._columns[column], segments)
+            if method == "minmax":
+                index = minmax_indices(values, points)
+            elif method == "lttb":
+                index = lttb_indices(times, values, points)
+            else:
+                raise ValueError(f"Unknown downsampling method: {method}")
+
+            # Map window rows back to ring rows and pick only those
+            rows = self._rows(index, segments)
+            data = {"time": self._time[rows]}
+            for name, array in self._columns.items():
+                data[name] = array[rows]
+            return data
+
+    def _segments(self):
+        """Physical (start, stop) slices holding the samples, oldest first."""
+        if self._count < self.capacity:
+            return [(0, self._count)]
+        if self._head == 0:
+            return [(0, self.capacity)]
+        return [(self._head, self.capacity), (0, self._head)]
+
+    def _window_segments(self, seconds):
+        segments = self._segments()
+        if seconds is not None and self._count:
+            newest = self._time[(self._head - 1) % self.capacity]
+            since = newest - seconds
+            segments = [(start + int(np.searchsorted(self._time[start:stop], since)), stop)
+                        for start, stop in segments]
+        return [(start, stop) for start, stop in segments if stop > start]
+
+    @staticmethod
+    def _gather(array, segments):
+        if not segments:
+            return array[:0].copy()
+        if len(segments) == 1:
+            start, stop = segments[0]
+            return array[start:stop].copy()
+        return np.concatenate([array[start:stop] for start, stop in segments])
+
+    @staticmethod
+    def _rows(index, segments):
+        if len(segments) == 1:
+            return index + segments[0][0]
+        (first_start, first_stop), (second_start, _) = segments
+        first_len = first_stop - first_start
+        return np.where(index < first_len, index + first_start, index - first_len + second_start)
+
+    def _collect(self, segments):
+        data = {"time": self._gather(self._time, segments)}
+        for name, values in self._columns.items():
+            data[name] = self._gather(values, segments)
+        return data
+
+    def _window(self, seconds):
+        return self._collect(self._window_segments(seconds))
+
+
+# -------------------------------------------------
+# Decimation
+# -------------------------------------------------
+def minmax_indices(values, points):
+    """Row indices of the min and max of each of points // 2 buckets, in order."""
+    n = len(values)
+    buckets = max(1, points // 2)
+    size = -(-n // buckets)  # ceil
+    padded = np.empty(buckets * size, dtype=np.float64)
+    padded[:n] = values
+    # NaN (broken sensor) and padding never win min or max
+    low = np.where(np.isnan(padded), np.inf, padded)
+    high = np.where(np.isnan(padded), -np.inf, padded)
+    low[n:] = np.inf
+    high[n:] = -np.inf
+    offsets = np.arange(buckets) * size
+    lows = low.reshape(buckets, size).argmin(axis=1) + offsets
+    highs = high.reshape(buckets, size).argmax(axis=1) + offsets
+    index = np.unique(np.concatenate((lows, highs)))
+    return index[index < n]
+
+
+def lttb_indices(times, values, points):
+    """Largest-triangle-three-buckets row selection (first and last rows kept)."""
+    n = len(values)
+    values = np.nan_to_num(np.asarray(values, dtype=np.float64))
+    times = np.asarray(times, dtype=np.float64)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    index = np.empty(points, dtype=np.int64)
+    index[0] = 0
+    index[-1] = n - 1
+    previous = 0
+    for b in range(points - 2):
+        start, stop = edges[b], edges[b + 1]
+        if b + 2 < points - 1:
+            next_start, next_stop = edges[b + 1], edges[b + 2]
+        else:
+            next_start, next_stop = n - 1, n
+        avg_t = times[next_start:next_stop].mean()
+        avg_v = values[next_start:next_stop].mean()
+        t0, v0 = times[previous], values[previous]
+        area = np.abs((t0 - avg_t) * (values[start:stop] - v0) -
+                      (t0 - times[start:stop]) * (avg_v - v0))
+        previous = start + int(area.argmax()) if stop > start else start
+        index[b + 1] = previous
+    return np.unique(index)
@@ -0,0 +1,255 @@
+"""
+Filament output worked out from the winder speed.
+
+The winder is the 12 V, 7 RPM DC motor turning the spool. Its PWM value is
+inverted: 1 is full speed, 255 the slowest setting and 0 off (see
+pultrusion.machine.speed_to_pwm). ThroughputModel turns a PWM value into
+spool RPM and, using the calibrated spool core diameter, into the linear
+speed of the filament.
+
+If the spool width is known, the model also lets the spool grow as it fills.
+Filament of diameter d packed across a spool of width w gives
+
+    D² = D0² + k·L,    k = 4·d²·1000 / (π·w)
+
+(mm and metres). At a constant RPM the diameter therefore grows linearly
+with time, so both the wound length and the time left to a target length
+have closed forms.
+
+ProductionCounter integrates the length from the winder events printed
+by the firmware. LengthShutoff keeps the firmware's shutdown timer set to
+the moment the target length is reached, and moves it when the speed
+changes.
+"""
+import math
+import time
+
+from pultrusion.protocol import (EmergencyStop, ShutdownStarted, StatusReport, SystemRestarted,
+                                 WinderState)
+
+MOTOR_RPM = 7.0
+
+
+def pwm_fraction(pwm):
+    """Share of full motor speed for a winder PWM value (0 is off, 1 full speed, 255 slowest)."""
+    if pwm is None or pwm <= 0:
+        return 0.0
+    return min(1.0, max(0.0, (255 - pwm) / 254.0))
+
+
+class ThroughputModel:
+    """
+    Spool RPM and filament speed for a winder PWM value. Diameters are in
+    mm. spool_width_mm=None treats the spool as a fixed core diameter.
+    stall_fraction is the share of full speed below which the motor does
+    not turn at all.
+    """
+
+    def __init__(self, spool_diameter_mm, filament_diameter_mm=1.75, spool_width_mm=None,
+                 motor_rpm=MOTOR_RPM, stall_fraction=0.0):
+        if spool_diameter_mm <= 0 or filament_diameter_mm <= 0:
+            raise ValueError("Spool and filament diameters must be positive")
+        if spool_width_mm is not None and spool_width_mm <= 0:
+            raise ValueError("Spool width must be positive")
+        self.spool_diameter_mm = spool_diameter_mm
+        self.filament_diameter_mm = filament_diameter_mm
+        self.spool_width_mm = spool_width_mm
+        self.motor_rpm = motor_rpm
+        self.stall_fraction = stall_fraction
+        # Growth of D² (mm²) per metre wound; 0 for a fixed diameter
+        self.k = (4 * filament_diameter_mm ** 2 * 1000 / (math.pi * spool_width_mm)
+                  if spool_width_mm else 0.0)
+
+    def rpm(self, pwm):
+        fraction = pwm_fraction(pwm)
+        if fraction <= self.stall_fraction:
+            return 0.0
+        return fraction * self.motor_rpm
+
+    def diameter_mm(self, wound_m=0.0):
+        """Outer diameter of the spool with wound_m metres on it."""
+        return math.sqrt(self.spool_diameter_mm ** 2 + self.k * wound_m)
+
+    def speed_mm_s(self, pwm, wound_m=0.0):
+        return math.pi * self.diameter_mm(wound_m) * self.rpm(pwm) / 60.0
+
+    def metres_per_hour(self, pwm, wound_m=0.0):
+        return self.speed_mm_s(pwm, wound_m) * 3.6
+
+    def wound_after(self, pwm, wound_m, seconds):
+        """Length on the spool after seconds at pwm, starting from wound_m."""
+        rpm = self.rpm(pwm)
+        if rpm <= 0 or seconds <= 0:
+            return wound_m
+        d0 = self.diameter_mm(wound_m)
+        if not self.k:
+            return wound_m + math.pi * d0 * rpm / 60000.0 * seconds
+        d1 = d0 + self.k * math.pi * rpm / 60000.0 * seconds / 2
+        return (d1 ** 2 - self.spool_diameter_mm ** 2) / self.k
+
+    def time_to_wind(self, pwm, wound_m, metres):
+        """Seconds to wind another metres at pwm; None if the winder stands still."""
+        rpm = self.rpm(pwm)
+        if rpm <= 0:
+            return None
+        if metres <= 0:
+            return 0.0
+        d0 = self.diameter_mm(wound_m)
+        if not self.k:
+            return metres * 60000.0 / (math.pi * d0 * rpm)
+        d1 = self.diameter_mm(wound_m + metres)
+        return 60000.0 / (math.pi * rpm) * 2 * (d1 - d0) / self.k
+
+
+class ProductionCounter:
+    """
+    Metres of filament produced, integrated from the winder's PWM value.
+    Feed every parsed firmware event to observe(); the PWM in force is
+    taken from winder, status, shutdown and emergency stop events. After
+    a restart the speed is unknown (and counted as stopped) until the
+    firmware reports it again.
+
+    length_m is the total since start (or reset()); spool_m is what is on
+    the current spool and sets its diameter. metres_per_bottle converts
+    lengths to bottles (strips) of plastic used.
+    """
+
+    def __init__(self, model, metres_per_bottle=None):
+        self.model = model
+        self.metres_per_bottle = metres_per_bottle
+        self.length_m = 0.0
+        self.spool_m = 0.0
+        self.pwm = 0
+        self.last_time = None
+        self.started = None
+
+    def reset(self, now=None):
+        self.advance(now)
+        self.length_m = 0.0
+        self.started = self.last_time
+
+    def reset_spool(self, now=None):
+        """Starts an empty spool; the total length is kept."""
+        self.advance(now)
+        self.spool_m = 0.0
+
+    def advance(self, now=None):
+        """Adds what was wound since the last call at the PWM then in force."""
+        now = time.monotonic() if now is None else now
+        if self.last_time is not None and now > self.last_time:
+            wound = self.model.wound_after(self.pwm, self.spool_m, now - self.last_time)
+            self.length_m += wound - self.spool_m
+            self.spool_m = wound
+        if self.started is None:
+            self.started = now
+        if self.last_time is None or now > self.last_time:
+            self.last_time = now
+
+    def set_pwm(self, pwm, now=None):
+        self.advance(now)
+        self.pwm = pwm
+
+    def observe(self, event, now=None):
+        """Updates the winder speed from a parsed firmware event; True if it changed."""
+        if isinstance(event, WinderState):
+            pwm = (255 if event.pwm is None else event.pwm) if event.on else 0
+        elif isinstance(event, StatusReport):
+            pwm = event.winder_pwm if event.winder_on else 0
+        elif isinstance(event, (ShutdownStarted, EmergencyStop, SystemRestarted)):
+            pwm = 0
+        else:
+            return False
+        changed = pwm != self.pwm
+        self.set_pwm(pwm, now)
+        return changed
+
+    @property
+    def metres_per_hour(self):
+        return self.model.metres_per_hour(self.pwm, self.spool_m)
+
+    @property
+    def bottles(self):
+        if not self.metres_per_bottle:
+            return None
+        return self.length_m / self.metres_per_bottle
+
+    def time_to(self, target_m):
+        """Seconds until length_m reaches target_m at the current speed (None if stopped)."""
+        return self.model.time_to_wind(self.pwm, self.spool_m, target_m - self.length_m)
+
+    def snapshot(self, now=None):
+        self.advance(now)
+        return {
+            "length_m": self.length_m,
+            "spool_m": self.spool_m,
+            "metres_per_hour": self.metres_per_hour,
+            "bottles": self.bottles,
+            "rpm": self.model.rpm(self.pwm),
+            "spool_diameter_mm": self.model.diameter_mm(self.spool_m),
+            "pwm": self.pwm,
+        }
+
+
+class LengthShutoff:
+    """
+    Shuts the machine off once counter.length_m reaches target_m, using the
+    firmware's shutdown timer. Call update() whenever the speed may have
+    changed, and now and then in between. The timer is only sent again when
+    the finish time has moved by more than tolerance_s or tolerance_fraction
+    of the time left, since every SET_SHUTDOWN_TIME restarts the
+    firmware's countdown. While the winder stands still the timer is
+    cancelled, so a paused line is not shut off early.
+
+    send_seconds(seconds) and cancel() send the commands; done is True once
+    the target is reached.
+    """
+
+    def __init__(self, counter, send_seconds, cancel, target_m, tolerance_s=5.0,
+                 tolerance_fraction=0.02):
+        self.counter = counter
+        self.send_seconds = send_seconds
+        self.cancel_timer = cancel
+        self.target_m = target_m
+        self.tolerance_s = tolerance_s
+        self.tolerance_fraction = tolerance_fraction
+        self.deadline = None      # Monotonic time the firmware will shut off at
+        self.reschedules = 0
+        self.done = False
+
+    @property
+    def remaining_m(self):
+        return max(0.0, self.target_m - self.counter.length_m)
+
+    def update(self, now=None):
+        """Reschedules the timer if needed; returns seconds left, or None while stopped."""
+        if self.done:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        self.counter.advance(now)
+        eta = self.counter.time_to(self.target_m)
+        if eta is None:
+            if self.deadline is not None:
+                self.deadline = None
+                self.cancel_timer()
+            return None
+        if self.deadline is not None:
+            drift = abs(now + eta - self.deadline)
+            if drift <= max(self.tolerance_s, self.tolerance_fraction * eta):
+                return max(0.0, self.deadline - now)
+        seconds = max(1, math.ceil(eta))
+        self.deadline = now + seconds
+        self.reschedules += 1
+        self.send_seconds(seconds)
+        return float(seconds)
+
+    def stop(self):
+        """Abandons the target and cancels the firmware timer."""
+        if self.deadline is not None and not self.done:
+            self.cancel_timer()
+        self.deadline = None
+        self.done = True
+
+    def finished(self):
+        """Call when the firmware starts its shutdown sequence."""
+        self.deadline = None
+        self.done = True
@@ -0,0 +1,106 @@
+"""
+Thread-safe, coalescing bridge from background threads to Tk variables.
+
+tkinter is not thread-safe, so background threads never touch Tk directly.
+They post the new value for a variable, and the Tk main loop applies the
+latest value of each variable once per frame through root.after. However
+fast telemetry arrives, the GUI redraws at most `fps` times per second.
+"""
+import logging
+import time
+from collections import deque
+from threading import Lock
+
+from pultrusion.metrics import Histogram
+
+log = logging.getLogger(__name__)
+
+
+class UiUpdatePump:
+    def __init__(self, root, fps=20):
+        self.root = root
+        self.interval_ms = max(1, int(1000 / fps))
+        self._latest = {}       # variable -> (value, received_at)
+        self._calls = deque()   # (function, args) to run on the Tk thread
+        self._lock = Lock()
+        self._job = None
+
+        # Counters
+        self.updates_posted = 0
+        self.updates_applied = 0
+        self.frames = 0
+
+        # UI lag: serial line received -> value drawn on screen (seconds)
+        self.last_lag = None
+        self.max_lag = 0.0
+        self.avg_lag = None
+        self.lag = Histogram()
+
+    def post(self, variable, value, received_at=None):
+        """
+        Queues variable.set(value) for the next frame; only the newest value
+        per variable is kept. received_at (time.monotonic() of the serial
+        read) feeds the UI lag metric.
+        """
+        with self._lock:
+            self._latest[variable] = (value, received_at)
+            self.updates_posted += 1
+
+    def call(self, function, *args):
+        """Runs function(*args) on the Tk thread at the next frame."""
+        self._calls.append((function, args))
+
+    def start(self):
+        if self._job is None:
+            self._job = self.root.after(self.interval_ms, self._drain)
+
+    def stop(self):
+        if self._job is not None:
+            self.root.after_cancel(self._job)
+            self._job = None
+
+    def stats(self):
+        return {
+            "updates_posted": self.updates_posted,
+            "updates_applied": self.updates_applied,
+            "frames": self.frames,
+            "last_lag": self.last_lag,
+            "max_lag": self.max_lag,
+            "avg_lag": self.avg_lag,
+        }
+
+    def _drain(self):
+        self._job = None
+        try:
+            with self._lock:
+                latest, self._latest = self._latest, {}
+
+            calls = self._calls
+            oldest = None
+            for variable, (value, received_at) in latest.items():
+                variable.set(value)
+                if received_at is not None and (oldest is None or received_at < oldest):
+                    oldest = received_at
+            while calls:
+                function, args = calls.popleft()
+                try:
+                    function(*args)
+                except Exception as e:
+                    log.error("Error in UI callback: %s", e)
+
+            if latest:
+                self.updates_applied += len(latest)
+                self.frames += 1
+                if oldest is not None:
+                    # Redraw now so the measurement covers what is actually on screen
+                    self.root.update_idletasks()
+                    self._record_lag(time.monotonic() - oldest)
+        finally:
+            self._job = self.root.after(self.interval_ms, self._drain)
+
+    def _record_lag(self, lag):
+        self.lag.observe(lag)
+        self.last_lag = lag
+        if lag > self.max_lag:
+            self.max_lag = lag
+        self.avg_lag = lag if self.avg_lag is None else self.avg_lag * 0.9 + lag * 0.1
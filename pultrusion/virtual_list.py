@@ -0,0 +1,130 @@
+"""
+A Tk list that draws only the rows on screen.
+
+tk.Listbox needs every row inserted up front, which gets slow for thousands
+of strips and has to be repeated whenever the window opens. VirtualListView
+instead asks render(i) for the text of the visible rows when it draws, and
+reuses a fixed pool of canvas items. Opening, scrolling and resizing cost
+the same for 10 rows and 100,000.
+"""
+import tkinter as tk
+import tkinter.font as tkfont
+from tkinter import ttk
+
+
+class VirtualListView(tk.Frame):
+    """
+    count is the number of rows; render(i) returns the text of row i.
+    Call refresh(count) after the data changes. on_select(i) is called
+    when a row is clicked.
+    """
+
+    def __init__(self, master, count, render, on_select=None, font=None,
+                 bg="white", fg="black", select_bg="#0078D7", select_fg="white", **kwargs):
+        super().__init__(master, bg=bg, **kwargs)
+        self.count = count
+        self.render = render
+        self.on_select = on_select
+        self.selected = None
+        self.fg = fg
+        self.select_fg = select_fg
+        self.font = tkfont.Font(font=font) if font else tkfont.nametofont("TkDefaultFont")
+        self.row_height = self.font.metrics("linespace") + 4
+        self.top = 0                   # Pixel offset of the view into the full list
+        self._rows = []                # Pooled text items, one per visible row
+
+        self.canvas = tk.Canvas(self, bg=bg, bd=0, highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self._highlight = self.canvas.create_rectangle(0, 0, 0, 0, fill=select_bg, width=0,
+                                                       state=tk.HIDDEN)
+
+        self.canvas.bind("<Configure>", lambda event: self.redraw())
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<MouseWheel>", self._on_wheel)
+        self.canvas.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.canvas.bind("<Button-5>", lambda event: self.scroll(3))
+
+    # ---------------------------
+    # Public
+    # ---------------------------
+    def refresh(self, count=None):
+        if count is not None:
+            self.count = count
+        if self.selected is not None and self.selected >= self.count:
+            self.selected = None
+        self._clamp()
+        self.redraw()
+
+    def scroll(self, rows):
+        self.top += rows * self.row_height
+        self._clamp()
+        self.redraw()
+
+    def see(self, i):
+        """Scrolls row i into view and selects it."""
+        self.selected = i
+        height = self.canvas.winfo_height()
+        y = i * self.row_height
+        if y < self.top or y + self.row_height > self.top + height:
+            self.top = y - max(0, height - self.row_height) // 2
+        self._clamp()
+        self.redraw()
+
+    def redraw(self):
+        height = max(1, self.canvas.winfo_height())
+        width = self.canvas.winfo_width()
+        visible = height // self.row_height + 2
+        while len(self._rows) < visible:
+            self._rows.append(self.canvas.create_text(0, 0, anchor=tk.NW, font=self.font))
+        first = self.top // self.row_height
+        offset = first * self.row_height - self.top
+        for k, item in enumerate(self._rows):
+            i = first + k
+            if k >= visible or i >= self.count:
+                self.canvas.itemconfigure(item, state=tk.HIDDEN)
+                continue
+            y = offset + k * self.row_height
+            self.canvas.coords(item, 6, y + 2)
+            self.canvas.itemconfigure(item, text=self.render(i), state=tk.NORMAL,
+                                      fill=self.select_fg if i == self.selected else self.fg)
+        if self.selected is not None and first <= self.selected < first + visible:
+            y = offset + (self.selected - first) * self.row_height
+            self.canvas.coords(self._highlight, 0, y, width, y + self.row_height)
+            self.canvas.itemconfigure(self._highlight, state=tk.NORMAL)
+        else:
+            self.canvas.itemconfigure(self._highlight, state=tk.HIDDEN)
+        total = max(1, self.count * self.row_height)
+        self.scrollbar.set(self.top / total, min(1.0, (self.top + height) / total))
+
+    # ---------------------------
+    # Internals
+    # ---------------------------
+    def _clamp(self):
+        height = max(1, self.canvas.winfo_height())
+        self.top = int(max(0, min(self.top, self.count * self.row_height - height)))
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == tk.MOVETO:
+            self.top = int(float(amount) * self.count * self.row_height)
+            self._clamp()
+            self.redraw()
+        elif unit == tk.PAGES:
+            self.scroll(int(amount) * max(1, self.canvas.winfo_height() // self.row_height - 1))
+        else:
+            self.scroll(int(amount))
+
+    def _on_wheel(self, event):
+        # Windows reports multiples of 120, macOS small deltas
+        step = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        self.scroll(-3 * step)
+
+    def _on_click(self, event):
+        i = (self.top + event.y) // self.row_height
+        if i >= self.count:
+            return
+        self.selected = i
+        self.redraw()
+        if self.on_select is not None:
+            self.on_select(i)